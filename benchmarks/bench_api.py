@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+查询服务性能测试
+在合成的历史数据上启动查询服务，测量各接口首次请求（未缓存）的耗时，
+再用多个长连接客户端并发请求，输出每秒请求数
+
+用法:
+  python benchmarks/bench_api.py [--rows 1000] [--history 365] [--clients 8] [--seconds 5]
+"""
+import argparse
+import http.client
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_parser import build_page  # noqa: E402
+from bench_pipeline import build_history, start  # noqa: E402
+from src.api import ApiServer, QueryService  # noqa: E402
+from src.history_store import HistoryStore  # noqa: E402
+from src.table_parser import iter_price_rows  # noqa: E402
+
+
+def request(conn: http.client.HTTPConnection, path: str, headers: dict = None) -> tuple:
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, body, response.getheader("ETag")
+
+
+def client(port: int, paths: list, stop: threading.Event, counts: list, index: int):
+    """长连接客户端，循环请求 paths（一半带 gzip，一半带 If-None-Match）"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    etags = {}
+    n = 0
+    while not stop.is_set():
+        path = paths[n % len(paths)]
+        headers = {"Accept-Encoding": "gzip"}
+        if n % 2 and path in etags:
+            headers["If-None-Match"] = etags[path]
+        status, _, etag = request(conn, path, headers)
+        if status == 200:
+            etags[path] = etag
+        n += 1
+    counts[index] = n
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询服务性能测试")
+    parser.add_argument("--rows", type=int, default=1000, help="产品数")
+    parser.add_argument("--history", type=int, default=365, help="历史记录数")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--seconds", type=float, default=5, help="并发测试时长(秒)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_api_"))
+    try:
+        db = workdir / "prices.db"
+        build_history(db, args.rows, args.history)
+        names = [p.product for p in iter_price_rows(build_page(args.rows))]
+        store = HistoryStore(db, legacy_json=db.with_suffix(".json"))
+        server = start(ApiServer(("127.0.0.1", 0), QueryService(store)))
+        port = server.server_address[1]
+
+        paths = [
+            "/latest",
+            "/latest?currency=CNY",
+            f"/series?product={quote(names[0])}&product={quote(names[-1])}",
+            f"/series?product={quote(names[1])}&freq=weekly",
+            "/analytics?days=90",
+        ]
+        print(f"{args.rows} 个产品, {args.history} 条历史记录")
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        for path in paths:
+            started = time.perf_counter()
+            status, body, _ = request(conn, path)
+            cold = time.perf_counter() - started
+            started = time.perf_counter()
+            request(conn, path)
+            warm = time.perf_counter() - started
+            print(f"  {path[:48]:<50}{status:>4}{len(body) / 1024:>9.1f} KB"
+                  f"  首次 {cold * 1000:8.1f} ms  缓存 {warm * 1000:6.2f} ms")
+
+        # 其他进程写入后缓存失效
+        writer = HistoryStore(db, legacy_json=db.with_suffix(".json"))
+        today = date.today().isoformat()
+        writer.append_record(today, f"{today}T00:00:00", {names[0]: 1.0}, full=False)
+        writer.close()
+        started = time.perf_counter()
+        status, body, _ = request(conn, "/latest")
+        print(f"  写入新记录后 /latest 重新计算 {(time.perf_counter() - started) * 1000:.1f} ms"
+              f"（包含新价格: {today.encode() in body}）")
+        conn.close()
+
+        stop = threading.Event()
+        counts = [0] * args.clients
+        threads = [
+            threading.Thread(target=client, args=(port, paths, stop, counts, i))
+            for i in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        print(f"  {args.clients} 个并发客户端: {sum(counts) / elapsed:,.0f} 请求/秒")
+        server.shutdown()
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
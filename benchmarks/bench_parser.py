@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+价格表格解析性能对比
+在合成的 10k 行页面上比较旧的正则级联解析与流式单遍解析
+
+用法:
+  python benchmarks/bench_parser.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.table_parser import iter_price_rows  # noqa: E402
+
+
+def build_page(rows: int, tables: int = 1) -> str:
+    """生成类似闪存市场价格中心的合成页面"""
+    parts = ["<html><body><div>更新时间: 2026-01-20 11:00</div>"]
+    per_table = rows // tables
+    for t in range(tables):
+        parts.append('<table class="price"><tr><th>产品</th><th>本周价</th><th>涨跌</th>'
+                     '<th>涨跌幅</th><th>上周价</th><th>周高</th><th>周低</th></tr>')
+        for i in range(per_table):
+            price = 40 + (i % 300)
+            sign = "+" if i % 3 else "-"
+            parts.append(
+                f'<tr><td><a href="/p/{t}-{i}">DDR5 UDIMM {16 << (i % 3)}GB {5600 + i % 5 * 200} #{t}-{i}</a></td>'
+                f'<td>${price:.2f}</td><td>{sign}{i % 7}.00</td><td>{sign}{i % 7 * 1.5:.2f}%</td>'
+                f'<td>${price - 2:.2f}</td><td>${price + 3:.2f}</td><td>${price - 3:.2f}</td></tr>'
+            )
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def legacy_parse(html: str) -> list:
+    """旧实现：整表正则 → 行正则 → 单元格正则 → 逐单元格正则"""
+    results = []
+    table_match = re.search(r'<table[^>]*>(.*?)</table>', html, re.DOTALL | re.IGNORECASE)
+    if not table_match:
+        return results
+    rows = re.findall(r'<tr[^>]*>(.*?)</tr>', table_match.group(1), re.DOTALL | re.IGNORECASE)
+    for row in rows:
+        if '<th' in row.lower():
+            continue
+        cells = re.findall(r'<(?:td|rowheader)[^>]*>(.*?)</(?:td|rowheader)>', row, re.DOTALL | re.IGNORECASE)
+        if len(cells) >= 7:
+            product_match = re.search(r'>([^<]+)</a>', cells[0])
+            if not product_match:
+                continue
+            try:
+                price = float(re.search(r'\$([\d.]+)', cells[1]).group(1))
+                change_match = re.search(r'([+-]?[\d.]+)', cells[2])
+                change = float(change_match.group(1)) if change_match else 0
+                change_pct_match = re.search(r'([+-]?[\d.]+)%', cells[3])
+                change_pct = float(change_pct_match.group(1)) if change_pct_match else 0
+                last_price = float(re.search(r'\$([\d.]+)', cells[4]).group(1))
+                week_high = float(re.search(r'\$([\d.]+)', cells[5]).group(1))
+                week_low = float(re.search(r'\$([\d.]+)', cells[6]).group(1))
+            except (AttributeError, ValueError):
+                continue
+            results.append({
+                "product": product_match.group(1).strip(),
+                "price": price,
+                "change": change,
+                "change_percent": change_pct,
+                "last_week_price": last_price,
+                "week_high": week_high,
+                "week_low": week_low,
+            })
+    return results
+
+
+def streaming_parse(html: str, chunk_size: int = 64 * 1024) -> list:
+    """新实现：按块喂给流式解析器，模拟 response.iter_content"""
+    chunks = (html[i:i + chunk_size] for i in range(0, len(html), chunk_size))
+    return list(iter_price_rows(chunks))
+
+
+def best_of(func, html: str, repeat: int) -> tuple:
+    """多次运行取最快一次"""
+    best, count = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(func(html))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="价格表格解析性能对比")
+    parser.add_argument("--rows", type=int, default=10000, help="合成页面的数据行数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快）")
+    args = parser.parse_args()
+
+    html = build_page(args.rows)
+    print(f"合成页面: {args.rows} 行, {len(html) / 1024:.0f} KB")
+
+    legacy_time, legacy_rows = best_of(legacy_parse, html, args.repeat)
+    stream_time, stream_rows = best_of(streaming_parse, html, args.repeat)
+    print(f"  正则级联: {legacy_time * 1000:8.1f} ms  ({legacy_rows} 行)")
+    print(f"  流式解析: {stream_time * 1000:8.1f} ms  ({stream_rows} 行)")
+
+    # 多表格页面：旧实现只能解析第一个表格
+    multi = build_page(args.rows, tables=4)
+    print(f"4 个表格的页面: 正则级联 {len(legacy_parse(multi))} 行, "
+          f"流式解析 {len(streaming_parse(multi))} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+抓取→追踪→渲染→发送 全流程性能测试
+本地HTTP服务提供指定行数的合成价格页面，本地SMTP服务接收邮件，
+在不同的产品数和历史记录数下分别计时各阶段，结果写入JSON供不同提交之间对比
+
+用法:
+  python benchmarks/bench_pipeline.py [--rows 100,1000,10000] [--history 0,30,365]
+                                      [--repeat 3] [--output bench_pipeline.json]
+                                      [--compare 上次的结果.json]
+"""
+import argparse
+import json
+import platform
+import shutil
+import smtplib
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_parser import build_page  # noqa: E402
+from src.email_sender import EmailSender  # noqa: E402
+from src.history_store import HistoryStore  # noqa: E402
+from src.http_cache import ResponseCache  # noqa: E402
+from src.metrics import metrics  # noqa: E402
+from src.price_tracker import PriceTracker  # noqa: E402
+from src.report import ReportGenerator  # noqa: E402
+from src.resilience import TokenBucket  # noqa: E402
+from src.scraper import CFMScraper  # noqa: E402
+from src.table_parser import iter_price_rows  # noqa: E402
+
+# 历史记录中每条增量记录变化的产品比例
+HISTORY_CHANGE_RATIO = 0.05
+# 历史记录中全量快照的间隔
+HISTORY_CHECKPOINT_EVERY = 10
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """GET /rows/<N> 返回 N 行的合成价格页面"""
+
+    def do_GET(self):
+        try:
+            rows = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+        except ValueError:
+            self.send_error(404)
+            return
+        body = self.server.page(rows)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """合成价格页面服务（页面按行数缓存）"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self._pages = {}
+
+    def page(self, rows: int) -> bytes:
+        if rows not in self._pages:
+            self._pages[rows] = build_page(rows).encode("utf-8")
+        return self._pages[rows]
+
+    def url(self, rows: int) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/rows/{rows}"
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """接受任意登录和邮件并丢弃的最小SMTP服务"""
+
+    def handle(self):
+        self.wfile.write(b"220 sink ready\r\n")
+        for line in self.rfile:
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-sink\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command.startswith("AUTH"):
+                self.wfile.write(b"235 ok\r\n")
+            elif command == "DATA":
+                self.wfile.write(b"354 end with .\r\n")
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                self.server.received += 1
+                self.wfile.write(b"250 ok\r\n")
+            elif command == "QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """本地SMTP服务"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    received = 0
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+
+
+class SinkEmailSender(EmailSender):
+    """连接本地SMTP服务的发送器（本地服务不提供TLS，改用明文连接，其余流程不变）"""
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10)
+        server.login(self.email, self.password)
+        return server
+
+
+def start(server):
+    """后台线程运行服务"""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_history(path: Path, rows: int, history: int):
+    """
+    生成 history 条历史记录：第一条为全量快照，之后每条记录约 5% 的产品价格变化，
+    每隔 HISTORY_CHECKPOINT_EVERY 条写一次全量快照
+    """
+    store = HistoryStore(path, legacy_json=path.with_suffix(".json"))
+    store.conn  # 没有历史记录时也创建空数据库
+    names = [p.product for p in iter_price_rows(build_page(rows))]
+    prices = {name: 30.0 + i % 250 for i, name in enumerate(names)}
+    changed = max(1, int(rows * HISTORY_CHANGE_RATIO))
+    start_day = date.today() - timedelta(days=history + 1)
+    for n in range(history):
+        day = start_day + timedelta(days=n)
+        offset = n * changed % max(1, rows)
+        delta = {}
+        for name in names[offset:offset + changed]:
+            prices[name] = round(prices[name] * (1.01 if n % 2 else 0.99), 2)
+            delta[name] = prices[name]
+        full = n % HISTORY_CHECKPOINT_EVERY == 0
+        store.append_record(
+            day.isoformat(), datetime.combine(day, datetime.min.time()).isoformat(),
+            dict(prices) if full else delta, full=full,
+        )
+    store.close()
+
+
+def measure(func, repeat: int, setup=None) -> list:
+    """运行 repeat 次，返回每次的耗时(秒)；setup 的返回值作为 func 的参数且不计时"""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(stage: str, rows: int, history, timings: list, **extra) -> dict:
+    result = {
+        "stage": stage,
+        "rows": rows,
+        "history": history,
+        "best": min(timings),
+        "median": statistics.median(timings),
+        "repeat": len(timings),
+    }
+    result.update(extra)
+    return result
+
+
+def bench_size(workdir: Path, fixture: FixtureServer, sink: SMTPSink,
+               rows: int, histories: list, repeat: int) -> list:
+    """单个产品数下的全部阶段"""
+    results = []
+    url = fixture.url(rows)
+    html = fixture.page(rows).decode("utf-8")
+    scraper = CFMScraper(
+        cache=ResponseCache(workdir / "http_cache.json"),
+        limiter=TokenBucket(rate=0),
+        store=HistoryStore(workdir / "scraper.db", legacy_json=workdir / "scraper.json"),
+    )
+    scraper.SOURCES = {"ddr_channel": {"url": url, "category": "内存条(渠道市场)"}}
+
+    timings = measure(lambda _: scraper._parse_html_table(html), repeat)
+    results.append(summarize("parse", rows, None, timings, bytes=len(html)))
+
+    # 每次计时前删除响应缓存文件并重新创建缓存，测量下载+流式解析
+    # （上一次的内容哈希或 ETag 命中只会测到缓存读取）
+    fetch_cache = workdir / "http_cache_fetch.json"
+
+    def fresh_cache(_=None):
+        fetch_cache.unlink(missing_ok=True)
+        scraper.cache = ResponseCache(fetch_cache)
+
+    metrics.reset()
+    timings = measure(lambda _: scraper.fetch_source("ddr_channel"), repeat, setup=fresh_cache)
+    hits = metrics.counter_total("http_cache_hits_total")
+    misses = metrics.counter_total("http_cache_misses_total")
+    if hits or misses != repeat:
+        raise RuntimeError(f"fetch 阶段命中了响应缓存（命中 {hits:.0f} 次，未命中 {misses:.0f} 次），计时无效")
+    results.append(summarize("fetch", rows, None, timings, bytes=len(html)))
+
+    data = scraper.fetch_source("ddr_channel")
+    current = {"内存条(渠道市场)": data}
+    for history in histories:
+        template = workdir / f"history_{rows}_{history}.db"
+        build_history(template, rows, history)
+
+        def fresh_tracker(_=None):
+            path = workdir / f"run_{time.perf_counter_ns()}.db"
+            shutil.copy(template, path)
+            metrics.reset()
+            return PriceTracker(HistoryStore(path, legacy_json=path.with_suffix(".json")))
+
+        trackers = []
+        save_times = []
+
+        def update(tracker):
+            tracker.update_prices(current)
+            trackers.append(tracker)
+            save_times.append(metrics.timer_total("history_save_seconds"))
+
+        timings = measure(update, repeat, setup=fresh_tracker)
+        results.append(summarize("update_prices", rows, history, timings))
+        results.append(summarize("save_history", rows, history, save_times))
+
+        tracker = trackers[-1]
+        change_data = tracker.update_prices(current)
+        generator = ReportGenerator(tracker)
+        generator.generate_html(change_data)  # 预热模板编译
+        timings = measure(lambda _: generator.generate_html(change_data), repeat)
+        html_report = generator.generate_html(change_data)
+        results.append(summarize("generate_html", rows, history, timings, bytes=len(html_report)))
+        timings = measure(lambda _: generator.generate_text(change_data), repeat)
+        text_report = generator.generate_text(change_data)
+        results.append(summarize("generate_text", rows, history, timings, bytes=len(text_report)))
+        for t in trackers:
+            t.store.close()
+
+    sender = SinkEmailSender(
+        smtp_server="127.0.0.1", smtp_port=sink.server_address[1], email="bench@localhost", password="x",
+    )
+    timings = measure(
+        lambda _: sender.send("to@localhost", "bench", html_report, text_report), repeat
+    )
+    results.append(summarize("send", rows, None, timings, bytes=len(html_report) + len(text_report)))
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def result_key(result: dict) -> tuple:
+    return result["stage"], result["rows"], result["history"]
+
+
+def print_results(results: list, baseline: dict = None):
+    """打印结果表格，给出基准结果时附加与基准的耗时比"""
+    baseline_results = {result_key(r): r for r in (baseline or {}).get("results", [])}
+    print(f"{'阶段':<14}{'产品数':>8}{'历史':>6}{'最快(ms)':>11}{'中位(ms)':>11}" + ("   对比基准" if baseline else ""))
+    for r in results:
+        history = "-" if r["history"] is None else str(r["history"])
+        line = f"{r['stage']:<14}{r['rows']:>8}{history:>6}{r['best'] * 1000:>11.2f}{r['median'] * 1000:>11.2f}"
+        previous = baseline_results.get(result_key(r))
+        if previous and previous["best"] > 0:
+            line += f"   {r['best'] / previous['best']:.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取→追踪→渲染→发送 全流程性能测试")
+    parser.add_argument("--rows", default="100,1000,10000", help="产品数，逗号分隔")
+    parser.add_argument("--history", default="0,30,365", help="已有历史记录数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    parser.add_argument("--output", default="bench_pipeline.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="与之前的结果JSON对比")
+    args = parser.parse_args()
+
+    rows_list = [int(v) for v in args.rows.split(",") if v]
+    histories = [int(v) for v in args.history.split(",") if v]
+    fixture = start(FixtureServer())
+    sink = start(SMTPSink())
+
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    try:
+        for rows in rows_list:
+            print(f"⏱️ {rows} 个产品 ...", file=sys.stderr)
+            results.extend(bench_size(workdir, fixture, sink, rows, histories, args.repeat))
+    finally:
+        fixture.shutdown()
+        sink.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"基准: {baseline.get('revision') or args.compare}")
+    print_results(results, baseline)
+    print(f"结果已写入 {args.output}（邮件 {sink.received} 封）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+产品记录内存对比
+100k 个产品下比较旧的每产品字典（解析8键 + 追踪13键）与 ProductRecord + 共享 CategoryMeta
+的内存占用和内存块数，并测量 解析→追踪→汇总 全流程的内存峰值
+
+用法:
+  python benchmarks/bench_records.py [--products 100000]
+"""
+import argparse
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_parser import build_page  # noqa: E402
+from src.history_store import HistoryStore  # noqa: E402
+from src.price_tracker import PriceTracker  # noqa: E402
+from src.product_record import ProductRecord, category_meta  # noqa: E402
+from src.report import ReportGenerator  # noqa: E402
+from src.table_parser import iter_price_rows  # noqa: E402
+
+CATEGORY = "内存条(渠道市场)"
+UPDATE_TIME = "2026-01-20 11:00"
+SOURCE = "CFM闪存市场"
+SOURCE_URL = "https://www.chinaflashmarket.com/"
+
+
+def legacy_products(rows: list) -> list:
+    """旧实现：解析时每行一个字典，追踪时再复制成13键字典"""
+    products = []
+    for row in rows:
+        parsed = {
+            "product": row.product,
+            "price": row.price,
+            "change": row.change,
+            "change_percent": row.change_percent,
+            "last_week_price": row.last_week_price,
+            "week_high": row.week_high,
+            "week_low": row.week_low,
+            "trend": row.trend,
+        }
+        products.append({
+            "product": parsed["product"],
+            "category": CATEGORY,
+            "price": parsed["price"],
+            "previous_price": None,
+            "change": parsed["change"],
+            "change_percent": parsed["change_percent"],
+            "last_week_price": parsed["last_week_price"],
+            "week_high": parsed["week_high"],
+            "week_low": parsed["week_low"],
+            "trend": parsed["trend"],
+            "update_time": UPDATE_TIME,
+            "source": SOURCE,
+            "source_url": SOURCE_URL,
+        })
+    return products
+
+
+def record_products(rows: list) -> list:
+    """当前实现：每行一个 ProductRecord，分类信息共享"""
+    meta = category_meta(CATEGORY, UPDATE_TIME, SOURCE, SOURCE_URL)
+    products = []
+    for row in rows:
+        products.append(ProductRecord(
+            row.product, row.price, row.change, row.change_percent,
+            row.last_week_price, row.week_high, row.week_low, row.trend,
+            previous_price=None, meta=meta,
+        ))
+    return products
+
+
+def measure(func, *args) -> dict:
+    """运行 func，返回结果存活时的内存、峰值、新增内存块数和耗时"""
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    stats = {
+        "current": current,
+        "peak": peak,
+        "blocks": sys.getallocatedblocks() - blocks,
+        "seconds": seconds,
+    }
+    del result
+    return stats
+
+
+def pipeline(html: str, workdir: Path) -> dict:
+    """解析→追踪→汇总，返回报告上下文（保持所有产品记录存活）"""
+    path = workdir / f"prices_{time.perf_counter_ns()}.db"
+    tracker = PriceTracker(HistoryStore(path, legacy_json=path.with_suffix(".json")))
+    current = {CATEGORY: {
+        "update_time": UPDATE_TIME, "source": SOURCE, "url": SOURCE_URL,
+        "products": list(iter_price_rows(html)),
+    }}
+    change_data = tracker.update_prices(current)
+    context = ReportGenerator(tracker).build_context(change_data)
+    tracker.store.close()
+    return context
+
+
+def print_stats(name: str, stats: dict, products: int):
+    print(f"  {name:<16}{stats['current'] / 2**20:9.1f} MB{stats['peak'] / 2**20:9.1f} MB"
+          f"{stats['blocks']:>11}{stats['current'] / products:>9.0f} B{stats['seconds'] * 1000:>9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="产品记录内存对比")
+    parser.add_argument("--products", type=int, default=100000, help="产品数")
+    args = parser.parse_args()
+
+    html = build_page(args.products)
+    rows = list(iter_price_rows(html))
+    print(f"{len(rows)} 个产品")
+    print(f"  {'':<16}{'存活':>12}{'峰值':>11}{'内存块':>8}{'每产品':>9}{'耗时':>10}")
+
+    print_stats("每产品字典", measure(legacy_products, rows), len(rows))
+    print_stats("ProductRecord", measure(record_products, rows), len(rows))
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_records_"))
+    try:
+        print_stats("解析→追踪→汇总", measure(pipeline, html, workdir), len(rows))
+    finally:
+        for path in workdir.iterdir():
+            path.unlink()
+        workdir.rmdir()
+
+
+if __name__ == "__main__":
+    main()
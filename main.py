@@ -4,23 +4,137 @@
 数据来源: 闪存市场 CFM (https://www.chinaflashmarket.com)
 """
 import argparse
+import importlib
 import sys
+import time
 from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Tuple
 
-from src.scraper import CFMScraper
-from src.price_tracker import PriceTracker
-from src.report import ReportGenerator
-from src.email_sender import EmailSender
+from src.config import API_HOST, API_PORT, METRICS_FILE
+from src.metrics import metrics
 
+_STARTED = time.perf_counter()
 
-def run_monitor(send_email: bool = True, verbose: bool = False):
+if TYPE_CHECKING:
+    from src.alerts import AlertEngine
+    from src.currency import CurrencyConverter
+    from src.email_sender import EmailSender
+    from src.jd_scraper import JDPriceFetcher
+    from src.outbox import Outbox
+    from src.price_tracker import PriceTracker
+    from src.report import ReportGenerator
+    from src.scraper import CFMScraper
+
+# 各阶段模块按需导入（例如 --no-email 时不会导入 smtplib/ssl/MIME 模块）
+# 记录每个模块的导入耗时(秒)，含其依赖，供 --profile-startup 输出
+_import_times: Dict[str, float] = {}
+
+
+def _import(module: str):
+    """按需导入模块并记录耗时"""
+    if module not in sys.modules:
+        started = time.perf_counter()
+        importlib.import_module(module)
+        _import_times[module] = time.perf_counter() - started
+    return sys.modules[module]
+
+
+def print_startup_profile():
+    """输出启动耗时和各模块导入耗时"""
+    print(f"⏱️ 启动耗时分析（本次运行总耗时 {(time.perf_counter() - _STARTED) * 1000:.1f} ms）:")
+    for module, seconds in sorted(_import_times.items(), key=lambda item: -item[1]):
+        print(f"   {module:<20} {seconds * 1000:8.1f} ms")
+    print(f"   {'合计':<18} {sum(_import_times.values()) * 1000:8.1f} ms")
+    print("   更细的逐模块耗时可使用: python -X importtime main.py\n")
+
+
+class Components:
+    """监控流程各阶段的组件，首次使用时创建；常驻模式下跨多次运行复用"""
+
+    def __init__(self):
+        self._scraper = None
+        self._jd_fetcher = None
+        self._tracker = None
+        self._converter = None
+        self._generator = None
+        self._sender = None
+        self._outbox = None
+        self._alert_engine = None
+
+    @property
+    def scraper(self) -> "CFMScraper":
+        if self._scraper is None:
+            self._scraper = _import("src.scraper").CFMScraper(store=self.tracker.store)
+        return self._scraper
+
+    @property
+    def jd_fetcher(self) -> "JDPriceFetcher":
+        if self._jd_fetcher is None:
+            self._jd_fetcher = _import("src.jd_scraper").JDPriceFetcher()
+        return self._jd_fetcher
+
+    @property
+    def tracker(self) -> "PriceTracker":
+        if self._tracker is None:
+            self._tracker = _import("src.price_tracker").PriceTracker()
+        return self._tracker
+
+    @property
+    def converter(self) -> "CurrencyConverter":
+        """汇率换算器（报告和提醒共用逐日汇率缓存）"""
+        if self._converter is None:
+            self._converter = _import("src.currency").CurrencyConverter(self.tracker.store)
+        return self._converter
+
+    @property
+    def generator(self) -> "ReportGenerator":
+        if self._generator is None:
+            self._generator = _import("src.report").ReportGenerator(self.tracker, self.converter)
+        return self._generator
+
+    @property
+    def sender(self) -> "EmailSender":
+        if self._sender is None:
+            self._sender = _import("src.email_sender").EmailSender()
+        return self._sender
+
+    @property
+    def outbox(self) -> "Outbox":
+        if self._outbox is None:
+            self._outbox = _import("src.outbox").Outbox()
+        return self._outbox
+
+    @property
+    def alert_engine(self) -> "AlertEngine":
+        if self._alert_engine is None:
+            self._alert_engine = _import("src.alerts").AlertEngine.from_file(
+                tracker=self.tracker, converter=self.converter
+            )
+        return self._alert_engine
+
+
+def run_monitor(
+    send_email: bool = True,
+    verbose: bool = False,
+    include_jd: bool = False,
+    components: Components = None,
+    force: bool = False,
+):
     """
     运行价格监控
     
     Args:
         send_email: 是否发送邮件
         verbose: 是否输出详细信息
+        include_jd: 是否同时获取京东SKU价格
+        components: 复用的组件（常驻模式），默认新建
+        force: 数据未更新时也照常记录、生成报告和发送邮件
+
+    Returns:
+        价格变化数据；数据未更新而跳过时返回 {"unchanged": True, "update_time": ...}；
+        获取价格失败时返回 None
     """
+    components = components or Components()
     print(f"\n{'='*50}")
     print(f"📊 内存价格监控系统")
     print(f"⏰ 运行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -29,21 +143,43 @@ def run_monitor(send_email: bool = True, verbose: bool = False):
 
     # 1. 爬取价格
     print("🔍 正在获取闪存市场价格数据...")
-    scraper = CFMScraper()
+    extra_tasks = [components.jd_fetcher.as_task()] if include_jd else None
     try:
-        current_prices = scraper.fetch_all_prices()
+        with metrics.timer("stage_seconds", stage="fetch"):
+            current_prices = components.scraper.fetch_all_prices(extra_tasks=extra_tasks)
     except Exception as e:
         print(f"❌ 获取价格失败: {e}")
-        sys.exit(1)
+        metrics.inc("runs_total", result="fetch_failed")
+        return None
 
     if not current_prices:
         print("❌ 未获取到任何价格数据")
-        sys.exit(1)
+        metrics.inc("runs_total", result="fetch_failed")
+        return None
+
+    # 数据集与上次处理的相同（闪存市场每周只更新一次）时跳过后续阶段
+    tracker = components.tracker
+    fingerprint = tracker.fingerprint(current_prices)
+    if not force and tracker.is_unchanged(fingerprint):
+        update_time = next(
+            (
+                d.get("update_time") for d in current_prices.values()
+                if d.get("update_time") and not d.get("realtime")
+            ),
+            None,
+        )
+        print(f"\n📦 数据未更新（更新时间: {update_time}），跳过记录、报告和邮件（--force 可强制运行）\n")
+        metrics.inc("runs_total", result="unchanged")
+        return {"unchanged": True, "update_time": update_time}
 
     # 2. 分析价格变化
     print("\n📈 正在分析价格变化...")
-    tracker = PriceTracker()
-    change_data = tracker.update_prices(current_prices)
+    currency = _import("src.currency")
+    with metrics.timer("stage_seconds", stage="update"):
+        # 常驻模式下其他进程（如导入历史价格）可能已写入历史数据库
+        tracker.store.refresh()
+        currency.sync_rate_file(tracker.store)
+        change_data = tracker.update_prices(current_prices)
 
     total = change_data.get("total_products", 0)
     ups = len(change_data.get("price_ups", []))
@@ -57,44 +193,198 @@ def run_monitor(send_email: bool = True, verbose: bool = False):
     if verbose:
         print("📝 价格详情:")
         for item in change_data.get("all_products", []):
-            change = item.get("change", 0)
-            change_percent = item.get("change_percent", 0)
+            change = item.change
+            change_percent = item.change_percent
             
             if change > 0:
-                trend = f"↑ +${change:.2f} (+{change_percent:.2f}%)"
+                trend = f"↑ +{currency.format_price(change, item.currency)} (+{change_percent:.2f}%)"
             elif change < 0:
-                trend = f"↓ ${change:.2f} ({change_percent:.2f}%)"
+                trend = f"↓ {currency.format_price(change, item.currency)} ({change_percent:.2f}%)"
             else:
                 trend = "持平"
             
-            print(f"   {item['product']}: ${item['price']:.2f} {trend}")
+            print(f"   {item.product}: {currency.format_price(item.price, item.currency)} {trend}")
+        print()
+
+    # 3. 检查价格提醒
+    with metrics.timer("stage_seconds", stage="alerts"):
+        alerts = components.alert_engine.evaluate(change_data)
+    if alerts:
+        print(f"🔔 触发 {len(alerts)} 条价格提醒:")
+        for alert in alerts:
+            print(f"   {alert.message}")
         print()
+    metrics.inc("alerts_total", len(alerts))
 
-    # 3. 生成报告
+    # 4. 生成报告（排名、统计、走势图等共享数据只计算一次）
     print("📄 正在生成报告...")
-    generator = ReportGenerator()
-    html_report = generator.generate_html(change_data)
-    text_report = generator.generate_text(change_data)
+    with metrics.timer("stage_seconds", stage="render"):
+        generator = components.generator
+        context = generator.build_context(change_data)
     print("✅ 报告生成完成\n")
 
-    # 4. 发送邮件
+    # 5. 邮件加入发件队列（投递在监控流程结束后进行，SMTP故障不影响监控结果）
     if send_email:
-        print("📧 正在发送邮件...")
-        sender = EmailSender()
-        success = sender.send_price_report(html_report, text_report)
-        if success:
-            print("✅ 邮件发送成功!\n")
-        else:
-            print("❌ 邮件发送失败\n")
-            sys.exit(1)
+        print("📧 正在生成各订阅者的报告并加入发件队列...")
+        subscribers = _import("src.subscribers")
+        with metrics.timer("stage_seconds", stage="enqueue_email"):
+            # 报告逐个渲染并立即入队，不同时持有全部订阅者的报告
+            reports = subscribers.render_reports(generator, context, subscribers.load_subscribers())
+            components.sender.send_reports(
+                ((subscriber.email, html, text) for subscriber, html, text in reports),
+                outbox=components.outbox,
+            )
+            if alerts:
+                enqueue_alerts(components, alerts, change_data.get("date"))
+        print("✅ 报告已加入发件队列\n")
     else:
         print("⏭️ 跳过邮件发送（--no-email）\n")
         # 输出纯文本报告
-        print(text_report)
+        print(generator.render_text(context))
+
+    # 报告已生成并入队后再记录指纹，中途失败时下次运行会重新处理
+    tracker.save_fingerprint(fingerprint)
+    # 更新提交到仓库的历史文本导出（数据库本身不提交，新环境中从导出文件还原）
+    tracker.store.export_jsonl()
 
     print(f"{'='*50}")
     print("🎉 监控任务完成!")
     print(f"{'='*50}\n")
+    metrics.inc("runs_total", result="ok")
+    return change_data
+
+
+def enqueue_alerts(components: Components, alerts: list, date: str = None):
+    """按收件人合并提醒，每人一封邮件加入发件队列"""
+    group_by_recipient = _import("src.alerts").group_by_recipient
+    generator = components.generator
+    for recipient, items in group_by_recipient(alerts).items():
+        components.sender.send_alert(
+            recipient,
+            generator.render_alert_html(items, date),
+            generator.render_alert_text(items, date),
+            count=len(items),
+            outbox=components.outbox,
+        )
+
+
+def deliver_outbox(components: Components) -> Tuple[int, int]:
+    """
+    投递发件队列中的到期邮件（包括之前运行失败的邮件）
+
+    Returns:
+        (成功数, 失败数)
+    """
+    outbox = components.outbox
+    if not outbox.pending_count():
+        return 0, 0
+    print("📮 正在投递发件队列...")
+    with metrics.timer("stage_seconds", stage="deliver"):
+        sent, failed = outbox.drain(components.sender)
+    remaining = outbox.pending_count()
+    print(f"📮 投递完成: 成功 {sent} 封, 失败 {failed} 封, 队列中剩余 {remaining} 封\n")
+    if failed:
+        print("⚠️ 发送失败的邮件已保留在队列中，将在下次运行时按退避策略重试\n")
+    return sent, failed
+
+
+def print_metrics_summary():
+    """输出各阶段耗时、下载量、解析行数和缓存命中率"""
+    stages = [
+        ("fetch", "抓取"), ("update", "分析/保存"), ("alerts", "提醒"), ("render", "汇总"),
+        ("enqueue_email", "渲染/入队"), ("deliver", "投递"),
+    ]
+    timings = "  ".join(
+        f"{label} {metrics.timer_total('stage_seconds', stage=stage):.2f}s"
+        for stage, label in stages
+        if metrics.timer_total("stage_seconds", stage=stage)
+    )
+    print(f"⏱️ 阶段耗时: {timings}")
+    print(
+        f"   下载 {metrics.counter_total('http_bytes_downloaded_total') / 1024:.1f} KB, "
+        f"解析 {metrics.counter_total('rows_parsed_total'):.0f} 行, "
+        f"重试 {metrics.counter_total('http_retries_total'):.0f} 次, "
+        f"缓存命中率 {metrics.cache_hit_rate():.0%}\n"
+    )
+
+
+def export_metrics(path: str):
+    """写入指标文件，失败不影响监控结果"""
+    if not path:
+        return
+    try:
+        metrics.export(path)
+    except OSError as e:
+        print(f"⚠️ 写入指标文件失败: {e}")
+
+
+def run_daemon(
+    send_email: bool = True,
+    verbose: bool = False,
+    include_jd: bool = False,
+    metrics_file: str = None,
+    force: bool = False,
+):
+    """
+    常驻运行：会话、模板环境和历史数据常驻内存，按闪存市场更新时间调度抓取
+    """
+    MonitorDaemon = _import("src.daemon").MonitorDaemon
+
+    components = Components()
+    worker = None
+    if send_email:
+        worker = _import("src.outbox").OutboxWorker(components.outbox, components.sender)
+        worker.start()
+
+    def run_once():
+        change_data = run_monitor(send_email, verbose, include_jd, components, force)
+        export_metrics(metrics_file)
+        if not change_data:
+            return None
+        if change_data.get("unchanged"):
+            return change_data["update_time"]
+        return next(
+            (p.update_time for p in change_data.get("all_products", []) if p.update_time),
+            None,
+        )
+
+    try:
+        MonitorDaemon(run_once).run_forever()
+    finally:
+        if worker:
+            worker.stop(timeout=5)
+
+
+def run_backfill(path: str, full: bool = True, batch_size: int = None) -> bool:
+    """导入历史价格导出文件，输出导入统计和吞吐量"""
+    backfill = _import("src.backfill")
+    print(f"📥 正在导入历史价格: {path}")
+    try:
+        result = backfill.backfill(path, full=full, batch_size=batch_size)
+    except (OSError, ValueError) as e:
+        print(f"❌ 导入失败: {e}")
+        return False
+    print(
+        f"✅ 读取 {result.rows_read} 行（无法解析 {result.rows_invalid} 行，"
+        f"日期已有记录 {result.rows_existing} 行，文件内重复 {result.duplicates} 行）"
+    )
+    print(f"   新增 {result.records_added} 条记录，写入 {result.rows_written} 行价格")
+    print(
+        f"⏱️ 解析 {result.parse_seconds:.2f}s，写入 {result.insert_seconds:.2f}s，"
+        f"{result.rows_per_second:,.0f} 行/秒"
+    )
+    return True
+
+
+def run_serve(host: str, port: int, verbose: bool = False):
+    """启动只读的价格查询服务"""
+    api = _import("src.api")
+    try:
+        api.serve(host, port, verbose=verbose)
+    except OSError as e:
+        print(f"❌ 查询服务启动失败: {e}")
+        return False
+    return True
 
 
 def main():
@@ -106,11 +396,25 @@ def main():
   python main.py              # 运行监控并发送邮件
   python main.py --no-email   # 运行监控但不发送邮件
   python main.py -v           # 显示详细信息
+  python main.py --force      # 数据未更新时也生成报告并发送邮件
+  python main.py --jd         # 同时获取京东SKU价格
+  python main.py --daemon     # 常驻运行，按每周二更新时间自动抓取
+  python main.py --profile-startup --no-email  # 输出各模块导入耗时
+  python main.py backfill export.csv           # 导入历史价格导出文件
+  python main.py serve --port 8080             # 启动只读的价格查询服务（JSON）
   
 环境变量:
   SMTP_EMAIL      发件邮箱地址
   SMTP_PASSWORD   邮箱授权码（QQ邮箱需要在设置中生成）
-  RECIPIENT_EMAIL 收件邮箱（默认: 289997689@qq.com）
+  RECIPIENT_EMAIL 收件邮箱，多个用逗号分隔（默认: 289997689@qq.com）
+  SMTP_SEND_RATE  每秒最多发送的邮件数（默认: 5，0 表示不限速）
+  OUTBOX_RETENTION_DAYS 已发送/已放弃的邮件在发件队列中保留的天数（默认: 7）
+  METRICS_FILE    运行指标文件路径（同 --metrics）
+  RENDER_WORKERS  个性化报告渲染进程数（默认: CPU核数）
+  FX_RATES_FILE   本地汇率文件（默认: data/fx_rates.csv，修改后下次运行自动导入）
+  REPORT_CURRENCY 报告和提醒中显示的币种，逗号分隔（默认: USD,CNY）
+  API_HOST / API_PORT  查询服务的监听地址和端口（默认: 127.0.0.1:8080）
+  CFM_SOURCES_FILE 闪存市场数据源配置（默认: data/sources.json，不存在时只抓取渠道市场页面）
   
 数据来源:
   闪存市场 CFM: https://www.chinaflashmarket.com/pricecenter/ddrchannel
@@ -123,18 +427,106 @@ def main():
         action="store_true",
         help="不发送邮件，仅在控制台输出报告"
     )
+    parser.add_argument(
+        "--jd",
+        action="store_true",
+        help="同时获取 data/products.json 中京东SKU的价格（人民币）"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="常驻运行，按闪存市场更新时间（每周二 11:00 GMT+8）自动调度抓取"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="数据未更新时也照常记录、生成报告和发送邮件"
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        default=METRICS_FILE,
+        help="写入运行指标文件（.prom 为 Prometheus 文本格式，其余为JSON）"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="运行结束后输出启动耗时和各模块导入耗时"
+    )
     parser.add_argument(
         "-v", "--verbose",
         action="store_true",
         help="显示详细信息"
     )
 
+    subparsers = parser.add_subparsers(dest="command", metavar="命令")
+    backfill_parser = subparsers.add_parser(
+        "backfill",
+        help="导入历史价格导出文件（CSV / JSON Lines / JSON）",
+        description="流式读取历史价格导出文件，跳过已有记录的日期，批量写入历史数据库",
+    )
+    backfill_parser.add_argument("file", help="导出文件（.csv / .jsonl / .json）")
+    backfill_parser.add_argument(
+        "--partial",
+        action="store_true",
+        help="文件中每个日期只包含部分产品（不把缺少的产品记为下架）"
+    )
+    backfill_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="每批插入的价格行数（默认: 5000）"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="启动只读的价格查询服务（最新价格、价格序列、价格分析，JSON）",
+        description="本地HTTP查询服务，响应按历史数据版本缓存，支持 ETag 和 gzip",
+    )
+    serve_parser.add_argument("--host", default=API_HOST, help=f"监听地址（默认: {API_HOST}）")
+    serve_parser.add_argument("--port", type=int, default=API_PORT, help=f"监听端口（默认: {API_PORT}）")
+    serve_parser.add_argument("-v", "--verbose", action="store_true", help="输出每个请求的访问日志")
+
     args = parser.parse_args()
+
+    if args.command == "backfill":
+        ok = run_backfill(args.file, full=not args.partial, batch_size=args.batch_size)
+        sys.exit(0 if ok else 1)
+
+    if args.command == "serve":
+        ok = run_serve(args.host, args.port, verbose=args.verbose)
+        sys.exit(0 if ok else 1)
     
-    run_monitor(
+    if args.daemon:
+        run_daemon(
+            send_email=not args.no_email,
+            verbose=args.verbose,
+            include_jd=args.jd,
+            metrics_file=args.metrics,
+            force=args.force,
+        )
+        return
+
+    components = Components()
+    change_data = run_monitor(
         send_email=not args.no_email,
-        verbose=args.verbose
+        verbose=args.verbose,
+        include_jd=args.jd,
+        components=components,
+        force=args.force,
     )
+    sent = failed = 0
+    if not args.no_email:
+        sent, failed = deliver_outbox(components)
+    print_metrics_summary()
+    export_metrics(args.metrics)
+    if args.profile_startup:
+        print_startup_profile()
+    if change_data is None:
+        sys.exit(1)
+    if failed and not sent:
+        print(f"❌ 发件队列中的 {failed} 封邮件全部投递失败")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,320 @@
+"""
+价格提醒模块
+按 data/alerts.json 中的规则检查 PriceTracker.update_prices 的结果，
+规则按产品名、产品属性和名称关键词建立索引，每次只检查新增和价格变化的产品
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from .config import ALERTS_FILE, DEFAULT_CURRENCY, RECIPIENT_EMAILS
+from .currency import CurrencyConverter, format_price
+from .product_attrs import ATTRIBUTES, parse_product_name
+from .product_record import ProductRecord
+
+# 规则类型
+RULE_ABOVE = "above"  # 价格上穿阈值
+RULE_BELOW = "below"  # 价格下穿阈值
+RULE_CHANGE_PCT = "change_pct"  # 周涨跌幅绝对值不小于阈值(%)
+RULE_HIGH_52W = "high_52w"  # 创52周新高
+RULE_LOW_52W = "low_52w"  # 创52周新低
+
+RULE_TYPES = (RULE_ABOVE, RULE_BELOW, RULE_CHANGE_PCT, RULE_HIGH_52W, RULE_LOW_52W)
+THRESHOLD_RULES = (RULE_ABOVE, RULE_BELOW, RULE_CHANGE_PCT)
+PRICE_RULES = (RULE_ABOVE, RULE_BELOW)  # 阈值为价格（带币种）的规则
+RANGE_RULES = (RULE_HIGH_52W, RULE_LOW_52W)
+
+# 属性条件的索引优先级（越靠前越有区分度）
+_ATTRIBUTE_PRIORITY = ("speed", "capacity_gb", "form_factor", "generation")
+
+
+def name_tokens(name: str) -> FrozenSet[str]:
+    """产品名的关键词集合（按空白分词，不区分大小写）"""
+    return frozenset(name.upper().split())
+
+
+class AlertRule(NamedTuple):
+    """
+    提醒规则
+
+    product 为完整产品名；pattern 为关键词集合，产品名包含全部关键词即匹配；
+    attrs 为产品属性条件（如 (("generation", "DDR5"), ("capacity_gb", 32))），
+    解析出的属性全部相等即匹配。都为空时匹配所有产品。
+    currency 为 above/below 阈值的币种，与产品币种不同时按报告日汇率换算后比较。
+    """
+    id: str
+    kind: str
+    value: Optional[float]
+    recipients: Tuple[str, ...]
+    product: Optional[str] = None
+    pattern: FrozenSet[str] = frozenset()
+    attrs: Tuple[Tuple[str, object], ...] = ()
+    currency: str = DEFAULT_CURRENCY
+
+
+class Alert(NamedTuple):
+    """触发的提醒"""
+    rule: AlertRule
+    product: str
+    price: float
+    message: str
+    currency: str = DEFAULT_CURRENCY
+    converted: str = ""  # 按报告日汇率折算为其他报告币种的价格
+
+    @property
+    def price_text(self) -> str:
+        """价格文本（附其他币种的折算价格）"""
+        text = format_price(self.price, self.currency)
+        return f"{text}（≈ {self.converted}）" if self.converted else text
+
+
+def load_rules(path: Path = None) -> List[AlertRule]:
+    """
+    读取提醒规则配置
+
+    格式: {"rules": [{"id", "type", "value", "currency", "product" / "pattern" / 产品属性, "recipients"}]}，
+    产品属性为 generation、form_factor、capacity_gb、speed；
+    currency 为阈值币种，省略时为 DEFAULT_CURRENCY；
+    recipients 省略时发送给 RECIPIENT_EMAIL。配置文件不存在时没有规则。
+    """
+    path = Path(path or ALERTS_FILE)
+    if not path.exists():
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ 读取提醒规则失败: {e}")
+        return []
+
+    rules = []
+    for index, item in enumerate(config.get("rules", [])):
+        kind = item.get("type")
+        if kind not in RULE_TYPES:
+            print(f"⚠️ 跳过未知类型的提醒规则: {item}")
+            continue
+        if kind in THRESHOLD_RULES and item.get("value") is None:
+            print(f"⚠️ 跳过缺少阈值的提醒规则: {item}")
+            continue
+        recipients = item.get("recipients") or RECIPIENT_EMAILS
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        attrs = tuple(
+            (attribute, item[attribute].upper() if attribute == "generation" else item[attribute])
+            for attribute in ATTRIBUTES if item.get(attribute) is not None
+        )
+        rules.append(AlertRule(
+            id=str(item.get("id", index)),
+            kind=kind,
+            value=float(item["value"]) if item.get("value") is not None else None,
+            recipients=tuple(recipients),
+            product=item.get("product"),
+            pattern=name_tokens(item.get("pattern", "")),
+            attrs=attrs,
+            currency=str(item.get("currency") or DEFAULT_CURRENCY).upper(),
+        ))
+    return rules
+
+
+class RuleIndex:
+    """
+    规则索引
+
+    按完整产品名、产品属性（挂在区分度最高的一个属性下）和关键词（挂在最长的关键词下）
+    建立索引，查找一个产品的规则只需访问其属性和名称中的关键词，结果按产品名缓存。
+    """
+
+    def __init__(self, rules: Iterable[AlertRule]):
+        self.by_product: Dict[str, List[AlertRule]] = defaultdict(list)
+        self.by_attr: Dict[Tuple[str, object], List[AlertRule]] = defaultdict(list)
+        self.by_token: Dict[str, List[AlertRule]] = defaultdict(list)
+        self.wildcard: List[AlertRule] = []
+        self._cache: Dict[str, Tuple[AlertRule, ...]] = {}
+        self.size = 0
+        for rule in rules:
+            self.size += 1
+            if rule.product:
+                self.by_product[rule.product].append(rule)
+            elif rule.attrs:
+                attrs = dict(rule.attrs)
+                key = next(attribute for attribute in _ATTRIBUTE_PRIORITY if attribute in attrs)
+                self.by_attr[(key, attrs[key])].append(rule)
+            elif rule.pattern:
+                key = max(rule.pattern, key=lambda token: (len(token), token))
+                self.by_token[key].append(rule)
+            else:
+                self.wildcard.append(rule)
+
+    def rules_for(self, product: str) -> Tuple[AlertRule, ...]:
+        """匹配产品的全部规则"""
+        cached = self._cache.get(product)
+        if cached is not None:
+            return cached
+        tokens = name_tokens(product)
+        attrs = parse_product_name(product)
+        matched = list(self.by_product.get(product, ()))
+        for attribute, value in zip(ATTRIBUTES, attrs):
+            if value is None:
+                continue
+            matched.extend(
+                rule for rule in self.by_attr.get((attribute, value), ())
+                if rule.pattern <= tokens
+                and all(getattr(attrs, name) == expected for name, expected in rule.attrs)
+            )
+        for token in tokens:
+            matched.extend(rule for rule in self.by_token.get(token, ()) if rule.pattern <= tokens)
+        matched.extend(self.wildcard)
+        result = self._cache[product] = tuple(matched)
+        return result
+
+
+class AlertEngine:
+    """提醒规则检查"""
+
+    def __init__(self, rules: Iterable[AlertRule], tracker=None, converter: CurrencyConverter = None):
+        """
+        Args:
+            rules: 提醒规则
+            tracker: PriceTracker，检查52周新高/新低时读取历史价格
+            converter: 汇率换算器，默认读取 tracker 的历史存储；都未传入时只显示原币种价格
+        """
+        self.index = RuleIndex(rules)
+        self.tracker = tracker
+        if converter is None and tracker is not None:
+            converter = CurrencyConverter(tracker.store)
+        self.converter = converter
+
+    @classmethod
+    def from_file(cls, path: Path = None, tracker=None, converter: CurrencyConverter = None) -> "AlertEngine":
+        """从配置文件创建"""
+        return cls(load_rules(path), tracker, converter)
+
+    def _range_bounds(self, products: List[str], report_date: str) -> Dict[str, Tuple[float, float]]:
+        """产品在报告日之前52周内的 (最低价, 最高价)，没有历史的产品不在结果中"""
+        if not products or self.tracker is None:
+            return {}
+        until = datetime.strptime(report_date, "%Y-%m-%d") - timedelta(days=1)
+        since = until - timedelta(weeks=52) + timedelta(days=1)
+        series = self.tracker.get_series_batch(
+            products, since=since.strftime("%Y-%m-%d"), until=until.strftime("%Y-%m-%d")
+        )
+        return {
+            product: (min(values), max(values))
+            for product, points in series.items()
+            if (values := [price for _, price in points])
+        }
+
+    def evaluate(self, change_data: dict) -> List[Alert]:
+        """
+        检查本次新增和价格变化的产品
+
+        阈值规则只在价格穿越阈值时触发，价格未变的产品不会重复提醒。
+
+        Args:
+            change_data: PriceTracker.update_prices 的返回值
+
+        Returns:
+            触发的提醒
+        """
+        if not self.index.size:
+            return []
+        by_name = {p.product: p for p in change_data.get("all_products", [])}
+        candidates = [
+            (by_name[name], rules)
+            for name in [*change_data.get("new_products", []), *change_data.get("changed_products", [])]
+            if name in by_name and (rules := self.index.rules_for(name))
+        ]
+
+        report_date = change_data.get("date", datetime.now().strftime("%Y-%m-%d"))
+        bounds = self._range_bounds(
+            [p.product for p, rules in candidates if any(r.kind in RANGE_RULES for r in rules)],
+            report_date,
+        )
+
+        # 候选产品的价格一次折算为其他报告币种
+        converted = [""] * len(candidates)
+        if self.converter is not None and candidates:
+            converted = self.converter.converted_texts(
+                [p.price for p, _ in candidates], [p.currency for p, _ in candidates], report_date
+            )
+
+        alerts = []
+        rates: Dict[Tuple[str, str], Optional[float]] = {}
+        for (product, rules), converted_text in zip(candidates, converted):
+            for rule in rules:
+                threshold = rule.value
+                if rule.kind in PRICE_RULES and rule.currency != product.currency:
+                    rate = self._threshold_rate(rule.currency, product.currency, report_date, rates)
+                    if rate is None:
+                        continue
+                    threshold = rule.value * rate
+                message = self._check(rule, product, bounds.get(product.product), converted_text, threshold)
+                if message:
+                    alerts.append(Alert(
+                        rule, product.product, product.price, message, product.currency, converted_text,
+                    ))
+        return alerts
+
+    def _threshold_rate(
+        self, currency: str, target: str, day: str, rates: Dict[Tuple[str, str], Optional[float]]
+    ) -> Optional[float]:
+        """阈值币种换算为产品币种的汇率，每个币种对只查询一次；没有汇率时提示并返回 None"""
+        key = (currency, target)
+        if key not in rates:
+            rates[key] = self.converter.rate(currency, target, day) if self.converter is not None else None
+            if rates[key] is None:
+                print(f"⚠️ 缺少 {currency}→{target} 汇率，跳过阈值币种为 {currency} 的 {target} 产品提醒")
+        return rates[key]
+
+    @staticmethod
+    def _check(
+        rule: AlertRule,
+        product: ProductRecord,
+        bounds: Optional[Tuple[float, float]],
+        converted: str = "",
+        threshold: float = None,
+    ) -> Optional[str]:
+        """
+        检查单条规则，触发时返回提醒内容（历史价格为产品原币种，当前价格附折算价格）
+
+        threshold 为换算为产品币种的阈值，默认为规则阈值本身（阈值币种与产品币种相同）。
+        """
+        name, price = product.product, product.price
+        previous = product.previous_price
+        currency = product.currency
+        price_text = format_price(price, currency) + (f"（≈ {converted}）" if converted else "")
+        if rule.kind in PRICE_RULES:
+            value = rule.value if threshold is None else threshold
+            value_text = format_price(rule.value, rule.currency)
+            if rule.currency != currency:
+                value_text += f"（≈ {format_price(value, currency)}）"
+            if rule.kind == RULE_ABOVE and price > value and (previous is None or previous <= value):
+                return f"{name} 价格 {price_text} 高于 {value_text}"
+            if rule.kind == RULE_BELOW and price < value and (previous is None or previous >= value):
+                return f"{name} 价格 {price_text} 低于 {value_text}"
+        elif rule.kind == RULE_CHANGE_PCT:
+            change_percent = product.change_percent or 0
+            if abs(change_percent) >= rule.value:
+                return f"{name} 本周{'上涨' if change_percent > 0 else '下跌'} {abs(change_percent):.2f}%（{price_text}）"
+        elif bounds is not None:
+            low, high = bounds
+            if rule.kind == RULE_HIGH_52W and price > high:
+                return f"{name} 价格 {price_text} 创52周新高（此前最高 {format_price(high, currency)}）"
+            if rule.kind == RULE_LOW_52W and price < low:
+                return f"{name} 价格 {price_text} 创52周新低（此前最低 {format_price(low, currency)}）"
+        return None
+
+
+def group_by_recipient(alerts: Iterable[Alert]) -> Dict[str, List[Alert]]:
+    """按收件人分组，同一收件人的同一产品同一条消息只保留一次"""
+    grouped: Dict[str, List[Alert]] = defaultdict(list)
+    seen = set()
+    for alert in alerts:
+        for recipient in alert.rule.recipients:
+            key = (recipient, alert.message)
+            if key not in seen:
+                seen.add(key)
+                grouped[recipient].append(alert)
+    return dict(grouped)
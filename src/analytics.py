@@ -0,0 +1,238 @@
+"""
+价格分析模块
+将历史价格载入 NumPy 矩阵（产品 × 日期），一次向量化计算所有产品的指标
+"""
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .currency import CurrencyConverter
+from .history_store import DateLike, HistoryStore
+
+# 默认窗口（天）
+MA_WINDOWS = (7, 30)
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+VOLATILITY_WINDOW = 30
+ZSCORE_WINDOW = 30
+ZSCORE_THRESHOLD = 3.0
+
+
+class PriceMatrix(NamedTuple):
+    """
+    价格矩阵
+
+    Attributes:
+        products: 行对应的产品名
+        dates: 列对应的日期（连续的自然日）
+        values: 价格矩阵，缺失值已向前填充，首次出现之前为 NaN
+    """
+    products: List[str]
+    dates: np.ndarray
+    values: np.ndarray
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """沿日期方向向前填充 NaN"""
+    mask = np.isnan(values)
+    index = np.where(mask, 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def load_price_matrix(
+    store: HistoryStore,
+    products: Optional[List[str]] = None,
+    since: DateLike = None,
+    until: DateLike = None,
+) -> PriceMatrix:
+    """
+    从历史存储载入价格矩阵
+
+    Args:
+        store: 历史价格存储
+        products: 产品列表，默认全部产品
+        since: 起始日期（含）
+        until: 结束日期（含）
+
+    Returns:
+        按自然日对齐并向前填充的价格矩阵
+    """
+    products = list(products) if products is not None else store.products()
+    series = store.get_series_batch(products, since, until)
+
+    all_dates = [points[0][0] for points in series.values() if points]
+    if not all_dates:
+        return PriceMatrix(products, np.array([], dtype="datetime64[D]"), np.empty((len(products), 0)))
+
+    start = np.datetime64(min(all_dates), "D")
+    end = np.datetime64(max(points[-1][0] for points in series.values() if points), "D")
+    dates = np.arange(start, end + 1, dtype="datetime64[D]")
+
+    values = np.full((len(products), len(dates)), np.nan)
+    for row, product in enumerate(products):
+        points = series[product]
+        if points:
+            days, prices = zip(*points)
+            columns = (np.array(days, dtype="datetime64[D]") - start).astype(np.int64)
+            values[row, columns] = prices
+
+    return PriceMatrix(products, dates, forward_fill(values))
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """基于累加和的滚动求和，O(日期数)，与窗口大小无关"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        total = np.cumsum(values, axis=1)
+        result[:, window - 1:] = total[:, window - 1:]
+        result[:, window:] -= total[:, :-window]
+    return result
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> tuple:
+    """
+    滚动均值和标准差
+
+    窗口内有缺失值的位置为 NaN。先按行去中心化再累加，避免大数相减的精度损失。
+    """
+    valid = ~np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        center = np.nanmean(np.where(valid, values, np.nan), axis=1, keepdims=True)
+    center = np.nan_to_num(center)
+    shifted = np.where(valid, values - center, 0.0)
+
+    count = _rolling_sum(valid.astype(np.float64), window)
+    mean = _rolling_sum(shifted, window) / window
+    square_mean = _rolling_sum(shifted * shifted, window) / window
+    full = count == window
+
+    std = np.sqrt(np.clip(square_mean - mean * mean, 0, None))
+    mean = np.where(full, mean + center, np.nan)
+    std = np.where(full, std, np.nan)
+    return mean, std
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均，窗口未满的位置为 NaN"""
+    return rolling_mean_std(values, window)[0]
+
+
+def period_change(values: np.ndarray, periods: int) -> np.ndarray:
+    """与 periods 天前相比的涨跌幅(%)"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[1] > periods:
+        previous = values[:, :-periods]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[:, periods:] = (values[:, periods:] - previous) / previous * 100
+    return result
+
+
+def daily_returns(values: np.ndarray) -> np.ndarray:
+    """日收益率，第一列为 NaN"""
+    returns = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[:, 1:] = values[:, 1:] / values[:, :-1] - 1
+    return returns
+
+
+def rolling_volatility(values: np.ndarray, window: int = VOLATILITY_WINDOW) -> np.ndarray:
+    """滚动波动率：窗口内日收益率的标准差(%)"""
+    return rolling_mean_std(daily_returns(values), window)[1] * 100
+
+
+def drawdown(values: np.ndarray) -> np.ndarray:
+    """相对历史最高价的回撤(%)，为 0 或负数"""
+    peak = np.fmax.accumulate(values, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (values / peak - 1) * 100
+
+
+def zscore(values: np.ndarray, window: int = ZSCORE_WINDOW) -> np.ndarray:
+    """当前价格相对前 window 天均值/标准差的 z-score"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[1] > window:
+        mean, std = rolling_mean_std(values[:, :-1], window)
+        mean, std = mean[:, window - 1:], std[:, window - 1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = (values[:, window:] - mean) / std
+        # 窗口内价格不变时标准差为 0（累加误差可能留下极小值），此时没有异常
+        flat = std <= np.abs(mean) * 1e-9
+        scores[flat] = 0
+        result[:, window:] = scores
+    return result
+
+
+def compute_analytics(
+    matrix: PriceMatrix,
+    ma_windows=MA_WINDOWS,
+    volatility_window: int = VOLATILITY_WINDOW,
+    zscore_window: int = ZSCORE_WINDOW,
+    zscore_threshold: float = ZSCORE_THRESHOLD,
+) -> Dict[str, np.ndarray]:
+    """
+    一次计算所有产品的全部指标
+
+    Returns:
+        {指标名: 产品 × 日期矩阵}，anomaly 为布尔矩阵
+    """
+    values = matrix.values
+    scores = zscore(values, zscore_window)
+    result = {f"ma_{window}": moving_average(values, window) for window in ma_windows}
+    result.update({
+        "wow_change": period_change(values, WEEK_DAYS),
+        "mom_change": period_change(values, MONTH_DAYS),
+        "volatility": rolling_volatility(values, volatility_window),
+        "drawdown": drawdown(values),
+        "zscore": scores,
+        "anomaly": np.abs(np.nan_to_num(scores)) > zscore_threshold,
+    })
+    return result
+
+
+def latest_summary(matrix: PriceMatrix, analytics: Dict[str, np.ndarray]) -> Dict[str, dict]:
+    """
+    各产品最新一天的指标
+
+    Returns:
+        {产品名: {price, 指标名: 值}}，NaN 转为 None
+    """
+    if not matrix.dates.size:
+        return {product: {} for product in matrix.products}
+
+    columns = {"price": matrix.values[:, -1]}
+    columns.update({name: values[:, -1] for name, values in analytics.items()})
+
+    summary = {}
+    for row, product in enumerate(matrix.products):
+        item = {}
+        for name, column in columns.items():
+            value = column[row].item()
+            item[name] = None if isinstance(value, float) and np.isnan(value) else value
+        summary[product] = item
+    return summary
+
+
+def analyze(
+    store: HistoryStore,
+    products: Optional[List[str]] = None,
+    days: Optional[int] = None,
+    currency: Optional[str] = None,
+    converter: Optional[CurrencyConverter] = None,
+) -> Dict[str, dict]:
+    """
+    载入历史并计算最新指标
+
+    Args:
+        store: 历史价格存储
+        products: 产品列表，默认全部
+        days: 只使用最近N天的历史，默认全部
+        currency: 先将价格按每天的汇率换算为该币种再计算，默认使用各产品的原币种
+        converter: 复用的汇率换算器（保留逐日汇率缓存）
+    """
+    since = (date.today() - timedelta(days=days)).isoformat() if days else None
+    matrix = load_price_matrix(store, products, since=since)
+    if currency:
+        matrix = (converter or CurrencyConverter(store)).convert_matrix(matrix, currency)
+    return latest_summary(matrix, compute_analytics(matrix))
@@ -0,0 +1,327 @@
+"""
+价格查询服务模块
+只读的本地HTTP服务，以JSON提供最新价格、产品价格序列和价格分析指标。
+响应按 (路径, 查询参数) 缓存在内存中，历史数据库被其他进程写入后全部失效；
+响应带 ETag（客户端缓存未过期时返回 304），较大的响应按需 gzip 压缩（压缩结果同样缓存）
+
+接口:
+  GET /                         服务信息和接口列表
+  GET /latest[?currency=CNY]    每个在售产品的最新价格
+  GET /series?product=名称[&product=...][&since=&until=][&freq=daily|weekly|raw][&currency=]
+  GET /analytics[?product=...][&days=90][&currency=]
+  GET /metrics                  运行指标（Prometheus 文本格式，不缓存）
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .analytics import analyze
+from .config import API_CACHE_SIZE, API_GZIP_MIN_BYTES, DEFAULT_CURRENCY
+from .currency import CurrencyConverter
+from .history_store import FREQ_DAILY, FREQ_RAW, FREQ_WEEKLY, HistoryStore
+from .metrics import metrics
+
+_FREQS = {"daily": FREQ_DAILY, "weekly": FREQ_WEEKLY, "raw": FREQ_RAW}
+_CURRENCY_RE = re.compile(r"^[A-Z]{3}$")
+
+
+class ApiError(Exception):
+    """请求参数错误（返回 400）或路径不存在（返回 404）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiResponse(NamedTuple):
+    """缓存的响应"""
+    body: bytes
+    etag: str
+    gzipped: Optional[bytes] = None
+
+
+def _number(value: Optional[float]) -> Optional[float]:
+    """NaN 转为 None（JSON 中为 null）"""
+    return None if value is None or value != value else value
+
+
+def _cache_key(path: str, params: Dict[str, List[str]]) -> tuple:
+    return path.rstrip("/") or "/", tuple(sorted((name, tuple(values)) for name, values in params.items()))
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 中是否包含 etag（忽略弱校验前缀）"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+def _single(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    values = params.get(name)
+    return values[-1].strip() if values and values[-1].strip() else None
+
+
+def _date_param(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    value = _single(params, name)
+    if value is not None:
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            raise ApiError(400, f"{name} 应为 YYYY-MM-DD 格式的日期") from None
+    return value
+
+
+def _currency_param(params: Dict[str, List[str]]) -> Optional[str]:
+    value = _single(params, "currency")
+    if value is None:
+        return None
+    value = value.upper()
+    if not _CURRENCY_RE.match(value):
+        raise ApiError(400, "currency 应为三位币种代码，如 USD、CNY")
+    return value
+
+
+class QueryService:
+    """
+    查询逻辑和响应缓存（与HTTP处理分离）
+
+    每次请求先检查数据库是否被其他进程修改，修改后清空响应缓存和历史存储的内存索引；
+    未修改时相同的请求直接返回缓存的响应体，不读取数据库。
+    """
+
+    def __init__(self, store: HistoryStore = None, cache_size: int = API_CACHE_SIZE):
+        self.store = store or HistoryStore()
+        self.converter = CurrencyConverter(self.store)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, ApiResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 缓存清空的次数：清空前开始计算的响应不再写入缓存
+        self._generation = 0
+        self._routes: Dict[str, Callable[[Dict[str, List[str]]], dict]] = {
+            "/": self.index,
+            "/latest": self.latest,
+            "/series": self.series,
+            "/analytics": self.analytics,
+        }
+
+    def _currencies(self, products: List[str]) -> List[str]:
+        known = self.store.product_currencies()
+        return [known.get(product, DEFAULT_CURRENCY) for product in products]
+
+    def index(self, params: Dict[str, List[str]]) -> dict:
+        """服务信息"""
+        dates = self.store.record_dates()
+        return {
+            "records": self.store.record_count(),
+            "first_date": dates[0] if dates else None,
+            "last_date": dates[-1] if dates else None,
+            "products": len(self.store.last_prices()),
+            "fx_currencies": self.store.fx_currencies(),
+            "endpoints": ["/latest", "/series", "/analytics", "/metrics"],
+        }
+
+    def latest(self, params: Dict[str, List[str]]) -> dict:
+        """每个在售产品的最新价格，指定 currency 时按最近记录日期的汇率换算"""
+        target = _currency_param(params)
+        rows = self.store.latest_records()
+        dates = self.store.record_dates()
+        as_of = dates[-1] if dates else None
+        products = [row[0] for row in rows]
+        currencies = self._currencies(products)
+        items = [
+            {"product": product, "price": price, "currency": currency, "date": day}
+            for (product, price, day), currency in zip(rows, currencies)
+        ]
+        if target and items:
+            converted = self.converter.convert([row[1] for row in rows], currencies, target, as_of)
+            for item, value in zip(items, converted.tolist()):
+                item["converted_price"] = _number(value)
+        return {"date": as_of, "currency": target, "count": len(items), "products": items}
+
+    def series(self, params: Dict[str, List[str]]) -> dict:
+        """产品价格序列 {产品名: [[日期, 价格], ...]}"""
+        products = [name for name in params.get("product", []) if name.strip()]
+        if not products:
+            raise ApiError(400, "缺少 product 参数")
+        freq_name = _single(params, "freq") or "daily"
+        if freq_name not in _FREQS:
+            raise ApiError(400, f"freq 应为 {' / '.join(_FREQS)}")
+        since, until = _date_param(params, "since"), _date_param(params, "until")
+        target = _currency_param(params)
+
+        series = self.store.get_series_batch(products, since, until, _FREQS[freq_name])
+        currencies = dict(zip(products, self._currencies(products)))
+        result = {}
+        for product, points in series.items():
+            if target and points:
+                dates = [day for day, _ in points]
+                values = self.converter.convert_points(
+                    dates, [price for _, price in points], currencies[product], target
+                )
+                points = zip(dates, values.tolist())
+            result[product] = [[day, _number(price)] for day, price in points]
+        return {
+            "freq": freq_name,
+            "since": since,
+            "until": until,
+            "currency": target,
+            "currencies": {product: currencies[product] for product in result},
+            "series": result,
+        }
+
+    def analytics(self, params: Dict[str, List[str]]) -> dict:
+        """最新一天的价格分析指标（均线、周/月涨跌幅、波动率、回撤、z-score）"""
+        products = [name for name in params.get("product", []) if name.strip()] or None
+        days = _single(params, "days")
+        try:
+            days = int(days) if days is not None else None
+        except ValueError:
+            raise ApiError(400, "days 应为整数") from None
+        if days is not None and days <= 0:
+            raise ApiError(400, "days 应为正整数")
+        target = _currency_param(params)
+        summary = analyze(self.store, products, days=days, currency=target, converter=self.converter)
+        return {"days": days, "currency": target, "products": summary}
+
+    def get(self, path: str, params: Dict[str, List[str]]) -> Tuple[ApiResponse, bool]:
+        """
+        处理查询
+
+        Returns:
+            (响应, 是否命中缓存)
+
+        Raises:
+            ApiError: 参数错误或路径不存在
+        """
+        key = _cache_key(path, params)
+        handler = self._routes.get(key[0])
+        if handler is None:
+            raise ApiError(404, f"未知路径: {path}")
+
+        with self._lock:
+            if self.store.refresh():
+                self._cache.clear()
+                self._generation += 1
+            generation = self._generation
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                return response, True
+
+        body = json.dumps(handler(params), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        response = ApiResponse(body, f'"{hashlib.sha1(body).hexdigest()}"')
+        with self._lock:
+            if generation == self._generation:
+                self._cache[key] = response
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return response, False
+
+    def gzipped(self, path: str, params: Dict[str, List[str]], response: ApiResponse) -> bytes:
+        """响应体的 gzip 压缩结果（每个缓存的响应只压缩一次）"""
+        if response.gzipped is None:
+            response = response._replace(gzipped=gzip.compress(response.body, compresslevel=6))
+            key = _cache_key(path, params)
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None and cached.etag == response.etag:
+                    self._cache[key] = response
+        return response.gzipped
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """查询请求处理（HTTP/1.1，支持长连接）"""
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，关闭 Nagle 算法避免小响应在长连接上等待延迟确认
+    disable_nagle_algorithm = True
+    server: "ApiServer"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            return
+
+        params = parse_qs(url.query)
+        service = self.server.service
+        try:
+            response, cached = service.get(url.path, params)
+        except ApiError as e:
+            metrics.inc("api_requests_total", status=e.status)
+            body = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+            self._send(e.status, body)
+            return
+        except Exception as e:
+            metrics.inc("api_requests_total", status=500)
+            self.log_error("查询失败: %r", e)
+            self._send(500, json.dumps({"error": "内部错误"}, ensure_ascii=False).encode("utf-8"))
+            return
+        metrics.inc("api_cache_total", result="hit" if cached else "miss")
+
+        if _etag_matches(self.headers.get("If-None-Match", ""), response.etag):
+            metrics.inc("api_requests_total", status=304)
+            self._send(304, b"", etag=response.etag)
+            return
+
+        metrics.inc("api_requests_total", status=200)
+        body, encoding = response.body, None
+        if len(body) >= API_GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body, encoding = service.gzipped(url.path, params, response), "gzip"
+        self._send(200, body, etag=response.etag, encoding=encoding)
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json; charset=utf-8",
+        etag: str = None,
+        encoding: str = None,
+    ):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """查询服务（每个连接一个线程）"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: QueryService = None, verbose: bool = False):
+        super().__init__(address, ApiHandler)
+        self.service = service or QueryService()
+        self.verbose = verbose
+
+
+def serve(host: str, port: int, store: HistoryStore = None, verbose: bool = False):
+    """启动查询服务，直到 Ctrl+C"""
+    server = ApiServer((host, port), QueryService(store), verbose=verbose)
+    print(f"🌐 查询服务已启动: http://{server.server_address[0]}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 查询服务已停止")
+    finally:
+        server.server_close()
+        server.service.store.close()
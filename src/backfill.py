@@ -0,0 +1,222 @@
+"""
+历史价格导入模块
+从 CSV / JSON Lines / JSON 导出文件流式读取过去的价格，跳过已有记录的日期，
+按日期合并为快照后批量写入历史存储
+
+支持的格式:
+  CSV:   表头包含 date, product, price（可选 timestamp），每行一个产品的一次报价
+  JSONL: 每行一个对象，{"date", "product", "price"} 或 {"date", "timestamp", "prices": {产品名: 价格}}
+  JSON:  上述对象组成的数组，或旧版 prices.json 格式 {"records": [...]}
+"""
+import csv
+import json
+import time
+from datetime import date as date_type
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from .history_store import HistoryStore
+
+# 流式读取JSON数组的块大小(字符)
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+class ExportRow(NamedTuple):
+    """导出文件中的一条报价"""
+    date: str
+    timestamp: Optional[str]
+    product: str
+    price: float
+
+
+class BackfillResult(NamedTuple):
+    """导入结果"""
+    rows_read: int  # 读取的有效报价行数
+    rows_invalid: int  # 无法解析而跳过的行数
+    rows_existing: int  # 日期已有记录而跳过的行数
+    duplicates: int  # 文件中重复的 (日期, 产品)，保留最后一条
+    records_added: int
+    rows_written: int
+    parse_seconds: float
+    insert_seconds: float
+
+    @property
+    def seconds(self) -> float:
+        return self.parse_seconds + self.insert_seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        """整体吞吐量（读取的行数 / 总耗时）"""
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+
+def _parse_date(value) -> str:
+    """日期统一为 YYYY-MM-DD（接受 2024/01/02 和完整时间戳）"""
+    day = str(value).strip().replace("/", "-")[:10]
+    date_type.fromisoformat(day)
+    return day
+
+
+def _parse_price(value) -> float:
+    """价格转为数字（接受 "$45.00"、"1,234.5"）"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).strip().lstrip("$").replace(",", ""))
+
+
+def _rows_from_object(item: dict) -> Iterator[ExportRow]:
+    """单个对象：单条报价或一次记录的全部价格"""
+    day = _parse_date(item.get("date") or item["timestamp"])
+    timestamp = item.get("timestamp")
+    if "prices" in item:
+        for product, price in item["prices"].items():
+            if price is not None:
+                yield ExportRow(day, timestamp, product, _parse_price(price))
+    else:
+        yield ExportRow(day, timestamp, item["product"].strip(), _parse_price(item["price"]))
+
+
+def _iter_json_array(f, chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[dict]:
+    """逐个解码JSON数组中的对象，不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("JSON 导出文件应为对象数组")
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size and not eof:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+def iter_export_rows(path: Path, errors: list = None) -> Iterator[ExportRow]:
+    """
+    流式读取导出文件中的报价
+
+    Args:
+        path: 导出文件路径，按扩展名识别格式（.csv / .jsonl / .ndjson / .json）
+        errors: 传入列表时记录无法解析的行（行号或序号, 错误），否则直接跳过
+
+    Yields:
+        ExportRow
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if suffix == ".csv":
+            reader = csv.reader(f)
+            header = [name.strip().lower() for name in next(reader, [])]
+            missing = {"date", "product", "price"} - set(header)
+            if missing:
+                raise ValueError(f"CSV 缺少列: {', '.join(sorted(missing))}")
+            date_col, product_col, price_col = (header.index(name) for name in ("date", "product", "price"))
+            timestamp_col = header.index("timestamp") if "timestamp" in header else None
+            for line_no, fields in enumerate(reader, 2):
+                try:
+                    yield ExportRow(
+                        _parse_date(fields[date_col]),
+                        fields[timestamp_col] or None if timestamp_col is not None else None,
+                        fields[product_col].strip(),
+                        _parse_price(fields[price_col]),
+                    )
+                except (IndexError, ValueError) as e:
+                    if errors is not None:
+                        errors.append((line_no, repr(e)))
+            return
+
+        if suffix in (".jsonl", ".ndjson"):
+            items = ((line_no, line) for line_no, line in enumerate(f, 1) if line.strip())
+        else:
+            head = f.read(1)
+            while head and head.isspace():
+                head = f.read(1)
+            if head == "{":
+                # 旧版 prices.json：整个文件是一个对象，直接读取
+                items = enumerate(json.loads(head + f.read()).get("records", []), 1)
+            else:
+                f.seek(0)
+                items = enumerate(_iter_json_array(f), 1)
+
+        for line_no, item in items:
+            try:
+                yield from _rows_from_object(json.loads(item) if isinstance(item, str) else item)
+            except (KeyError, ValueError, AttributeError, TypeError) as e:
+                if errors is not None:
+                    errors.append((line_no, repr(e)))
+
+
+def backfill(
+    path: Path,
+    store: HistoryStore = None,
+    full: bool = True,
+    batch_size: int = None,
+) -> BackfillResult:
+    """
+    导入历史价格
+
+    同一日期的报价合并为一个快照；历史存储中已有记录的日期整天跳过，
+    重复导入同一文件不会产生重复数据。
+
+    Args:
+        path: 导出文件
+        store: 历史存储，默认为 data/prices.db
+        full: 每个日期的报价是否为当天的完整价格表（否则只更新出现的产品，不标记下架）
+        batch_size: 每批插入的价格行数
+
+    Returns:
+        BackfillResult
+    """
+    store = store or HistoryStore()
+    existing_dates = set(store.record_dates())
+    errors: list = []
+    snapshots: Dict[str, Tuple[str, Dict[str, float]]] = {}
+    rows_read = rows_existing = duplicates = 0
+
+    started = time.perf_counter()
+    for row in iter_export_rows(path, errors):
+        rows_read += 1
+        if row.date in existing_dates:
+            rows_existing += 1
+            continue
+        snapshot = snapshots.get(row.date)
+        if snapshot is None:
+            snapshot = snapshots[row.date] = (row.timestamp or f"{row.date}T00:00:00", {})
+        prices = snapshot[1]
+        if row.product in prices:
+            duplicates += 1
+        prices[row.product] = row.price
+    parsed = time.perf_counter()
+
+    records_added, rows_written = store.import_snapshots(snapshots, full=full, batch_size=batch_size)
+    if records_added:
+        store.export_jsonl()
+    finished = time.perf_counter()
+
+    for line_no, error in errors[:5]:
+        print(f"⚠️ 跳过无法解析的第 {line_no} 行: {error}")
+    return BackfillResult(
+        rows_read=rows_read,
+        rows_invalid=len(errors),
+        rows_existing=rows_existing,
+        duplicates=duplicates,
+        records_added=records_added,
+        rows_written=rows_written,
+        parse_seconds=parsed - started,
+        insert_seconds=finished - parsed,
+    )
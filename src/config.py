@@ -10,7 +10,19 @@ PROJECT_ROOT = Path(__file__).parent.parent
 # 数据目录
 DATA_DIR = PROJECT_ROOT / "data"
 PRODUCTS_FILE = DATA_DIR / "products.json"
-PRICES_FILE = DATA_DIR / "prices.json"
+ALERTS_FILE = DATA_DIR / "alerts.json"
+SUBSCRIBERS_FILE = DATA_DIR / "subscribers.json"
+PRICES_FILE = DATA_DIR / "prices.json"  # 旧格式，仅用于一次性迁移
+PRICES_DB = DATA_DIR / "prices.db"  # 不提交到仓库，不存在时从 PRICES_EXPORT 还原
+PRICES_EXPORT = DATA_DIR / "prices.jsonl"  # 历史数据的文本导出（每次运行后更新，提交到仓库）
+FX_RATES_FILE = Path(os.getenv("FX_RATES_FILE", DATA_DIR / "fx_rates.csv"))  # 本地汇率文件
+
+# 本地缓存目录（不提交到仓库）
+CACHE_DIR = DATA_DIR / "cache"
+HTTP_CACHE_FILE = CACHE_DIR / "http_cache.json"
+OUTBOX_DB = CACHE_DIR / "outbox.db"
+TEMPLATE_CACHE_DIR = CACHE_DIR / "templates"
+USER_AGENT_CACHE_FILE = CACHE_DIR / "user_agents.json"
 
 # 邮件配置 (从环境变量读取)
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.qq.com")
@@ -18,12 +30,83 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
 SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")  # QQ邮箱授权码
 RECIPIENT_EMAIL = os.getenv("RECIPIENT_EMAIL", "289997689@qq.com")
+# 支持多个收件人，用逗号分隔
+RECIPIENT_EMAILS = [addr.strip() for addr in RECIPIENT_EMAIL.split(",") if addr.strip()]
+SMTP_TIMEOUT = 30
+SMTP_SEND_RATE = float(os.getenv("SMTP_SEND_RATE", "5"))  # 每秒最多发送的邮件数，0 表示不限速
+
+# 发件队列重试配置
+OUTBOX_BACKOFF_BASE = 60  # 首次重试间隔(秒)，之后指数增长
+OUTBOX_BACKOFF_MAX = 6 * 3600  # 最大重试间隔(秒)
+OUTBOX_MAX_ATTEMPTS = 10
+# 已发送/已放弃的邮件在队列中保留的天数，之后在投递时删除
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
 
 # 爬虫配置
 REQUEST_TIMEOUT = 10
 REQUEST_DELAY = (1, 3)  # 请求间隔范围(秒)
 MAX_RETRIES = 3
 
+# 闪存市场价格页面 {数据源键: {url, category(报告分类名)}}
+# 页面需与内存条渠道市场页面的表格结构相同（产品、价格、涨跌、涨跌幅、上周价、周高、周低等列，
+# 由 table_parser.PriceTableParser 解析）。默认只包含已确认的内存条渠道市场页面，
+# CFM_SOURCES_FILE 指定的 JSON 文件（格式同上）存在时替换默认列表，添加页面无需修改代码
+CFM_SOURCES = {
+    "ddr_channel": {
+        "url": "https://www.chinaflashmarket.com/pricecenter/ddrchannel",
+        "category": "内存条(渠道市场)",
+    },
+}
+CFM_SOURCES_FILE = Path(os.getenv("CFM_SOURCES_FILE", DATA_DIR / "sources.json"))
+
+# 并发抓取配置
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "2"))  # 单个站点最大并发数
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "60"))  # 全部数据源的总时限(秒)
+
+# User-Agent 池（本地缓存，过期后重新从 fake_useragent 采样）
+USER_AGENT_POOL_SIZE = 50
+USER_AGENT_CACHE_TTL = 30 * 24 * 3600
+
+# 个性化报告渲染进程数（0 为CPU核数）；关注列表报告少于阈值时在主进程中渲染
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+RENDER_PROCESS_THRESHOLD = 8
+
+# 历史记录每隔多少条写入一次全量快照（其余为只含变化的增量记录）
+HISTORY_CHECKPOINT_INTERVAL = int(os.getenv("HISTORY_CHECKPOINT_INTERVAL", "10"))
+
+# 历史数据导入每批插入的价格行数
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "5000"))
+
+# 币种：数据源未标明币种时按美元处理；报告和提醒中的价格同时显示以下币种
+DEFAULT_CURRENCY = "USD"
+REPORT_CURRENCY = os.getenv("REPORT_CURRENCY", "USD,CNY")
+REPORT_CURRENCIES = [code.strip().upper() for code in REPORT_CURRENCY.split(",") if code.strip()]
+
+# 查询服务（main.py serve）
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_CACHE_SIZE = 512  # 内存中缓存的响应数（历史数据变化时全部失效）
+API_GZIP_MIN_BYTES = 1024  # 响应体超过该大小且客户端支持时使用 gzip
+
+# 运行指标文件（.prom 为 Prometheus 文本格式，其余为JSON；为空时不导出）
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+
+# 常驻模式调度（秒）
+DAEMON_POLL_INTERVAL = int(os.getenv("DAEMON_POLL_INTERVAL", "3600"))  # 平时轮询间隔
+DAEMON_FAST_INTERVAL = int(os.getenv("DAEMON_FAST_INTERVAL", "300"))  # 更新窗口内轮询间隔
+DAEMON_WINDOW_BEFORE = 5 * 60  # 更新窗口: 周二 11:00 前 5 分钟
+DAEMON_WINDOW_AFTER = 3 * 3600  # 至 11:00 后 3 小时
+
+# 请求限流与熔断
+FETCH_RATE = float(os.getenv("FETCH_RATE", "2"))  # 每秒请求数（令牌桶），0 表示不限速
+FETCH_RATE_BURST = int(os.getenv("FETCH_RATE_BURST", "4"))  # 允许的突发请求数
+BREAKER_FAILURE_THRESHOLD = 3  # 同一站点连续多少次连接错误或 5xx 响应后熔断
+BREAKER_RESET_TIMEOUT = 300  # 熔断后多久放行试探请求(秒)
+RETRY_BACKOFF_BASE = 1  # 重试退避初始间隔(秒)
+RETRY_BACKOFF_MAX = 30  # 重试退避最大间隔(秒)
+
 # 京东API
 JD_PRICE_API = "https://p.3.cn/prices/mgets"
 JD_PRODUCT_URL = "https://item.jd.com/{sku}.html"
+JD_BATCH_SIZE = int(os.getenv("JD_BATCH_SIZE", "20"))  # 每次 mgets 请求的SKU数上限
@@ -0,0 +1,251 @@
+"""
+币种换算模块
+汇率来自本地汇率文件（不依赖在线汇率服务），导入历史存储后按日期查询；
+报告和提醒的单日换算只用到逐个汇率，不导入 numpy；价格序列和价格矩阵
+按币种分组后一次向量化换算（此时才导入 numpy），每个 (币种, 日期区间) 的逐日汇率只计算一次
+
+汇率文件格式（汇率为 1 单位外币折合多少人民币）:
+  CSV:  表头为 date, currency, rate，每行一个币种一天的汇率
+  JSON: {"USD": {"2026-01-20": 7.12, ...}, ...}
+"""
+import csv
+import json
+from bisect import bisect_right
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .config import DEFAULT_CURRENCY, FX_RATES_FILE, REPORT_CURRENCIES
+from .history_store import DateLike, HistoryStore
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 汇率的计价币种
+BASE_CURRENCY = "CNY"
+
+CURRENCY_SYMBOLS = {"USD": "$", "CNY": "¥"}
+CURRENCY_NAMES = {"USD": "美元", "CNY": "人民币"}
+
+# 已导入的汇率文件签名（修改时间和大小）在存储元数据中的键
+RATES_FILE_META_KEY = "fx_rates_file"
+
+
+def _day(value: DateLike) -> str:
+    """日期参数统一为 YYYY-MM-DD 字符串（接受完整时间戳）"""
+    if isinstance(value, date):
+        return value.isoformat()[:10]
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+
+def currency_symbol(currency: str) -> str:
+    """币种符号，没有符号的币种使用代码"""
+    return CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+
+
+def currency_label(currency: str) -> str:
+    """币种名称和代码，如 美元 (USD)"""
+    name = CURRENCY_NAMES.get(currency)
+    return f"{name} ({currency})" if name else currency
+
+
+def format_price(value: float, currency: str) -> str:
+    """带币种符号的价格文本"""
+    return f"{currency_symbol(currency)}{value:.2f}"
+
+
+def iter_rate_file(path: Path) -> Iterator[Tuple[str, str, float]]:
+    """
+    读取汇率文件
+
+    Yields:
+        (币种, 日期, 1单位折合人民币)
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() == ".json":
+            for currency, rates in json.load(f).items():
+                for day, rate in rates.items():
+                    yield currency.upper(), _day(day), float(rate)
+            return
+        for row in csv.DictReader(f):
+            row = {key.strip().lower(): value for key, value in row.items() if key}
+            yield row["currency"].strip().upper(), _day(row["date"].strip()), float(row["rate"])
+
+
+def sync_rate_file(store: HistoryStore, path: Path = None) -> int:
+    """
+    汇率文件有变化时导入历史存储
+
+    Returns:
+        导入的汇率条数，文件不存在或未变化时为 0
+    """
+    path = Path(path or FX_RATES_FILE)
+    try:
+        stat = path.stat()
+    except OSError:
+        return 0
+    signature = f"{path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+    if store.get_meta(RATES_FILE_META_KEY) == signature:
+        return 0
+    try:
+        count = store.put_fx_rates(iter_rate_file(path))
+    except (OSError, KeyError, ValueError, AttributeError) as e:
+        print(f"❌ 读取汇率文件失败: {e}")
+        return 0
+    store.set_meta(RATES_FILE_META_KEY, signature)
+    print(f"💱 已从 {path.name} 导入 {count} 条汇率")
+    return count
+
+
+class CurrencyConverter:
+    """
+    按日期换算价格
+
+    某一天的汇率取当天或之前最近一天的汇率，最早的汇率之前没有汇率（换算结果为 NaN）。
+    逐日汇率按 (币种, 起始日期, 结束日期) 缓存，汇率写入后缓存失效。
+    """
+
+    def __init__(self, store: HistoryStore = None):
+        self.store = store or HistoryStore()
+        self._cache: Dict[Tuple[str, str, str], "np.ndarray"] = {}
+        self._version: Optional[int] = None
+
+    def daily_rates(self, currency: str, since: DateLike, until: DateLike = None) -> "np.ndarray":
+        """since 至 until（含）每天 1 单位 currency 折合多少人民币"""
+        import numpy as np
+
+        currency = currency.upper()
+        since = _day(since)
+        until = _day(until) if until is not None else since
+        if self._version != self.store.fx_version:
+            self._cache.clear()
+            self._version = self.store.fx_version
+
+        key = (currency, since, until)
+        rates = self._cache.get(key)
+        if rates is None:
+            days = np.arange(np.datetime64(since, "D"), np.datetime64(until, "D") + 1)
+            if currency == BASE_CURRENCY:
+                rates = np.ones(len(days))
+            else:
+                dates, values = self.store.get_fx_rates(currency)
+                rates = np.full(len(days), np.nan)
+                if dates:
+                    positions = np.searchsorted(np.array(dates, dtype="datetime64[D]"), days, side="right") - 1
+                    known = positions >= 0
+                    rates[known] = np.asarray(values)[positions[known]]
+            rates.flags.writeable = False
+            self._cache[key] = rates
+        return rates
+
+    def _rate_on(self, currency: str, day: str) -> Optional[float]:
+        """day 当天 1 单位 currency 折合多少人民币，最早的汇率之前为 None"""
+        if currency == BASE_CURRENCY:
+            return 1.0
+        dates, values = self.store.get_fx_rates(currency)
+        position = bisect_right(dates, day) - 1
+        return values[position] if position >= 0 else None
+
+    def rate(self, currency: str, target: str, day: DateLike) -> Optional[float]:
+        """day 当天 1 单位 currency 折合多少 target，没有汇率时为 None"""
+        currency, target, day = currency.upper(), target.upper(), _day(day)
+        if currency == target:
+            return 1.0
+        source, quote = self._rate_on(currency, day), self._rate_on(target, day)
+        return source / quote if source is not None and quote else None
+
+    def factors(self, currency: str, target: str, since: DateLike, until: DateLike = None) -> "np.ndarray":
+        """since 至 until（含）每天 1 单位 currency 折合多少 target"""
+        import numpy as np
+
+        if currency.upper() == target.upper():
+            return np.ones(len(self.daily_rates(BASE_CURRENCY, since, until)))
+        return self.daily_rates(currency, since, until) / self.daily_rates(target, since, until)
+
+    def convert(
+        self,
+        values,
+        currencies: Union[str, Sequence[str]],
+        target: str,
+        since: DateLike,
+        until: DateLike = None,
+    ) -> "np.ndarray":
+        """
+        将一列价格（或产品 × 日期矩阵）换算为 target
+
+        每个币种的逐日换算系数只取一次，按行的币种索引后与价格整体相乘。
+
+        Args:
+            values: 形状为 (产品数,) 时按 until（默认为 since）当天的汇率换算；
+                形状为 (产品数, 日期数) 时各列依次对应 since 至 until 的每一天
+            currencies: 每行的币种，所有行相同时可传入单个币种
+            target: 目标币种
+
+        Returns:
+            换算后的价格，没有汇率的位置为 NaN
+        """
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        if isinstance(currencies, str):
+            table = self.factors(currencies, target, since, until)[None, :]
+        else:
+            codes, inverse = np.unique(np.asarray(currencies, dtype=str), return_inverse=True)
+            if not len(codes):
+                return values.copy()
+            table = np.vstack([self.factors(code, target, since, until) for code in codes])[inverse]
+        if values.ndim == 1:
+            return values * table[:, -1]
+        return values * table
+
+    def convert_points(
+        self, dates: Sequence[str], values: Sequence[float], currency: str, target: str
+    ) -> "np.ndarray":
+        """将一个产品的价格序列（日期升序）按各点当天的汇率换算为 target"""
+        import numpy as np
+
+        if not len(dates):
+            return np.array([], dtype=float)
+        days = np.array(dates, dtype="datetime64[D]")
+        factors = self.factors(currency, target, dates[0], dates[-1])
+        return np.asarray(values, dtype=float) * factors[(days - days[0]).astype(np.int64)]
+
+    def convert_matrix(self, matrix, target: str):
+        """
+        将 analytics.PriceMatrix 换算为 target
+
+        产品币种取自历史存储（没有记录的产品为 DEFAULT_CURRENCY）。
+        """
+        if not matrix.dates.size:
+            return matrix
+        known = self.store.product_currencies()
+        currencies = [known.get(product, DEFAULT_CURRENCY) for product in matrix.products]
+        since, until = str(matrix.dates[0]), str(matrix.dates[-1])
+        return matrix._replace(values=self.convert(matrix.values, currencies, target, since, until))
+
+    def converted_texts(
+        self,
+        prices: Sequence[float],
+        currencies: Sequence[str],
+        day: DateLike,
+        targets: Sequence[str] = None,
+    ) -> List[str]:
+        """
+        每个价格折算为其他报告币种后的文本（如 "¥320.40"，多个币种以 " / " 分隔）
+
+        每个 (币种, 报告币种) 的汇率只查询一次。与价格本身币种相同的报告币种和
+        没有汇率的币种不显示。
+        """
+        targets = targets if targets is not None else REPORT_CURRENCIES
+        texts: List[List[str]] = [[] for _ in prices]
+        if not texts:
+            return []
+        day = _day(day)
+        for target in targets:
+            rates = {currency: self.rate(currency, target, day) for currency in set(currencies)}
+            for parts, currency, price in zip(texts, currencies, prices):
+                rate = rates[currency]
+                if currency != target and rate is not None:
+                    parts.append(format_price(price * rate, target))
+        return [" / ".join(parts) for parts in texts]
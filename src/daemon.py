@@ -0,0 +1,114 @@
+"""
+常驻运行模块
+进程常驻内存，按闪存市场的更新时间（每周二 11:00 GMT+8）安排抓取：
+更新窗口内高频轮询，拿到本周数据后恢复低频轮询
+"""
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from .config import (
+    DAEMON_FAST_INTERVAL,
+    DAEMON_POLL_INTERVAL,
+    DAEMON_WINDOW_AFTER,
+    DAEMON_WINDOW_BEFORE,
+)
+
+# 闪存市场更新时间: 每周二 11:00 (GMT+8)
+CFM_TZ = timezone(timedelta(hours=8))
+CFM_UPDATE_WEEKDAY = 1  # 周二
+CFM_UPDATE_HOUR = 11
+
+
+def update_window(now: datetime) -> tuple:
+    """
+    当前或下一个更新窗口
+
+    Args:
+        now: 当前时间（带时区）
+
+    Returns:
+        (窗口开始, 窗口结束)，若本周窗口已结束则返回下周的窗口
+    """
+    local = now.astimezone(CFM_TZ)
+    update_at = (local - timedelta(days=(local.weekday() - CFM_UPDATE_WEEKDAY) % 7)).replace(
+        hour=CFM_UPDATE_HOUR, minute=0, second=0, microsecond=0
+    )
+    end = update_at + timedelta(seconds=DAEMON_WINDOW_AFTER)
+    if local >= end:
+        update_at += timedelta(weeks=1)
+        end += timedelta(weeks=1)
+    return update_at - timedelta(seconds=DAEMON_WINDOW_BEFORE), end
+
+
+def parse_update_time(update_time: Optional[str]) -> Optional[datetime]:
+    """解析页面上的更新时间（GMT+8）"""
+    if not update_time:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d%H:%M"):
+        try:
+            return datetime.strptime(update_time.strip(), fmt).replace(tzinfo=CFM_TZ)
+        except ValueError:
+            continue
+    return None
+
+
+class MonitorDaemon:
+    """常驻调度器"""
+
+    def __init__(self, run_once: Callable[[], Optional[str]]):
+        """
+        Args:
+            run_once: 执行一次监控，返回数据更新时间（失败时返回 None）
+        """
+        self.run_once = run_once
+        self.last_update_time: Optional[datetime] = None
+        self._stop_event = threading.Event()
+
+    def next_delay(self, now: datetime) -> float:
+        """
+        距离下一次抓取的秒数
+
+        更新窗口内且尚未拿到本次更新时按高频间隔轮询；
+        其余时间按低频间隔轮询，但不会错过下一个窗口的开始。
+        """
+        start, end = update_window(now)
+        update_at = start + timedelta(seconds=DAEMON_WINDOW_BEFORE)
+        if start <= now < end:
+            if self.last_update_time and self.last_update_time >= update_at:
+                return max(1.0, min(DAEMON_POLL_INTERVAL, (end - now).total_seconds()))
+            return DAEMON_FAST_INTERVAL
+        return max(1.0, min(DAEMON_POLL_INTERVAL, (start - now).total_seconds()))
+
+    def tick(self):
+        """执行一次监控并记录数据更新时间"""
+        try:
+            update_time = parse_update_time(self.run_once())
+        except Exception as e:
+            print(f"❌ 监控运行出错: {e}")
+            return
+        if update_time and (self.last_update_time is None or update_time > self.last_update_time):
+            self.last_update_time = update_time
+
+    def stop(self, *_):
+        """停止调度（可作为信号处理函数）"""
+        self._stop_event.set()
+
+    def run_forever(self):
+        """循环执行直到收到 SIGINT/SIGTERM"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print("🛰️ 常驻模式已启动（Ctrl+C 退出）")
+
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            self.tick()
+            delay = self.next_delay(datetime.now(CFM_TZ))
+            next_run = datetime.now(CFM_TZ) + timedelta(seconds=delay)
+            print(f"⏳ 本次耗时 {time.monotonic() - started:.1f}s，"
+                  f"下次抓取: {next_run.strftime('%Y-%m-%d %H:%M:%S')} (GMT+8)\n")
+            self._stop_event.wait(delay)
+
+        print("👋 常驻模式已退出")
@@ -3,16 +3,38 @@
 """
 import smtplib
 import ssl
+import time
+from datetime import datetime
+from email.message import Message
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email.utils import getaddresses
+from typing import Dict, Iterable, Tuple
 
 from .config import (
     RECIPIENT_EMAIL,
+    RECIPIENT_EMAILS,
     SMTP_EMAIL,
     SMTP_PASSWORD,
     SMTP_PORT,
+    SMTP_SEND_RATE,
     SMTP_SERVER,
+    SMTP_TIMEOUT,
 )
+from .metrics import metrics
+
+# 连接断开时的重连次数
+RECONNECT_ATTEMPTS = 2
+
+# 需要重连的SMTP错误（其余 SMTPException 只影响当前邮件）
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """SMTP服务器永久拒绝（5xx，如收件人不存在），重试不会成功"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
 
 
 class EmailSender:
@@ -30,6 +52,158 @@ class EmailSender:
         self.email = email or SMTP_EMAIL
         self.password = password or SMTP_PASSWORD
 
+    def _has_credentials(self) -> bool:
+        """检查SMTP账号配置"""
+        if not self.email or not self.password:
+            print("❌ 错误: 未配置SMTP邮箱或授权码")
+            print("   请设置环境变量 SMTP_EMAIL 和 SMTP_PASSWORD")
+            return False
+        return True
+
+    def build_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: str = None,
+    ) -> MIMEMultipart:
+        """
+        创建邮件
+
+        Args:
+            to_email: 收件人邮箱
+            subject: 邮件主题
+            html_content: HTML内容
+            text_content: 纯文本内容（可选，作为备用）
+
+        Returns:
+            MIME邮件
+        """
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = self.email
+        msg["To"] = to_email
+
+        # 添加纯文本版本（作为备用）
+        if text_content:
+            text_part = MIMEText(text_content, "plain", "utf-8")
+            msg.attach(text_part)
+
+        # 添加HTML版本
+        html_part = MIMEText(html_content, "html", "utf-8")
+        msg.attach(html_part)
+        return msg
+
+    def _connect(self) -> smtplib.SMTP_SSL:
+        """建立SMTP连接并登录"""
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(
+            self.smtp_server, self.smtp_port, context=context, timeout=SMTP_TIMEOUT
+        )
+        server.login(self.email, self.password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP_SSL):
+        """关闭SMTP连接（忽略已断开的连接）"""
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def send_batch(
+        self,
+        messages: Iterable[Message],
+        rate: float = None,
+        errors: Dict[str, Exception] = None,
+    ) -> Dict[str, bool]:
+        """
+        批量发送邮件，复用同一个已登录的SMTP连接
+
+        连接断开时自动重连；按 rate 限制发送速率。
+
+        Args:
+            messages: MIME邮件（收件人取自 To 头），可以是生成器
+            rate: 每秒最多发送的邮件数，默认读取 SMTP_SEND_RATE，0 表示不限速
+            errors: 传入时填入被服务器拒绝的单封邮件的错误 {收件人: SMTPException}
+
+        Returns:
+            {收件人: 是否发送成功}
+        """
+        messages = iter(messages)
+        results: Dict[str, bool] = {}
+        if not self._has_credentials():
+            for msg in messages:
+                results[msg["To"]] = False
+            return results
+
+        rate = SMTP_SEND_RATE if rate is None else rate
+        interval = 1 / rate if rate > 0 else 0
+        server = None
+        next_send_at = 0.0
+
+        try:
+            for msg in messages:
+                to_email = msg["To"]
+                to_addrs = [addr for _, addr in getaddresses([to_email])]
+
+                # 速率限制
+                wait = next_send_at - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                next_send_at = time.monotonic() + interval
+
+                for attempt in range(RECONNECT_ATTEMPTS):
+                    try:
+                        if server is None:
+                            with metrics.timer("smtp_connect_seconds"):
+                                server = self._connect()
+                        with metrics.timer("smtp_send_seconds"):
+                            server.sendmail(self.email, to_addrs, msg.as_string())
+                        results[to_email] = True
+                        print(f"✅ 邮件发送成功: {to_email}")
+                        break
+                    except smtplib.SMTPAuthenticationError:
+                        raise
+                    except OSError as e:
+                        # SMTPException 也是 OSError 的子类：已连接时的收件人被拒、邮件被拒等
+                        # 单封邮件错误不影响连接（smtplib 已发送 RSET），记为失败后继续发送后续邮件
+                        if (
+                            isinstance(e, smtplib.SMTPException)
+                            and not isinstance(e, CONNECTION_ERRORS)
+                            and server is not None
+                        ):
+                            print(f"❌ SMTP错误: {to_email}: {e}")
+                            results[to_email] = False
+                            if errors is not None:
+                                errors[to_email] = e
+                            break
+                        # 连接问题：关闭后重连
+                        self._close(server)
+                        server = None
+                        metrics.inc("smtp_reconnects_total")
+                        if attempt == RECONNECT_ATTEMPTS - 1:
+                            raise ConnectionError(e)
+
+        except (smtplib.SMTPAuthenticationError, ConnectionError) as e:
+            # 认证失败或重连后仍无法连接：剩余邮件全部记为失败
+            if isinstance(e, smtplib.SMTPAuthenticationError):
+                print("❌ SMTP认证失败，请检查邮箱和授权码")
+            else:
+                print(f"❌ SMTP连接失败: {e}")
+            results[to_email] = False
+            for msg in messages:
+                results[msg["To"]] = False
+        finally:
+            self._close(server)
+
+        sent = sum(results.values())
+        metrics.inc("smtp_messages_total", sent, result="sent")
+        metrics.inc("smtp_messages_total", len(results) - sent, result="failed")
+        return results
+
     def send(
         self,
         to_email: str,
@@ -49,71 +223,91 @@ class EmailSender:
         Returns:
             是否发送成功
         """
-        if not self.email or not self.password:
-            print("❌ 错误: 未配置SMTP邮箱或授权码")
-            print("   请设置环境变量 SMTP_EMAIL 和 SMTP_PASSWORD")
+        if not self._has_credentials():
             return False
 
         try:
-            # 创建邮件
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = self.email
-            msg["To"] = to_email
-
-            # 添加纯文本版本（作为备用）
-            if text_content:
-                text_part = MIMEText(text_content, "plain", "utf-8")
-                msg.attach(text_part)
-
-            # 添加HTML版本
-            html_part = MIMEText(html_content, "html", "utf-8")
-            msg.attach(html_part)
-
-            # 发送邮件
-            context = ssl.create_default_context()
-            
-            with smtplib.SMTP_SSL(
-                self.smtp_server, self.smtp_port, context=context
-            ) as server:
-                server.login(self.email, self.password)
-                server.sendmail(self.email, to_email, msg.as_string())
-
-            print(f"✅ 邮件发送成功: {to_email}")
-            return True
-
-        except smtplib.SMTPAuthenticationError:
-            print("❌ SMTP认证失败，请检查邮箱和授权码")
-            return False
-        except smtplib.SMTPException as e:
-            print(f"❌ SMTP错误: {e}")
-            return False
+            msg = self.build_message(to_email, subject, html_content, text_content)
         except Exception as e:
-            print(f"❌ 发送邮件时出错: {e}")
+            print(f"❌ 创建邮件时出错: {e}")
             return False
 
-    def send_price_report(self, html_content: str, text_content: str = None) -> bool:
+        return self.send_batch([msg]).get(to_email, False)
+
+    def send_price_report(
+        self,
+        html_content: str,
+        text_content: str = None,
+        outbox=None,
+    ) -> bool:
         """
         发送价格报告邮件
         
         Args:
             html_content: HTML报告内容
             text_content: 纯文本报告内容
+            outbox: 发件队列，传入时只加入队列，由 Outbox.drain 投递
             
         Returns:
-            是否发送成功
+            是否发送成功（使用发件队列时为是否已加入队列）
         """
-        from datetime import datetime
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        subject = f"📊 内存/SSD 价格监控报告 - {today}"
-        
-        return self.send(
-            to_email=RECIPIENT_EMAIL,
-            subject=subject,
-            html_content=html_content,
-            text_content=text_content,
+        return self.send_reports(
+            ((to_email, html_content, text_content) for to_email in RECIPIENT_EMAILS),
+            outbox=outbox,
+        )
+
+    def send_reports(self, reports: Iterable[Tuple[str, str, str]], outbox=None) -> bool:
+        """
+        发送每个收件人各自的价格报告
+
+        邮件在迭代 reports 时逐封创建并立即加入队列或发送，不会同时持有全部报告。
+
+        Args:
+            reports: (收件人, HTML报告, 纯文本报告)，可以是生成器
+            outbox: 发件队列，传入时只加入队列，由 Outbox.drain 投递
+
+        Returns:
+            是否全部发送成功（使用发件队列时为是否已加入队列）
+        """
+        subject = f"📊 内存/SSD 价格监控报告 - {datetime.now().strftime('%Y-%m-%d')}"
+        messages = (
+            self.build_message(to_email, subject, html_content, text_content)
+            for to_email, html_content, text_content in reports
         )
+        if outbox is not None:
+            for msg in messages:
+                outbox.enqueue(msg)
+            return True
+
+        results = self.send_batch(messages)
+        return bool(results) and all(results.values())
+
+    def send_alert(
+        self,
+        to_email: str,
+        html_content: str,
+        text_content: str = None,
+        count: int = 1,
+        outbox=None,
+    ) -> bool:
+        """
+        发送价格提醒邮件
+
+        Args:
+            to_email: 收件人
+            html_content: HTML内容
+            text_content: 纯文本内容
+            count: 提醒条数（用于邮件主题）
+            outbox: 发件队列，传入时只加入队列
+
+        Returns:
+            是否发送成功（使用发件队列时为是否已加入队列）
+        """
+        msg = self.build_message(to_email, f"🔔 价格提醒: {count} 条", html_content, text_content)
+        if outbox is not None:
+            outbox.enqueue(msg)
+            return True
+        return self.send_batch([msg]).get(to_email, False)
 
 
 def test_email():
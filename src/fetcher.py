@@ -0,0 +1,112 @@
+"""
+并发抓取引擎
+所有数据源在线程池中并发执行，按站点限制并发数，并受全局时限约束
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+from urllib.parse import urlparse
+
+from .config import (
+    FETCH_DEADLINE,
+    FETCH_MAX_WORKERS,
+    FETCH_PER_HOST_LIMIT,
+)
+from .metrics import metrics
+
+
+class FetchTask(NamedTuple):
+    """
+    抓取任务
+
+    Attributes:
+        key: 结果字典中的键
+        url: 目标地址（用于按站点限流）
+        func: 实际执行抓取的函数，参数为剩余时间预算(秒)
+    """
+    key: str
+    url: str
+    func: Callable[[float], Any]
+
+
+class FetchEngine:
+    """并发抓取引擎"""
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        per_host_limit: int = None,
+    ):
+        self.max_workers = max_workers or FETCH_MAX_WORKERS
+        self.per_host_limit = per_host_limit or FETCH_PER_HOST_LIMIT
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """获取站点对应的并发信号量"""
+        host = urlparse(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slot
+            return slot
+
+    def _run_task(self, task: FetchTask, expires_at: float) -> Any:
+        """在站点并发限制内执行单个任务"""
+        slot = self._host_slot(task.url)
+        if not slot.acquire(timeout=max(0.0, expires_at - time.monotonic())):
+            raise TimeoutError(f"等待站点配额超时: {task.url}")
+        try:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"超出全局时限: {task.url}")
+            with metrics.timer("fetch_task_seconds", task=task.key):
+                return task.func(remaining)
+        finally:
+            slot.release()
+
+    def run(self, tasks: Iterable[FetchTask], deadline: Optional[float] = None) -> dict:
+        """
+        并发执行所有抓取任务
+
+        Args:
+            tasks: 抓取任务列表
+            deadline: 全局时限(秒)，超时未完成的任务将被放弃
+
+        Returns:
+            {task.key: 任务结果}，失败或超时的任务不在结果中
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return {}
+
+        deadline = deadline if deadline is not None else FETCH_DEADLINE
+        expires_at = time.monotonic() + deadline
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks)))
+        futures = {
+            executor.submit(self._run_task, task, expires_at): task
+            for task in tasks
+        }
+        done, pending = wait(futures, timeout=deadline)
+
+        results = {}
+        for future in done:
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {task.key} 抓取失败: {e}")
+                continue
+            if result:
+                results[task.key] = result
+
+        for future in pending:
+            future.cancel()
+            print(f"⏱️ {futures[future].key} 超出全局时限 ({deadline:.0f}s)，已放弃")
+
+        # 不等待超时任务，它们的请求超时已被剩余预算限制
+        executor.shutdown(wait=False, cancel_futures=True)
+        return results
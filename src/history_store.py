@@ -0,0 +1,887 @@
+"""
+历史价格存储模块
+基于 SQLite 的追加式存储：每次运行只追加新记录，不重写历史数据。
+记录分为全量快照（checkpoint）和增量记录（delta）：增量记录只保存新增、变化和下架
+（价格为 NULL）的产品，查询序列时按记录日期向前填充还原每次运行时的完整状态
+"""
+import json
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date as date_type
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .config import (
+    BACKFILL_BATCH_SIZE,
+    HISTORY_CHECKPOINT_INTERVAL,
+    PRICES_DB,
+    PRICES_EXPORT,
+    PRICES_FILE,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'full'
+);
+CREATE TABLE IF NOT EXISTS prices (
+    record_id INTEGER NOT NULL REFERENCES records(id),
+    product TEXT NOT NULL,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    price REAL
+);
+-- 覆盖索引：按产品+日期的区间查询只需读取索引
+CREATE INDEX IF NOT EXISTS idx_prices_series ON prices(product, date, timestamp, price);
+CREATE INDEX IF NOT EXISTS idx_prices_record ON prices(record_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+-- 每个在售产品的最新价格
+CREATE TABLE IF NOT EXISTS latest (
+    product TEXT PRIMARY KEY,
+    price REAL NOT NULL,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    record_id INTEGER NOT NULL
+);
+-- 汇率：1 单位外币在当天折合多少人民币
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency TEXT NOT NULL,
+    date TEXT NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (currency, date)
+);
+-- 产品的计价币种（没有记录的产品为 DEFAULT_CURRENCY）
+CREATE TABLE IF NOT EXISTS product_currency (
+    product TEXT PRIMARY KEY,
+    currency TEXT NOT NULL
+);
+-- 产品最近一次出现时所在的分类
+CREATE TABLE IF NOT EXISTS product_category (
+    product TEXT PRIMARY KEY,
+    category TEXT NOT NULL
+);
+"""
+
+SCHEMA_VERSION = "2"
+
+# 记录类型
+KIND_FULL = "full"
+KIND_DELTA = "delta"
+
+# 降采样频率
+FREQ_RAW = None
+FREQ_DAILY = "daily"
+FREQ_WEEKLY = "weekly"
+
+# SQLite 单条语句的参数个数上限（保守取值）
+_MAX_SQL_PARAMS = 900
+
+DateLike = Union[str, date_type, None]
+
+
+def _date_str(value: DateLike) -> Optional[str]:
+    """日期参数统一为 YYYY-MM-DD 字符串"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()[:10]
+
+
+@lru_cache(maxsize=8192)
+def _week_key(day: str) -> Tuple[int, int]:
+    """日期所在的ISO周 (年, 周)"""
+    return date_type.fromisoformat(day).isocalendar()[:2]
+
+
+class HistoryStore:
+    """
+    历史价格存储
+
+    数据库在第一次访问时才打开；新建数据库时从文本导出（export_jsonl 写入的
+    prices.jsonl）还原，没有导出文件时从旧的 prices.json 迁移；
+    旧版本的数据库自动升级为增量格式。
+    连接在线程间共享（如查询服务的各请求线程），所有读写都在同一把锁内进行。
+    """
+
+    def __init__(self, path: Path = None, legacy_json: Path = None, export_file: Path = None):
+        self.path = Path(path or PRICES_DB)
+        self.legacy_json = Path(legacy_json or PRICES_FILE)
+        # 文本导出默认与数据库同名（data/prices.db 对应 data/prices.jsonl）
+        if export_file is None:
+            export_file = PRICES_EXPORT if path is None else self.path.with_suffix(".jsonl")
+        self.export_file = Path(export_file)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # 按天序列的内存索引 {产品名: (日期列表, 价格列表, ISO周列表)}
+        self._daily: Dict[str, Tuple[list, list, list]] = {}
+        # 所有记录的日期（去重升序），序列按这些日期向前填充
+        self._record_dates: Optional[List[str]] = None
+        # 最新状态 {产品名: 价格}（latest 表的内存副本）
+        self._latest: Optional[Dict[str, float]] = None
+        # 汇率 {币种: (日期列表, 汇率列表)} 和产品币种 {产品名: 币种} 的内存副本
+        self._fx_rates: Dict[str, Tuple[List[str], List[float]]] = {}
+        self._product_currencies: Optional[Dict[str, str]] = None
+        # 产品分类 {产品名: 分类名} 的内存副本
+        self._product_categories: Optional[Dict[str, str]] = None
+        # 汇率写入次数，换算结果的缓存据此失效
+        self.fx_version = 0
+        # 价格记录写入次数（含检测到的其他进程写入），依赖历史价格的缓存据此失效
+        self.history_version = 0
+        # 上次 refresh 时数据库的 data_version
+        self._data_version: Optional[int] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """数据库连接（延迟打开）"""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+                    if self.get_meta("json_migrated") is None:
+                        self.set_meta("schema_version", SCHEMA_VERSION)
+                        if self.export_file.exists():
+                            self.restore_export(self.export_file)
+                        else:
+                            self.migrate_from_json(self.legacy_json)
+                    elif self.get_meta("schema_version") != SCHEMA_VERSION:
+                        self._upgrade_schema()
+        return self._conn
+
+    def _upgrade_schema(self):
+        """
+        将旧版本（每次全量快照、无下架标记）的数据库升级为增量格式
+
+        按记录顺序回放，为从快照中消失的产品补写下架标记，并重建 latest 表。
+        """
+        with self._lock, self._conn as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(records)")]
+            if "kind" not in columns:
+                conn.execute(f"ALTER TABLE records ADD COLUMN kind TEXT NOT NULL DEFAULT '{KIND_FULL}'")
+
+            state: Dict[str, tuple] = {}
+            tombstones = []
+            records = conn.execute("SELECT id, date, timestamp FROM records ORDER BY id").fetchall()
+            rows = conn.execute(
+                "SELECT record_id, product, price FROM prices WHERE price IS NOT NULL ORDER BY record_id"
+            ).fetchall()
+            by_record: Dict[int, Dict[str, float]] = {}
+            for record_id, product, price in rows:
+                by_record.setdefault(record_id, {})[product] = price
+
+            for record_id, day, timestamp in records:
+                prices = by_record.get(record_id, {})
+                for product in list(state):
+                    if product not in prices:
+                        tombstones.append((record_id, product, day, timestamp, None))
+                        del state[product]
+                for product, price in prices.items():
+                    state[product] = (price, day, timestamp, record_id)
+
+            conn.executemany(
+                "INSERT INTO prices (record_id, product, date, timestamp, price) VALUES (?, ?, ?, ?, ?)",
+                tombstones,
+            )
+            conn.execute("DELETE FROM latest")
+            conn.executemany(
+                "INSERT INTO latest (product, price, date, timestamp, record_id) VALUES (?, ?, ?, ?, ?)",
+                [(product, *values) for product, values in state.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (SCHEMA_VERSION,)
+            )
+        self._daily.clear()
+        self._record_dates = None
+        self._latest = None
+        self.history_version += 1
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def refresh(self) -> bool:
+        """
+        其他进程写入数据库后丢弃内存缓存
+
+        只读的长驻进程（如查询服务）在读取前调用；本连接自己的写入不算作变化。
+
+        Returns:
+            数据库自上次调用以来是否被其他连接修改（第一次调用返回 True）
+        """
+        with self._lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return False
+            self._data_version = version
+            self._daily.clear()
+            self._record_dates = None
+            self._latest = None
+            self._fx_rates.clear()
+            self._product_currencies = None
+            self._product_categories = None
+            self.fx_version += 1
+            self.history_version += 1
+            return True
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取元数据"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        """写入元数据"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def append_record(self, date: str, timestamp: str, prices: dict, full: bool = True) -> int:
+        """
+        追加一次运行的价格记录
+
+        Args:
+            date: 日期 YYYY-MM-DD
+            timestamp: ISO格式时间戳
+            prices: full 为 True 时是全量快照 {产品名: 价格}，快照中没有的在售产品记为下架；
+                full 为 False 时是相对最新状态的变化 {产品名: 新价格，下架为 None}
+            full: 是否为全量快照
+
+        Returns:
+            新记录的ID
+        """
+        with self._lock, self.conn:
+            latest = self._latest_state()
+            changes = dict(prices)
+            if full:
+                for product in latest.keys() - changes.keys():
+                    changes[product] = None
+            else:
+                # 下架标记只对在售产品有意义
+                changes = {
+                    product: price for product, price in changes.items()
+                    if price is not None or product in latest
+                }
+
+            cursor = self.conn.execute(
+                "INSERT INTO records (date, timestamp, kind) VALUES (?, ?, ?)",
+                (date, timestamp, KIND_FULL if full else KIND_DELTA),
+            )
+            record_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO prices (record_id, product, date, timestamp, price) VALUES (?, ?, ?, ?, ?)",
+                [(record_id, product, date, timestamp, price) for product, price in changes.items()],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO latest (product, price, date, timestamp, record_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (product, price, date, timestamp, record_id)
+                    for product, price in changes.items() if price is not None
+                ],
+            )
+            self.conn.executemany(
+                "DELETE FROM latest WHERE product = ?",
+                [(product,) for product, price in changes.items() if price is None],
+            )
+            self._update_daily(date, changes, latest)
+            for product, price in changes.items():
+                if price is None:
+                    latest.pop(product, None)
+                else:
+                    latest[product] = price
+            self.history_version += 1
+        return record_id
+
+    def import_snapshots(
+        self,
+        snapshots: Dict[str, Tuple[str, Dict[str, float]]],
+        full: bool = True,
+        batch_size: int = None,
+    ) -> Tuple[int, int]:
+        """
+        批量导入历史快照（可早于已有记录）
+
+        已有记录的日期不导入。导入的每个日期写入一条增量记录，只包含相对该日期之前
+        （按日期合并后的时间线）状态的变化；导入日期之后的第一个已有日期补写恢复行，
+        使已有日期上还原出的状态保持不变。全部写入在同一个事务中，按 batch_size 分批插入。
+
+        Args:
+            snapshots: {日期: (时间戳, {产品名: 价格})}
+            full: 快照是否为当天的完整价格表（是则快照中没有的在售产品记为下架）
+            batch_size: 每批插入的价格行数，默认 BACKFILL_BATCH_SIZE
+
+        Returns:
+            (新增记录数, 写入的价格行数)
+        """
+        batch_size = batch_size or BACKFILL_BATCH_SIZE
+        with self._lock, self.conn as conn:
+            existing_dates = set(self._load_record_dates())
+            import_dates = sorted(day for day in snapshots if day not in existing_dates)
+            if not import_dates:
+                return 0, 0
+            max_record_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+            # 每个已有日期的最后一条记录，恢复行写在这条记录上
+            last_record = {}
+            for day, record_id, timestamp in conn.execute(
+                "SELECT date, id, timestamp FROM records ORDER BY date, timestamp, id"
+            ):
+                last_record[day] = (record_id, timestamp)
+            # 只需扫描到最后一个导入日期之后的第一个已有日期
+            later = [day for day in last_record if day > import_dates[-1]]
+            scan_until = min(later) if later else import_dates[-1]
+            existing_rows = conn.execute(
+                "SELECT date, product, price, timestamp, record_id FROM prices "
+                "WHERE date <= ? AND record_id <= ? ORDER BY date, timestamp, record_id",
+                (scan_until, max_record_id),
+            )
+
+            # original: 已有记录还原出的状态；merged: 加入导入记录后读取时还原出的状态
+            # 值为 (价格, 日期, 时间戳, 记录ID)，下架的产品不在其中
+            original: Dict[str, tuple] = {}
+            merged: Dict[str, tuple] = {}
+            batch: list = []
+            records_added = rows_written = 0
+
+            def flush():
+                nonlocal batch, rows_written
+                conn.executemany(
+                    "INSERT INTO prices (record_id, product, date, timestamp, price) VALUES (?, ?, ?, ?, ?)",
+                    batch,
+                )
+                rows_written += len(batch)
+                batch = []
+
+            diverged = False
+
+            def apply_existing(day: str, rows: list):
+                nonlocal diverged
+                for product, price, timestamp, record_id in rows:
+                    for state in (original, merged):
+                        if price is None:
+                            state.pop(product, None)
+                        else:
+                            state[product] = (price, day, timestamp, record_id)
+                if not diverged:
+                    return
+                # 导入的记录改变了此前的状态：补写恢复行，使该日期的状态与导入前相同
+                record_id, timestamp = last_record[day]
+                for product in merged.keys() | original.keys():
+                    before, after = original.get(product), merged.get(product)
+                    price = before[0] if before else None
+                    if price != (after[0] if after else None):
+                        batch.append((record_id, product, day, timestamp, price))
+                merged.clear()
+                merged.update(original)
+                diverged = False
+
+            def apply_import(day: str):
+                nonlocal diverged, records_added
+                timestamp, prices = snapshots[day]
+                record_id = conn.execute(
+                    "INSERT INTO records (date, timestamp, kind) VALUES (?, ?, ?)",
+                    (day, timestamp, KIND_DELTA),
+                ).lastrowid
+                records_added += 1
+                changes = {
+                    product: price for product, price in prices.items()
+                    if product not in merged or merged[product][0] != price
+                }
+                if full:
+                    changes.update((product, None) for product in merged.keys() - prices.keys())
+                for product, price in changes.items():
+                    batch.append((record_id, product, day, timestamp, price))
+                    if price is None:
+                        merged.pop(product)
+                    else:
+                        merged[product] = (price, day, timestamp, record_id)
+                diverged = True
+
+            # 按日期合并已有日期和导入日期，依次回放
+            timeline = sorted(
+                [(day, False) for day in last_record if day <= scan_until]
+                + [(day, True) for day in import_dates]
+            )
+            row = next(existing_rows, None)
+            for day, imported in timeline:
+                if imported:
+                    apply_import(day)
+                else:
+                    rows = []
+                    while row is not None and row[0] == day:
+                        rows.append(row[1:])
+                        row = next(existing_rows, None)
+                    apply_existing(day, rows)
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+
+            # 导入日期晚于全部已有记录时，最新状态由导入的记录决定
+            if not later:
+                conn.execute("DELETE FROM latest")
+                conn.executemany(
+                    "INSERT INTO latest (product, price, date, timestamp, record_id) VALUES (?, ?, ?, ?, ?)",
+                    [(product, *values) for product, values in merged.items()],
+                )
+
+        self._daily.clear()
+        self._record_dates = None
+        self._latest = None
+        self.history_version += 1
+        return records_added, rows_written
+
+    def checkpoint_due(self, interval: int = None) -> bool:
+        """距离上一个全量快照已有 interval - 1 条增量记录（或还没有快照）时应写入全量快照"""
+        interval = interval or HISTORY_CHECKPOINT_INTERVAL
+        with self._lock:
+            last_full = self.conn.execute(
+                "SELECT MAX(id) FROM records WHERE kind = ?", (KIND_FULL,)
+            ).fetchone()[0]
+            if last_full is None:
+                return True
+            deltas = self.conn.execute(
+                "SELECT COUNT(*) FROM records WHERE id > ?", (last_full,)
+            ).fetchone()[0]
+        return deltas >= interval - 1
+
+    def _latest_state(self) -> Dict[str, float]:
+        """最新状态的内存副本（首次使用时从 latest 表载入）"""
+        if self._latest is None:
+            self._latest = dict(self.conn.execute("SELECT product, price FROM latest"))
+        return self._latest
+
+    def last_prices(self) -> dict:
+        """每个在售产品的最新价格 {产品名: 价格}"""
+        with self._lock:
+            return dict(self._latest_state())
+
+    def latest_records(self) -> List[Tuple[str, float, str]]:
+        """每个在售产品的最新价格 [(产品名, 价格, 日期), ...]，按产品名排序"""
+        with self._lock:
+            rows = self.conn.execute("SELECT product, price, date FROM latest ORDER BY product").fetchall()
+        return [tuple(row) for row in rows]
+
+    def products(self) -> List[str]:
+        """所有出现过的产品名"""
+        with self._lock:
+            rows = self.conn.execute("SELECT DISTINCT product FROM prices ORDER BY product").fetchall()
+        return [row[0] for row in rows]
+
+    def record_count(self) -> int:
+        """记录总数"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def record_dates(self) -> List[str]:
+        """所有记录日期（去重升序）"""
+        with self._lock:
+            return list(self._load_record_dates())
+
+    def _load_record_dates(self) -> List[str]:
+        """所有记录日期（去重升序）"""
+        if self._record_dates is None:
+            self._record_dates = [
+                row[0] for row in self.conn.execute("SELECT DISTINCT date FROM records ORDER BY date")
+            ]
+        return self._record_dates
+
+    def _load_daily(self, products: List[str]):
+        """
+        将未缓存产品的按天序列一次性载入内存索引
+
+        读取产品的变化点（同一天只保留最后一条），再按记录日期向前填充，
+        得到每个有运行记录的日期上的价格；下架期间没有数据点。
+        """
+        missing = [product for product in products if product not in self._daily]
+        if not missing:
+            return
+        record_dates = self._load_record_dates()
+        changes = {product: ([], []) for product in missing}
+        for start in range(0, len(missing), _MAX_SQL_PARAMS):
+            chunk = missing[start:start + _MAX_SQL_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT product, date, price FROM prices "
+                f"WHERE product IN ({placeholders}) ORDER BY product, date, timestamp",
+                chunk,
+            )
+            for product, day, price in rows:
+                change_dates, change_values = changes[product]
+                if change_dates and change_dates[-1] == day:
+                    # 同一天多条记录只保留最后一条
+                    change_values[-1] = price
+                else:
+                    change_dates.append(day)
+                    change_values.append(price)
+
+        for product, (change_dates, change_values) in changes.items():
+            dates, values, weeks = [], [], []
+            if change_dates:
+                value = None
+                position = 0
+                for day in record_dates[bisect_left(record_dates, change_dates[0]):]:
+                    if position < len(change_dates) and change_dates[position] == day:
+                        value = change_values[position]
+                        position += 1
+                    if value is not None:
+                        dates.append(day)
+                        values.append(value)
+                        weeks.append(_week_key(day))
+            self._daily[product] = (dates, values, weeks)
+
+    def _update_daily(self, date: str, changes: dict, latest: dict):
+        """
+        追加记录后同步更新已载入的内存索引
+
+        Args:
+            date: 记录日期
+            changes: 本次写入的变化 {产品名: 价格或 None}
+            latest: 写入前的最新状态，未变化的在售产品沿用其价格
+        """
+        if self._record_dates is not None:
+            if not self._record_dates or self._record_dates[-1] < date:
+                self._record_dates.append(date)
+            elif self._record_dates[-1] != date:
+                # 乱序写入，丢弃全部索引，下次查询时重新载入
+                self._record_dates = None
+                self._daily.clear()
+                return
+
+        for product in list(self._daily):
+            if product in changes:
+                price = changes[product]
+            else:
+                price = latest.get(product)
+            dates, values, weeks = self._daily[product]
+            if price is None:
+                # 已下架：当天若已有数据点则移除
+                if dates and dates[-1] == date and product in changes:
+                    dates.pop()
+                    values.pop()
+                    weeks.pop()
+                continue
+            if dates and dates[-1] == date:
+                values[-1] = price
+            elif not dates or dates[-1] < date:
+                dates.append(date)
+                values.append(price)
+                weeks.append(_week_key(date))
+            else:
+                del self._daily[product]
+
+    def get_series_batch(
+        self,
+        products: Iterable[str],
+        since: DateLike = None,
+        until: DateLike = None,
+        freq: Optional[str] = FREQ_DAILY,
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        批量获取多个产品的价格序列
+
+        按天序列第一次查询时载入内存并按日期索引，之后的区间查询为二分查找。
+
+        Args:
+            products: 产品名列表
+            since: 起始日期（含），None 表示不限
+            until: 结束日期（含），None 表示不限
+            freq: None 为原始记录，"daily" 每天取最后一条，"weekly" 每周取最后一条
+
+        Returns:
+            {产品名: [(日期, 价格), ...]}，按时间升序；没有数据的产品为空列表
+        """
+        products = list(dict.fromkeys(products))
+        since, until = _date_str(since), _date_str(until)
+
+        if freq is FREQ_RAW:
+            return self._raw_series(products, since, until)
+
+        series = {}
+        with self._lock:
+            self._load_daily(products)
+            for product in products:
+                dates, values, weeks = self._daily[product]
+                lo = bisect_left(dates, since) if since else 0
+                hi = bisect_right(dates, until) if until else len(dates)
+                if freq == FREQ_WEEKLY:
+                    # 每周取最后一个观测值（日期为该观测值的日期）
+                    points = [
+                        (dates[i], values[i])
+                        for i in range(lo, hi)
+                        if i + 1 == hi or weeks[i + 1] != weeks[i]
+                    ]
+                else:
+                    points = list(zip(dates[lo:hi], values[lo:hi]))
+                series[product] = points
+        return series
+
+    def _raw_series(
+        self, products: List[str], since: Optional[str], until: Optional[str]
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """原始记录序列：实际写入的价格（全量快照和变化点，同一天可能有多条）"""
+        series: Dict[str, List[Tuple[str, float]]] = {product: [] for product in products}
+        date_filter = ""
+        params: list = []
+        if since:
+            date_filter += " AND date >= ?"
+            params.append(since)
+        if until:
+            date_filter += " AND date <= ?"
+            params.append(until)
+
+        with self._lock:
+            for start in range(0, len(products), _MAX_SQL_PARAMS):
+                chunk = products[start:start + _MAX_SQL_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT product, date, price FROM prices WHERE product IN ({placeholders})"
+                    f" AND price IS NOT NULL{date_filter} ORDER BY product, timestamp",
+                    chunk + params,
+                )
+                for product, day, price in rows:
+                    series[product].append((day, price))
+        return series
+
+    def get_series(
+        self,
+        product: str,
+        since: DateLike = None,
+        until: DateLike = None,
+        freq: Optional[str] = FREQ_DAILY,
+    ) -> List[Tuple[str, float]]:
+        """获取单个产品的价格序列，参数同 get_series_batch"""
+        return self.get_series_batch([product], since, until, freq)[product]
+
+    def put_fx_rates(self, rates: Iterable[Tuple[str, DateLike, float]]) -> int:
+        """
+        写入汇率，同一币种同一日期的汇率覆盖旧值
+
+        Args:
+            rates: [(币种, 日期, 1单位折合人民币), ...]
+
+        Returns:
+            写入的条数
+        """
+        rows = [(currency.upper(), _date_str(day), float(rate)) for currency, day, rate in rates]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO fx_rates (currency, date, rate) VALUES (?, ?, ?)", rows
+            )
+            self._fx_rates.clear()
+            self.fx_version += 1
+        return len(rows)
+
+    def get_fx_rates(self, currency: str) -> Tuple[List[str], List[float]]:
+        """币种的全部汇率 (日期列表, 汇率列表)，按日期升序"""
+        currency = currency.upper()
+        with self._lock:
+            if currency not in self._fx_rates:
+                rows = self.conn.execute(
+                    "SELECT date, rate FROM fx_rates WHERE currency = ? ORDER BY date", (currency,)
+                ).fetchall()
+                self._fx_rates[currency] = ([row[0] for row in rows], [row[1] for row in rows])
+            return self._fx_rates[currency]
+
+    def fx_currencies(self) -> List[str]:
+        """有汇率数据的币种"""
+        with self._lock:
+            rows = self.conn.execute("SELECT DISTINCT currency FROM fx_rates ORDER BY currency").fetchall()
+        return [row[0] for row in rows]
+
+    def product_currencies(self) -> Dict[str, str]:
+        """已记录的产品币种 {产品名: 币种}"""
+        with self._lock:
+            if self._product_currencies is None:
+                self._product_currencies = dict(
+                    self.conn.execute("SELECT product, currency FROM product_currency")
+                )
+            return self._product_currencies
+
+    def set_product_currencies(self, currencies: Dict[str, str]) -> int:
+        """记录产品币种，只写入与已记录不同的产品；返回写入的条数"""
+        with self._lock:
+            known = self.product_currencies()
+            changed = [
+                (product, currency) for product, currency in currencies.items()
+                if known.get(product) != currency
+            ]
+            if changed:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO product_currency (product, currency) VALUES (?, ?)", changed
+                    )
+                known.update(changed)
+        return len(changed)
+
+    def product_categories(self) -> Dict[str, str]:
+        """已记录的产品分类 {产品名: 分类名}"""
+        with self._lock:
+            if self._product_categories is None:
+                self._product_categories = dict(
+                    self.conn.execute("SELECT product, category FROM product_category")
+                )
+            return self._product_categories
+
+    def set_product_categories(self, categories: Dict[str, str]) -> int:
+        """记录产品分类，只写入与已记录不同的产品；返回写入的条数"""
+        with self._lock:
+            known = self.product_categories()
+            changed = [
+                (product, category) for product, category in categories.items()
+                if known.get(product) != category
+            ]
+            if changed:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO product_category (product, category) VALUES (?, ?)", changed
+                    )
+                known.update(changed)
+        return len(changed)
+
+    def export_jsonl(self, path: Path = None) -> int:
+        """
+        将全部历史导出为 JSON Lines 文本（提交到仓库代替二进制数据库，差异可读）
+
+        第一行为元数据、产品币种和产品分类，之后每行一条记录（按记录ID，
+        价格为 null 表示下架）。已有记录不变，每次运行通常只在末尾增加一行。
+
+        Returns:
+            导出的记录数
+        """
+        path = Path(path or self.export_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        count = 0
+        with self._lock:
+            header = {
+                "meta": dict(self.conn.execute("SELECT key, value FROM meta ORDER BY key")),
+                "currencies": dict(
+                    self.conn.execute("SELECT product, currency FROM product_currency ORDER BY product")
+                ),
+                "categories": dict(
+                    self.conn.execute("SELECT product, category FROM product_category ORDER BY product")
+                ),
+            }
+            records = self.conn.execute("SELECT id, date, timestamp, kind FROM records ORDER BY id")
+            rows = self.conn.execute("SELECT record_id, product, price FROM prices ORDER BY record_id, rowid")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":")) + "\n")
+                row = next(rows, None)
+                for record_id, day, timestamp, kind in records:
+                    prices = {}
+                    while row is not None and row[0] == record_id:
+                        prices[row[1]] = row[2]
+                        row = next(rows, None)
+                    record = {
+                        "id": record_id, "date": day, "timestamp": timestamp, "kind": kind, "prices": prices,
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    count += 1
+        os.replace(tmp_path, path)
+        return count
+
+    def restore_export(self, path: Path) -> int:
+        """
+        从 export_jsonl 的导出文件还原历史（新建数据库时自动调用）
+
+        记录ID和每条记录的价格行原样写入，再按日期顺序回放重建 latest 表。
+
+        Returns:
+            还原的记录数
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            lines = (line for line in f if line.strip())
+            header = json.loads(next(lines, "{}"))
+            with self._lock, self.conn as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", header.get("meta", {}).items()
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO product_currency (product, currency) VALUES (?, ?)",
+                    header.get("currencies", {}).items(),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO product_category (product, category) VALUES (?, ?)",
+                    header.get("categories", {}).items(),
+                )
+                count = 0
+                for line in lines:
+                    record = json.loads(line)
+                    day, timestamp = record["date"], record["timestamp"]
+                    conn.execute(
+                        "INSERT INTO records (id, date, timestamp, kind) VALUES (?, ?, ?, ?)",
+                        (record["id"], day, timestamp, record.get("kind", KIND_FULL)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO prices (record_id, product, date, timestamp, price) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (record["id"], product, day, timestamp, price)
+                            for product, price in record.get("prices", {}).items()
+                        ],
+                    )
+                    count += 1
+
+                state: Dict[str, tuple] = {}
+                for product, price, day, timestamp, record_id in conn.execute(
+                    "SELECT product, price, date, timestamp, record_id FROM prices "
+                    "ORDER BY date, timestamp, record_id, rowid"
+                ):
+                    if price is None:
+                        state.pop(product, None)
+                    else:
+                        state[product] = (price, day, timestamp, record_id)
+                conn.execute("DELETE FROM latest")
+                conn.executemany(
+                    "INSERT INTO latest (product, price, date, timestamp, record_id) VALUES (?, ?, ?, ?, ?)",
+                    [(product, *values) for product, values in state.items()],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(count),)
+                )
+        self._daily.clear()
+        self._record_dates = None
+        self._latest = None
+        self._product_currencies = None
+        self._product_categories = None
+        self.history_version += 1
+        if count:
+            print(f"📦 已从 {Path(path).name} 还原 {count} 条历史记录")
+        return count
+
+    def migrate_from_json(self, json_path: Path) -> int:
+        """
+        从旧的 prices.json 一次性迁移历史记录
+
+        Args:
+            json_path: 旧格式文件路径
+
+        Returns:
+            迁移的记录数
+        """
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            history = {}
+
+        records = sorted(history.get("records", []), key=lambda r: r.get("timestamp", ""))
+        for record in records:
+            self.append_record(record["date"], record["timestamp"], record.get("prices", {}))
+
+        self.set_meta("json_migrated", str(len(records)))
+        if records:
+            print(f"📦 已从 {Path(json_path).name} 迁移 {len(records)} 条历史记录")
+        return len(records)
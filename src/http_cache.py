@@ -0,0 +1,92 @@
+"""
+HTTP响应缓存模块
+按URL持久化 ETag/Last-Modified、页面内容哈希和解析结果，
+页面未变化时跳过下载或解析
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .config import HTTP_CACHE_FILE
+
+
+class ResponseCache:
+    """磁盘响应缓存"""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or HTTP_CACHE_FILE)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        """加载缓存文件"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        """原子写入缓存文件（调用方需持有锁）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, url: str) -> Optional[dict]:
+        """获取URL的缓存条目"""
+        with self._lock:
+            return self._entries.get(url)
+
+    def validators(self, url: str) -> dict:
+        """
+        生成条件请求头
+
+        Returns:
+            If-None-Match / If-Modified-Since 请求头，没有缓存时为空
+        """
+        entry = self.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, response_headers, content_hash: str, data: dict):
+        """
+        保存URL的响应信息和解析结果
+
+        Args:
+            url: 请求地址
+            response_headers: 响应头（用于提取 ETag/Last-Modified）
+            content_hash: 页面内容哈希
+            data: 解析后的价格数据
+        """
+        with self._lock:
+            self._entries[url] = {
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "content_hash": content_hash,
+                "fetched_at": datetime.now().isoformat(),
+                "data": data,
+            }
+            self._save()
+
+    def refresh(self, url: str, response_headers=None):
+        """页面未变化时更新校验信息和时间戳，保留解析结果"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if not entry:
+                return
+            if response_headers is not None:
+                entry["etag"] = response_headers.get("ETag") or entry.get("etag")
+                entry["last_modified"] = response_headers.get("Last-Modified") or entry.get("last_modified")
+            entry["fetched_at"] = datetime.now().isoformat()
+            self._save()
@@ -0,0 +1,163 @@
+"""
+京东价格批量获取模块
+将 data/products.json 中的SKU按接口上限分批，通过 mgets 接口并发获取价格
+"""
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+from .config import (
+    FETCH_DEADLINE,
+    JD_BATCH_SIZE,
+    JD_PRICE_API,
+    MAX_RETRIES,
+    PRODUCTS_FILE,
+    REQUEST_TIMEOUT,
+)
+from .fetcher import FetchEngine, FetchTask
+from .product_record import ProductRecord
+
+
+class JDPriceFetcher:
+    """京东价格批量获取"""
+
+    def __init__(
+        self,
+        api_url: str = None,
+        products_file: Path = None,
+        batch_size: int = None,
+        session: requests.Session = None,
+        engine: FetchEngine = None,
+    ):
+        self.api_url = api_url or JD_PRICE_API
+        self.products_file = Path(products_file or PRODUCTS_FILE)
+        self.batch_size = batch_size or JD_BATCH_SIZE
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json, text/javascript, */*",
+            "Referer": "https://item.jd.com/",
+        })
+        self.engine = engine or FetchEngine()
+
+    def load_products(self) -> Dict[str, List[dict]]:
+        """读取监控商品配置 {分类名: [{sku, name, brand}, ...]}"""
+        try:
+            with open(self.products_file, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"❌ 读取京东商品配置失败: {e}")
+            return {}
+        return {
+            category: cat_data.get("products", [])
+            for category, cat_data in config.get("categories", {}).items()
+        }
+
+    def _fetch_chunk(self, skus: List[str], budget: float) -> Dict[str, dict]:
+        """
+        获取一批SKU的价格
+
+        Returns:
+            {sku: {"price": 当前价, "original_price": 原价}}，无货或下架的SKU不在结果中
+        """
+        expires_at = time.monotonic() + budget
+        params = {"skuIds": ",".join(f"J_{sku}" for sku in skus), "type": "1"}
+
+        for attempt in range(MAX_RETRIES):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self.session.get(
+                    self.api_url, params=params, timeout=min(REQUEST_TIMEOUT, remaining)
+                )
+                response.raise_for_status()
+                items = response.json()
+            except (requests.RequestException, ValueError) as e:
+                print(f"京东价格请求失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {e}")
+                if attempt < MAX_RETRIES - 1:
+                    time.sleep(min(2 ** attempt, max(0, expires_at - time.monotonic())))
+                continue
+
+            prices = {}
+            for item in items:
+                sku = str(item.get("id", "")).replace("J_", "", 1)
+                try:
+                    price = float(item.get("p", -1))
+                except (TypeError, ValueError):
+                    continue
+                # 价格为 -1 表示无货或已下架
+                if price <= 0:
+                    continue
+                try:
+                    original_price = float(item.get("op") or price)
+                except (TypeError, ValueError):
+                    original_price = price
+                prices[sku] = {"price": price, "original_price": original_price}
+            return prices
+
+        raise RuntimeError(f"京东价格获取失败: {len(skus)} 个SKU")
+
+    def fetch_all(self, deadline: Optional[float] = None) -> dict:
+        """
+        并发获取所有SKU的价格
+
+        Args:
+            deadline: 全局时限(秒)
+
+        Returns:
+            {分类名: {update_time, realtime, currency, source, url, products: [...]}}，
+            与 CFMScraper.fetch_all_prices 的输出结构一致
+        """
+        catalog = self.load_products()
+        skus = list(dict.fromkeys(
+            str(product["sku"]) for products in catalog.values() for product in products
+        ))
+        if not skus:
+            return {}
+
+        chunks = [skus[i:i + self.batch_size] for i in range(0, len(skus), self.batch_size)]
+        tasks = [
+            FetchTask(f"jd_{index}", self.api_url, lambda budget, chunk=chunk: self._fetch_chunk(chunk, budget))
+            for index, chunk in enumerate(chunks)
+        ]
+        fetched = self.engine.run(tasks, deadline=deadline if deadline is not None else FETCH_DEADLINE)
+
+        prices = {}
+        for chunk_prices in fetched.values():
+            prices.update(chunk_prices)
+
+        update_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+        results = {}
+        for category, products in catalog.items():
+            items = []
+            for product in products:
+                sku = str(product["sku"])
+                quote = prices.get(sku)
+                if not quote:
+                    continue
+                items.append(ProductRecord(
+                    product=product.get("name", sku),
+                    price=quote["price"],
+                    trend="flat",
+                ))
+            if items:
+                results[category] = {
+                    "update_time": update_time,
+                    # 实时报价没有页面更新时间，update_time 为获取时间
+                    "realtime": True,
+                    "currency": "CNY",
+                    "source": "京东",
+                    "url": "https://www.jd.com/",
+                    "products": items,
+                }
+
+        print(f"✅ 京东: 获取到 {sum(len(d['products']) for d in results.values())}/{len(skus)} 个SKU价格")
+        return results
+
+    def as_task(self) -> FetchTask:
+        """作为 CFMScraper.fetch_all_prices 的额外任务，与闪存市场页面并发获取"""
+        return FetchTask("jd", self.api_url, lambda budget: self.fetch_all(deadline=budget))
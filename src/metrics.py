@@ -0,0 +1,161 @@
+"""
+运行指标模块
+轻量的计数器和计时器，记录各阶段耗时、HTTP请求/重试、下载字节数、解析行数和缓存命中，
+可导出为 Prometheus 文本格式（node_exporter textfile）或 JSON
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple
+
+# 指标名前缀
+PREFIX = "price_monitor_"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    pairs = []
+    for k, v in key:
+        v = v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{k}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """线程安全的指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        # 计时器: {名称: {标签: [次数, 总秒数, 最大秒数]}}
+        self._timers: Dict[str, Dict[LabelKey, list]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器加 value"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """记录一次耗时"""
+        key = _label_key(labels)
+        with self._lock:
+            stats = self._timers.setdefault(name, {}).setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """计时上下文，异常退出时同样记录耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_total(self, name: str, **labels) -> float:
+        """计数器在匹配标签的序列上的合计"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(
+                value for key, value in self._counters.get(name, {}).items()
+                if wanted <= set(key)
+            )
+
+    def timer_total(self, name: str, **labels) -> float:
+        """计时器在匹配标签的序列上的总秒数"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(
+                stats[1] for key, stats in self._timers.get(name, {}).items()
+                if wanted <= set(key)
+            )
+
+    def cache_hit_rate(self) -> float:
+        """HTTP缓存命中率（304 或内容哈希未变化的请求占成功请求的比例）"""
+        hits = self.counter_total("http_cache_hits_total")
+        misses = self.counter_total("http_cache_misses_total")
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def to_dict(self) -> dict:
+        """导出为可JSON序列化的字典"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            timers = {
+                name: [
+                    {"labels": dict(key), "count": count, "sum": total, "max": peak}
+                    for key, (count, total, peak) in series.items()
+                ]
+                for name, series in self._timers.items()
+            }
+        return {
+            "timestamp": time.time(),
+            "counters": counters,
+            "timers": timers,
+            "cache_hit_rate": self.cache_hit_rate(),
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式（计时器导出为 summary 的 _count/_sum）"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._timers.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} summary")
+                for key, (count, total, _) in series.items():
+                    labels = _format_labels(key)
+                    lines.append(f"{metric}_count{labels} {count}")
+                    lines.append(f"{metric}_sum{labels} {total:.6f}")
+        lines.append(f"# TYPE {PREFIX}http_cache_hit_ratio gauge")
+        lines.append(f"{PREFIX}http_cache_hit_ratio {self.cache_hit_rate():.4f}")
+        lines.append(f"# TYPE {PREFIX}last_run_timestamp_seconds gauge")
+        lines.append(f"{PREFIX}last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Path):
+        """
+        原子写入指标文件
+
+        Args:
+            path: 以 .prom 结尾时写入 Prometheus 文本格式，否则写入JSON
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".prom":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+# 进程内共享的指标注册表
+metrics = Metrics()
@@ -0,0 +1,238 @@
+"""
+邮件发件队列模块
+渲染好的邮件先写入本地 SQLite 队列，再由投递任务按指数退避重试发送，
+SMTP 故障不会阻塞监控流程，失败的邮件在重启后仍会继续投递
+"""
+import email
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from email.message import Message
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .config import (
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_DB,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETENTION_DAYS,
+)
+from .email_sender import is_permanent_failure
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT,
+    body BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+"""
+
+# 邮件状态
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"  # 超过最大重试次数或被服务器永久拒绝
+
+
+class Outbox:
+    """本地发件队列"""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or OUTBOX_DB)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """旧版队列没有 finished_at 列：补上该列，已结束的邮件从现在开始计算保留期"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+        if "finished_at" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE outbox ADD COLUMN finished_at REAL")
+            self.conn.execute(
+                "UPDATE outbox SET finished_at = ? WHERE status != ?", (time.time(), STATUS_PENDING)
+            )
+
+    def enqueue(self, msg: Message) -> int:
+        """
+        将邮件加入队列
+
+        Args:
+            msg: 已渲染的MIME邮件（收件人取自 To 头）
+
+        Returns:
+            队列中的邮件ID
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (recipient, subject, body, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (msg["To"], msg["Subject"], msg.as_bytes(), time.time(), datetime.now().isoformat()),
+            )
+        return cursor.lastrowid
+
+    def due(self, limit: int = None) -> List[Tuple[int, Message]]:
+        """到达重试时间的待发邮件"""
+        query = (
+            "SELECT id, body FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at, id"
+        )
+        params: list = [STATUS_PENDING, time.time()]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [(message_id, email.message_from_bytes(body)) for message_id, body in rows]
+
+    def mark_sent(self, message_id: int):
+        """标记发送成功"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, "
+                "finished_at = ? WHERE id = ?",
+                (STATUS_SENT, time.time(), message_id),
+            )
+
+    def mark_failed(self, message_id: int, error: str = "", permanent: bool = False):
+        """标记发送失败，按指数退避安排下次重试，超过最大次数或永久失败时不再重试"""
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT attempts FROM outbox WHERE id = ?", (message_id,)
+            ).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+            delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+            delay *= random.uniform(0.8, 1.2)
+            status = STATUS_FAILED if permanent or attempts >= OUTBOX_MAX_ATTEMPTS else STATUS_PENDING
+            now = time.time()
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "finished_at = ? WHERE id = ?",
+                (status, attempts, now + delay, error,
+                 now if status == STATUS_FAILED else None, message_id),
+            )
+
+    def purge(self, retention_days: float = None) -> int:
+        """
+        删除超过保留期的已发送和已放弃邮件，待发邮件不受影响
+
+        Args:
+            retention_days: 保留天数，默认 OUTBOX_RETENTION_DAYS
+
+        Returns:
+            删除的邮件数
+        """
+        if retention_days is None:
+            retention_days = OUTBOX_RETENTION_DAYS
+        cutoff = time.time() - retention_days * 86400
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM outbox WHERE status != ? AND finished_at < ?", (STATUS_PENDING, cutoff)
+            )
+        return cursor.rowcount
+
+    def pending_count(self) -> int:
+        """待发送（含等待重试）的邮件数"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+
+    def next_attempt_in(self) -> Optional[float]:
+        """距离最近一封待发邮件的重试时间(秒)，没有待发邮件时为 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def drain(self, sender, limit: int = None) -> Tuple[int, int]:
+        """
+        投递所有到期邮件
+
+        同一批次中收件人不重复（发送结果按收件人返回），同一收件人的多封邮件分批发送。
+        被服务器永久拒绝（5xx）的邮件不再重试，连接失败等临时错误按退避重试。
+        投递结束后删除超过保留期的已结束邮件。
+
+        Args:
+            sender: EmailSender
+            limit: 本次最多投递的邮件数
+
+        Returns:
+            (成功数, 失败数)
+        """
+        sent = failed = 0
+        pending = self.due(limit)
+        while pending:
+            batch, rest, recipients = [], [], set()
+            for message_id, msg in pending:
+                if msg["To"] in recipients:
+                    rest.append((message_id, msg))
+                else:
+                    recipients.add(msg["To"])
+                    batch.append((message_id, msg))
+
+            errors = {}
+            results = sender.send_batch((msg for _, msg in batch), errors=errors)
+            for message_id, msg in batch:
+                if results.get(msg["To"]):
+                    self.mark_sent(message_id)
+                    sent += 1
+                else:
+                    error = errors.get(msg["To"])
+                    self.mark_failed(
+                        message_id,
+                        str(error) if error is not None else "SMTP发送失败",
+                        permanent=error is not None and is_permanent_failure(error),
+                    )
+                    failed += 1
+            pending = rest
+        self.purge()
+        return sent, failed
+
+    def close(self):
+        """关闭队列数据库"""
+        with self._lock:
+            self.conn.close()
+
+
+class OutboxWorker(threading.Thread):
+    """后台投递线程：按固定间隔投递到期邮件，直到 stop()"""
+
+    def __init__(self, outbox: Outbox, sender, interval: float = 30):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.outbox = outbox
+        self.sender = sender
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                sent, failed = self.outbox.drain(self.sender)
+                if sent or failed:
+                    print(f"📮 发件队列: 成功 {sent} 封, 失败 {failed} 封")
+            except Exception as e:
+                print(f"❌ 投递邮件时出错: {e}")
+            wait = self.outbox.next_attempt_in()
+            self._stop_event.wait(self.interval if wait is None else min(wait, self.interval))
+
+    def stop(self, timeout: float = None):
+        """停止投递线程"""
+        self._stop_event.set()
+        self.join(timeout)
@@ -1,116 +1,241 @@
 """
 价格追踪和变化检测模块
 """
+import hashlib
 import json
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Container, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
-from .config import PRICES_FILE
+from .config import DEFAULT_CURRENCY
+from .history_store import FREQ_DAILY, DateLike, HistoryStore
+from .metrics import metrics
+from .product_record import ProductRecord, category_meta
+
+# 上次处理的数据集指纹在存储元数据中的键
+FINGERPRINT_META_KEY = "dataset_fingerprint"
+
+
+class PriceDiff(NamedTuple):
+    """本次价格相对已存储最新状态的变化"""
+    added: Dict[str, float]  # 新增产品 {产品名: 价格}
+    removed: Dict[str, float]  # 下架产品 {产品名: 下架前价格}
+    changed: Dict[str, Tuple[float, float]]  # 价格变化 {产品名: (原价格, 新价格)}
+    unchanged: int  # 价格未变的产品数
+
+    @property
+    def changes(self) -> Dict[str, Optional[float]]:
+        """需要写入的增量 {产品名: 新价格，下架为 None}"""
+        changes: Dict[str, Optional[float]] = dict(self.added)
+        changes.update((product, new) for product, (_, new) in self.changed.items())
+        changes.update((product, None) for product in self.removed)
+        return changes
+
+
+def diff_prices(
+    previous: Dict[str, float],
+    current: Dict[str, float],
+    removable: Optional[Container[str]] = None,
+) -> PriceDiff:
+    """
+    计算两次价格状态之间的变化
+
+    Args:
+        previous: 已存储的最新状态 {产品名: 价格}
+        current: 本次抓取的价格 {产品名: 价格}
+        removable: 本次未出现时记为下架的产品，默认为 previous 中的全部产品
+    """
+    added, changed = {}, {}
+    unchanged = 0
+    for product, price in current.items():
+        old = previous.get(product)
+        if old is None:
+            added[product] = price
+        elif old != price:
+            changed[product] = (old, price)
+        else:
+            unchanged += 1
+    removed = {
+        product: price for product, price in previous.items()
+        if product not in current and (removable is None or product in removable)
+    }
+    return PriceDiff(added, removed, changed, unchanged)
 
 
 class PriceTracker:
     """价格追踪器"""
 
-    def __init__(self):
-        self.history = self._load_history()
+    def __init__(self, store: HistoryStore = None):
+        # 历史数据按需从存储中读取，不在初始化时全部加载
+        self.store = store or HistoryStore()
+
+    def _save_history(self, record: dict, diff: PriceDiff):
+        """
+        追加本次运行的价格记录（不重写已有历史）
+
+        通常只写入变化的产品；每隔 HISTORY_CHECKPOINT_INTERVAL 条记录写入一次全量快照。
+        """
+        with metrics.timer("history_save_seconds"):
+            if self.store.checkpoint_due():
+                prices, full = record["prices"], True
+            else:
+                prices, full = diff.changes, False
+            self.store.append_record(record["date"], record["timestamp"], prices, full=full)
+        metrics.inc("history_rows_written_total", len(prices), kind="full" if full else "delta")
+
+    @staticmethod
+    def fingerprint(current_data: dict) -> str:
+        """
+        数据集指纹：各分类的更新时间和全部产品价格的哈希
+
+        与产品和分类的顺序无关，页面数据未更新时指纹不变。实时报价的分类（如京东，
+        realtime 为真）没有页面更新时间，update_time 为获取时间，只按价格计算。
+        """
+        payload = sorted(
+            (
+                category,
+                "" if cat_data.get("realtime") else cat_data.get("update_time", ""),
+                sorted(
+                    (p.product, p.price)
+                    for p in cat_data.get("products", [])
+                    if p.price is not None
+                ),
+            )
+            for category, cat_data in current_data.items()
+        )
+        return hashlib.sha256(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
 
-    def _load_history(self) -> dict:
-        """加载历史价格数据"""
-        try:
-            with open(PRICES_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"records": [], "last_prices": {}}
+    def is_unchanged(self, fingerprint: str) -> bool:
+        """数据集是否与上次处理的相同"""
+        return self.store.get_meta(FINGERPRINT_META_KEY) == fingerprint
 
-    def _save_history(self):
-        """保存历史价格数据"""
-        PRICES_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(PRICES_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.history, f, ensure_ascii=False, indent=2)
+    def save_fingerprint(self, fingerprint: str):
+        """记录本次处理的数据集指纹"""
+        self.store.set_meta(FINGERPRINT_META_KEY, fingerprint)
 
     def update_prices(self, current_data: dict) -> dict:
         """
         更新价格并返回变化信息
         
         Args:
-            current_data: 当前价格数据 {category: {update_time, products: [...]}}
+            current_data: 当前价格数据 {category: {update_time, products: [ProductRecord, ...]}}，
+                产品记录会被就地填入 previous_price、分类信息和重新计算的涨跌
             
         Returns:
-            变化信息
+            变化信息，new_products / removed_products / changed_products 为相对上次存储状态
+            新增、下架和价格变化的产品名
         """
         today = datetime.now().strftime("%Y-%m-%d")
-        last_prices = self.history.get("last_prices", {})
+        previous = self.store.last_prices()
         
-        all_products = []
+        all_products: List[ProductRecord] = []
         new_last_prices = {}
+        currencies = {}
+        categories = {}
         
-        # 收集所有产品数据
+        # 收集所有产品数据（分类信息每个分类只保存一份，由该分类的全部产品共享）
         for category, cat_data in current_data.items():
-            update_time = cat_data.get("update_time", "")
-            source = cat_data.get("source", "")
-            source_url = cat_data.get("url", "")
+            meta = category_meta(
+                category,
+                cat_data.get("update_time", ""),
+                cat_data.get("source", ""),
+                cat_data.get("url", ""),
+                cat_data.get("currency") or DEFAULT_CURRENCY,
+            )
             
             for product in cat_data.get("products", []):
-                product_name = product.get("product", "")
-                price = product.get("price")
-                
+                price = product.price
                 if price is None:
                     continue
                 
-                product_data = {
-                    "product": product_name,
-                    "category": category,
-                    "price": price,
-                    "change": product.get("change", 0),
-                    "change_percent": product.get("change_percent", 0),
-                    "last_week_price": product.get("last_week_price"),
-                    "week_high": product.get("week_high"),
-                    "week_low": product.get("week_low"),
-                    "trend": product.get("trend", ""),
-                    "update_time": update_time,
-                    "source": source,
-                    "source_url": source_url,
-                }
-                all_products.append(product_data)
+                previous_price = previous.get(product.product)
+                # 数据源没有给出参考价（如京东SKU）时，涨跌相对上次存储的价格计算
+                if product.last_week_price is None and previous_price:
+                    product.change = round(price - previous_price, 2)
+                    product.change_percent = round(product.change / previous_price * 100, 2)
+                
+                # 直接在解析得到的记录上填入追踪信息，不复制产品数据
+                product.previous_price = previous_price
+                product.meta = meta
+                all_products.append(product)
                 
-                # 记录当前价格
-                new_last_prices[product_name] = price
+                # 记录当前价格和币种
+                new_last_prices[product.product] = price
+                currencies[product.product] = meta.currency
+                categories[product.product] = category
+        
+        # 只有本次获取到的分类中的产品可能下架，未获取的分类（如本次没有 --jd）保持原状态；
+        # 没有分类记录的产品（旧数据）按原来的方式处理
+        known_categories = self.store.product_categories()
+        removable = {
+            product for product in previous
+            if product not in known_categories or known_categories[product] in current_data
+        }
+        diff = diff_prices(previous, new_last_prices, removable)
         
-        # 更新历史记录
+        # 追加历史记录（保留全部历史）；全量快照包含未获取分类中仍在售的产品
+        snapshot = {product: price for product, price in previous.items() if product not in diff.removed}
+        snapshot.update(new_last_prices)
         record = {
             "date": today,
             "timestamp": datetime.now().isoformat(),
-            "prices": new_last_prices,
+            "prices": snapshot,
         }
-        self.history["records"].append(record)
-        self.history["last_prices"] = new_last_prices
-        
-        # 只保留最近30天的详细记录
-        if len(self.history["records"]) > 30:
-            self.history["records"] = self.history["records"][-30:]
-        
-        self._save_history()
+        self._save_history(record, diff)
+        self.store.set_product_currencies(currencies)
+        self.store.set_product_categories(categories)
         
         # 分类涨跌产品
-        price_ups = [p for p in all_products if p.get("change", 0) > 0]
-        price_downs = [p for p in all_products if p.get("change", 0) < 0]
+        price_ups = [p for p in all_products if p.change > 0]
+        price_downs = [p for p in all_products if p.change < 0]
         
         return {
             "date": today,
             "all_products": all_products,
-            "price_ups": sorted(price_ups, key=lambda x: -x.get("change_percent", 0)),
-            "price_downs": sorted(price_downs, key=lambda x: x.get("change_percent", 0)),
+            "price_ups": sorted(price_ups, key=lambda x: -x.change_percent),
+            "price_downs": sorted(price_downs, key=lambda x: x.change_percent),
             "total_products": len(all_products),
+            "new_products": list(diff.added),
+            "removed_products": list(diff.removed),
+            "changed_products": list(diff.changed),
         }
 
+    def get_series(
+        self,
+        product: str,
+        since: DateLike = None,
+        until: DateLike = None,
+        freq: Optional[str] = FREQ_DAILY,
+    ) -> List[Tuple[str, float]]:
+        """
+        获取产品的日期索引价格序列
+
+        Args:
+            product: 产品名
+            since: 起始日期（含）
+            until: 结束日期（含）
+            freq: None 为原始记录，"daily" / "weekly" 为按天/按周降采样
+
+        Returns:
+            [(日期, 价格), ...]
+        """
+        return self.store.get_series(product, since, until, freq)
+
+    def get_series_batch(
+        self,
+        products: Iterable[str],
+        since: DateLike = None,
+        until: DateLike = None,
+        freq: Optional[str] = FREQ_DAILY,
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """批量获取多个产品的价格序列，参数同 get_series"""
+        return self.store.get_series_batch(products, since, until, freq)
+
     def get_price_trend(self, product: str, days: int = 7) -> list:
-        """获取产品的价格趋势（最近N天）"""
-        history = []
-        for record in self.history.get("records", [])[-days:]:
-            prices = record.get("prices", {})
-            if product in prices:
-                history.append({
-                    "date": record["date"],
-                    "price": prices[product],
-                })
-        return history
+        """获取产品的价格趋势（最近N天，每天一个价格）"""
+        since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        return [
+            {"date": date, "price": price}
+            for date, price in self.store.get_series(product, since=since)
+        ]
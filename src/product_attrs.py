@@ -0,0 +1,148 @@
+"""
+产品属性解析模块
+将 "DDR5 UDIMM 32GB 6000" 这类产品名解析为代际、规格、容量、速率，
+解析结果按产品名缓存，并按属性建立倒排索引供报告、提醒和查询使用
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from .product_record import ProductRecord
+
+# 代际: DDR4 / DDR5 / LPDDR5X / GDDR6 ...
+_GENERATION_RE = re.compile(r"(?<![A-Z0-9])((?:LP|G)?DDR\d+X?)(?![A-Z0-9])", re.IGNORECASE)
+# 内存条规格
+_FORM_FACTOR_RE = re.compile(
+    r"(?<![A-Z0-9])(LRDIMM|RDIMM|CUDIMM|UDIMM|CSODIMM|SO-?DIMM|DIMM|M\.2|U\.2|SATA|NVME)(?![A-Z0-9])",
+    re.IGNORECASE,
+)
+# 容量: GB/TB 为字节，Gb/Tb 为比特（颗粒容量）
+_CAPACITY_RE = re.compile(r"(?<![\d.])(\d+(?:\.\d+)?)\s*(TB|GB|Tb|Gb)(?![A-Za-z])")
+# 速率: 4位数字（MT/s），可带单位
+_SPEED_RE = re.compile(r"(?<![\d.])(\d{4,5})(?:\s*(?:MT/S|MHZ|MBPS))?(?![\d.])", re.IGNORECASE)
+_SPEED_RANGE = (800, 12000)
+
+# 规格别名
+_FORM_FACTOR_ALIASES = {"SO-DIMM": "SODIMM", "NVME": "NVMe"}
+
+# 可索引的属性
+ATTRIBUTES = ("generation", "form_factor", "capacity_gb", "speed")
+
+
+class ProductAttributes(NamedTuple):
+    """产品属性，无法识别的属性为 None"""
+    generation: Optional[str] = None
+    form_factor: Optional[str] = None
+    capacity_gb: Optional[float] = None  # 以 GB（字节）计
+    speed: Optional[int] = None  # MT/s
+
+
+@lru_cache(maxsize=None)
+def parse_product_name(name: str) -> ProductAttributes:
+    """
+    解析产品名
+
+    Args:
+        name: 产品名，如 "DDR5 UDIMM 32GB 6000"、"DDR4 16Gb 2Gx8 3200"、"三星 990 PRO 2TB NVMe M.2 SSD"
+
+    Returns:
+        ProductAttributes
+    """
+    generation = form_factor = capacity_gb = speed = None
+
+    match = _GENERATION_RE.search(name)
+    if match:
+        generation = match.group(1).upper()
+
+    match = _FORM_FACTOR_RE.search(name)
+    if match:
+        form_factor = match.group(1).upper()
+        form_factor = _FORM_FACTOR_ALIASES.get(form_factor, form_factor)
+
+    match = _CAPACITY_RE.search(name)
+    if match:
+        value, unit = float(match.group(1)), match.group(2)
+        capacity_gb = value * (1024 if unit[0] == "T" else 1)
+        if unit[1] == "b":
+            capacity_gb /= 8
+        if capacity_gb == int(capacity_gb):
+            capacity_gb = int(capacity_gb)
+
+    for match in _SPEED_RE.finditer(name):
+        value = int(match.group(1))
+        if _SPEED_RANGE[0] <= value <= _SPEED_RANGE[1]:
+            speed = value
+            break
+
+    return ProductAttributes(generation, form_factor, capacity_gb, speed)
+
+
+def price_per_gb(name: str, price: Optional[float]) -> Optional[float]:
+    """每GB价格，容量未知时为 None"""
+    capacity_gb = parse_product_name(name).capacity_gb
+    if not capacity_gb or price is None:
+        return None
+    return price / capacity_gb
+
+
+class ProductIndex:
+    """
+    产品属性倒排索引
+
+    {属性: {属性值: [产品, ...]}}，产品保持输入顺序；按属性筛选为字典查找加交集。
+    """
+
+    def __init__(self, products: Iterable["ProductRecord"]):
+        self.products: List["ProductRecord"] = list(products)
+        self.attributes: List[ProductAttributes] = [
+            parse_product_name(p.product) for p in self.products
+        ]
+        self._index: Dict[str, Dict[object, List[int]]] = {
+            attribute: defaultdict(list) for attribute in ATTRIBUTES
+        }
+        for position, attrs in enumerate(self.attributes):
+            for attribute, value in zip(ATTRIBUTES, attrs):
+                if value is not None:
+                    self._index[attribute][value].append(position)
+
+    def select(self, **criteria) -> List["ProductRecord"]:
+        """
+        按属性筛选产品
+
+        Args:
+            criteria: 属性=值，如 generation="DDR5", capacity_gb=32
+
+        Returns:
+            同时满足全部条件的产品（保持输入顺序）
+        """
+        positions = None
+        for attribute, value in criteria.items():
+            if attribute not in self._index:
+                raise KeyError(f"未知的产品属性: {attribute}")
+            if attribute == "generation" and isinstance(value, str):
+                value = value.upper()
+            matched = self._index[attribute].get(value, ())
+            positions = set(matched) if positions is None else positions & set(matched)
+            if not positions:
+                return []
+        if positions is None:
+            return list(self.products)
+        return [self.products[i] for i in sorted(positions)]
+
+    def first(self, **criteria) -> Optional["ProductRecord"]:
+        """第一个满足条件的产品"""
+        selected = self.select(**criteria)
+        return selected[0] if selected else None
+
+    def group_by(self, attribute: str) -> Dict[object, List["ProductRecord"]]:
+        """按属性分组 {属性值: [产品, ...]}，属性未知的产品不在结果中"""
+        return {
+            value: [self.products[i] for i in positions]
+            for value, positions in self._index[attribute].items()
+        }
+
+    def values(self, attribute: str) -> List[object]:
+        """属性的全部取值"""
+        return list(self._index[attribute])
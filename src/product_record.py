@@ -0,0 +1,108 @@
+"""
+产品记录类型
+解析、追踪和报告全流程使用的紧凑产品记录：固定字段的 slots 数据类，
+分类、更新时间、数据来源等同一分类内相同的信息放在共享的 CategoryMeta 中，
+只在写入JSON（HTTP缓存等）和传入模板时转换为字典
+"""
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from .config import DEFAULT_CURRENCY
+
+
+class CategoryMeta(NamedTuple):
+    """同一分类内所有产品共享的信息"""
+    category: str
+    update_time: str = ""
+    source: str = ""
+    source_url: str = ""
+    currency: str = DEFAULT_CURRENCY
+
+
+@lru_cache(maxsize=256)
+def category_meta(
+    category: str,
+    update_time: str = "",
+    source: str = "",
+    source_url: str = "",
+    currency: str = DEFAULT_CURRENCY,
+) -> CategoryMeta:
+    """同一组参数返回同一个 CategoryMeta 实例（字符串也只保留一份）"""
+    return CategoryMeta(
+        sys.intern(category), sys.intern(update_time), sys.intern(source), sys.intern(source_url),
+        sys.intern(currency.upper()),
+    )
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """单个产品的价格"""
+    product: str
+    price: float
+    change: float = 0
+    change_percent: float = 0
+    last_week_price: Optional[float] = None
+    week_high: Optional[float] = None
+    week_low: Optional[float] = None
+    trend: str = ""
+    previous_price: Optional[float] = None  # 上次存储的价格（PriceTracker 填入）
+    meta: Optional[CategoryMeta] = None
+
+    @property
+    def category(self) -> str:
+        return self.meta.category if self.meta else ""
+
+    @property
+    def update_time(self) -> str:
+        return self.meta.update_time if self.meta else ""
+
+    @property
+    def source(self) -> str:
+        return self.meta.source if self.meta else ""
+
+    @property
+    def source_url(self) -> str:
+        return self.meta.source_url if self.meta else ""
+
+    @property
+    def currency(self) -> str:
+        return self.meta.currency if self.meta else DEFAULT_CURRENCY
+
+    # 解析结果的字段（写入HTTP缓存的部分）
+    ROW_FIELDS = (
+        "product", "price", "change", "change_percent",
+        "last_week_price", "week_high", "week_low", "trend",
+    )
+
+    def to_row(self) -> dict:
+        """解析字段组成的字典（HTTP缓存格式）"""
+        return {name: getattr(self, name) for name in self.ROW_FIELDS}
+
+    def to_dict(self) -> dict:
+        """包含分类信息和币种的完整字典（模板上下文）"""
+        data = self.to_row()
+        data.update(
+            previous_price=self.previous_price,
+            category=self.category,
+            update_time=self.update_time,
+            source=self.source,
+            source_url=self.source_url,
+            currency=self.currency,
+        )
+        return data
+
+    @classmethod
+    def from_row(cls, row: dict) -> "ProductRecord":
+        """从 to_row 的字典（或旧版缓存中的产品字典）创建"""
+        return cls(
+            product=row.get("product", ""),
+            price=row.get("price"),
+            change=row.get("change", 0),
+            change_percent=row.get("change_percent", 0),
+            last_week_price=row.get("last_week_price"),
+            week_high=row.get("week_high"),
+            week_low=row.get("week_low"),
+            trend=row.get("trend", ""),
+        )
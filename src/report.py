@@ -2,151 +2,340 @@
 报告生成模块
 """
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
-from .config import PROJECT_ROOT
+from .config import DEFAULT_CURRENCY, PROJECT_ROOT, REPORT_CURRENCIES, TEMPLATE_CACHE_DIR
+from .currency import BASE_CURRENCY, CURRENCY_NAMES, CurrencyConverter, currency_label, currency_symbol
+from .price_tracker import PriceTracker
+from .product_attrs import ProductIndex, price_per_gb
+
+# 走势图显示的周数和柱高范围(px)
+TREND_WEEKS = 6
+TREND_MIN_HEIGHT = 8
+TREND_MAX_HEIGHT = 30
+TREND_FLAT_HEIGHT = 20
+
+# 没有产品数据时页脚显示的数据来源
+DEFAULT_SOURCE = ("闪存市场 CFM", "https://www.chinaflashmarket.com/pricecenter/ddrchannel")
+# 各数据源的报价更新方式（按数据源名称前缀匹配）
+SOURCE_SCHEDULES = {
+    "闪存市场 CFM": "每周二 11:00 (GMT+8) 更新",
+    "京东": "实时价格",
+}
+
+# 热门产品的选择顺序 (代际, 容量GB)
+TOP_PRODUCT_SPECS = (("DDR5", 32), ("DDR5", 16), ("DDR4", 16), ("DDR4", 32))
+
+# 模板上下文中的产品列表（传入模板前转换为字典）
+TEMPLATE_PRODUCT_LISTS = ("all_products", "all_products_ranked", "top_products")
+
+
+def _normalize_heights(prices: list) -> list:
+    """按产品自身的最高/最低价将价格映射为柱高，不足6周时用最早的价格补齐"""
+    if not prices:
+        return [TREND_FLAT_HEIGHT] * TREND_WEEKS
+    prices = [prices[0]] * (TREND_WEEKS - len(prices)) + prices
+    low, high = min(prices), max(prices)
+    if high == low:
+        return [TREND_FLAT_HEIGHT] * TREND_WEEKS
+    scale = (TREND_MAX_HEIGHT - TREND_MIN_HEIGHT) / (high - low)
+    return [round(TREND_MIN_HEIGHT + (price - low) * scale) for price in prices]
+
+
+@lru_cache(maxsize=None)
+def get_environment() -> Environment:
+    """
+    进程内共享的模板环境
+
+    已编译的模板保存在环境的内存缓存中，字节码写入磁盘缓存，
+    新进程启动时无需重新从源码编译。
+    """
+    template_dir = PROJECT_ROOT / "templates"
+    TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR)),
+    )
 
 
 class ReportGenerator:
     """报告生成器"""
 
-    def __init__(self):
-        template_dir = PROJECT_ROOT / "templates"
-        self.env = Environment(loader=FileSystemLoader(template_dir))
+    def __init__(self, tracker: PriceTracker = None, converter: CurrencyConverter = None):
+        self.env = get_environment()
+        self._tracker = tracker
+        self._converter = converter
+        # 走势图缓存: {(产品名, 当前价): 柱高列表}，对应 (报告日期, 历史存储版本)
+        self._trend_cache: dict = {}
+        self._trend_cache_key = None
+
+    @property
+    def tracker(self) -> PriceTracker:
+        """价格追踪器（未传入时按需创建）"""
+        if self._tracker is None:
+            self._tracker = PriceTracker()
+        return self._tracker
+
+    @property
+    def converter(self) -> CurrencyConverter:
+        """汇率换算器（未传入时按需创建，读取追踪器的历史存储）"""
+        if self._converter is None:
+            self._converter = CurrencyConverter(self.tracker.store)
+        return self._converter
 
-    def _generate_trend_heights(self, current_price: float, change_percent: float) -> list:
+    def _currency_context(self, products: list, report_date: str) -> dict:
         """
-        生成走势图高度数据（模拟6周走势）
-        
-        基于当前价格和涨跌幅度反推历史走势
+        多币种显示的模板数据
+
+        各产品按报告日汇率折算为其他报告币种（所有产品一次换算），
+        并列出显示的币种和用到的汇率。
         """
-        heights = []
-        base_height = 25  # 基准高度
-        
-        # 根据涨跌幅度计算历史价格趋势
-        # 假设涨幅越大，之前的价格越低
-        if change_percent > 0:
-            # 上涨趋势：从低到高
-            for i in range(6):
-                factor = 0.6 + (i * 0.08)  # 逐渐增加
-                height = int(base_height * factor)
-                heights.append(min(30, max(8, height)))
-        elif change_percent < 0:
-            # 下跌趋势：从高到低
-            for i in range(6):
-                factor = 1.0 - (i * 0.06)  # 逐渐减少
-                height = int(base_height * factor)
-                heights.append(min(30, max(8, height)))
-        else:
-            # 持平
-            heights = [20, 20, 20, 20, 20, 20]
-        
-        return heights
+        converter = self.converter
+        # 报告币种按 REPORT_CURRENCIES 的顺序在前
+        order = {currency: i for i, currency in enumerate(REPORT_CURRENCIES)}
+        currencies = sorted(
+            {p.currency for p in products} or {DEFAULT_CURRENCY},
+            key=lambda currency: (order.get(currency, len(order)), currency),
+        )
+        texts = converter.converted_texts(
+            [p.price for p in products], [p.currency for p in products], report_date
+        )
+        shown = currencies + [
+            target for target in REPORT_CURRENCIES
+            if target not in currencies
+            and any(converter.rate(currency, target, report_date) for currency in currencies)
+        ]
+        fx_notes = []
+        for currency in shown:
+            rate = converter.rate(currency, BASE_CURRENCY, report_date) if currency != BASE_CURRENCY else None
+            if rate and len(shown) > 1:
+                fx_notes.append(f"1 {currency} = {rate:.4f} {BASE_CURRENCY}")
+        return {
+            "converted_prices": {p.product: text for p, text in zip(products, texts)},
+            "currency_symbols": {currency: currency_symbol(currency) for currency in currencies},
+            "currency_labels": " / ".join(currency_label(currency) for currency in shown),
+            "fx_notes": fx_notes,
+        }
 
-    def generate_html(self, data: dict) -> str:
+    @staticmethod
+    def _source_context(products: list) -> dict:
         """
-        生成HTML报告
-        
+        页脚的数据来源和报价说明
+
+        按报告中产品实际的数据源和币种生成（如闪存市场美元报价、京东人民币报价），
+        使用缓存数据的分类（数据源名称带 "(缓存 ...)"）归入同一数据源。
+        """
+        sources = {}
+        for p in products:
+            name = p.source.split(" (", 1)[0].strip()
+            if not name:
+                continue
+            url, currencies = sources.setdefault(name, (p.source_url, []))
+            if p.currency not in currencies:
+                currencies.append(p.currency)
+        if not sources:
+            sources[DEFAULT_SOURCE[0]] = (DEFAULT_SOURCE[1], [DEFAULT_CURRENCY])
+
+        notes = []
+        for name, (_, currencies) in sources.items():
+            quote = "/".join(CURRENCY_NAMES.get(currency, currency) for currency in currencies)
+            schedule = next(
+                (text for prefix, text in SOURCE_SCHEDULES.items() if name.startswith(prefix)), ""
+            )
+            notes.append(f"{name}：{quote}报价" + (f"，{schedule}" if schedule else ""))
+        return {
+            "data_sources": [{"name": name, "url": url} for name, (url, _) in sources.items()],
+            "source_notes": notes,
+        }
+
+    def _build_trend_heights(self, products: list, report_date: str) -> dict:
+        """
+        根据历史价格批量生成走势图高度（最近6周，每周取最后一个价格）
+
+        一次查询所有产品的周序列，结果按报告日期和历史存储的版本缓存，
+        同一天重复渲染不再查询历史，历史记录写入（如导入历史价格）后重新计算。
+
+        Returns:
+            {产品名: [6个柱高]}
+        """
+        cache_key = (report_date, self.tracker.store.history_version)
+        if self._trend_cache_key != cache_key:
+            self._trend_cache = {}
+            self._trend_cache_key = cache_key
+        cache = self._trend_cache
+
+        missing = [
+            p for p in products
+            if (p.product, p.price) not in cache
+        ]
+        if missing:
+            until = datetime.strptime(report_date, "%Y-%m-%d")
+            since = (until - timedelta(weeks=TREND_WEEKS)).strftime("%Y-%m-%d")
+            series = self.tracker.get_series_batch(
+                [p.product for p in missing], since=since, until=report_date, freq="weekly"
+            )
+            for p in missing:
+                name, price = p.product, p.price
+                prices = [value for _, value in series.get(name, [])]
+                # 本周价格以当前数据为准
+                if price is not None and (not prices or prices[-1] != price):
+                    prices.append(price)
+                cache[(name, price)] = _normalize_heights(prices[-TREND_WEEKS:])
+
+        return {
+            p.product: cache[(p.product, p.price)]
+            for p in products
+        }
+
+    def build_context(self, data: dict) -> dict:
+        """
+        计算报告的共享数据（统计、排序、排名、走势图、热门产品）
+
+        只读取 data，不修改其中的产品数据。同一份数据渲染多份报告时只需计算一次。
+
         Args:
             data: 价格数据
-            
+
         Returns:
-            HTML字符串
+            模板上下文
         """
-        template = self.env.get_template("email.html")
-        
         all_products = data.get("all_products", [])
-        price_ups = [p for p in all_products if p.get("change", 0) > 0]
-        price_downs = [p for p in all_products if p.get("change", 0) < 0]
+        price_ups = [p for p in all_products if p.change > 0]
+        price_downs = [p for p in all_products if p.change < 0]
         
         # 计算平均涨幅
         if all_products:
-            avg_change = sum(p.get("change_percent", 0) for p in all_products) / len(all_products)
+            avg_change = sum(p.change_percent for p in all_products) / len(all_products)
         else:
             avg_change = 0
         
         # 获取数据更新时间
         data_update_time = "2026-01-20 11:00"
         for p in all_products:
-            if p.get("update_time"):
-                data_update_time = p.get("update_time")
+            if p.update_time:
+                data_update_time = p.update_time
                 break
         
-        # 按涨幅排序并添加排名和走势图数据
-        all_products_ranked = sorted(all_products, key=lambda x: -x.get("change_percent", 0))
-        for i, product in enumerate(all_products_ranked):
-            product["rank"] = i + 1
-            product["trend_heights"] = self._generate_trend_heights(
-                product.get("price", 0),
-                product.get("change_percent", 0)
-            )
+        # 按涨幅排序（排名由模板的循环序号给出）和走势图数据
+        report_date = data.get("date", datetime.now().strftime("%Y-%m-%d"))
+        trend_heights = self._build_trend_heights(all_products, report_date)
+        all_products_ranked = sorted(all_products, key=lambda x: -x.change_percent)
         
-        # 选择热门产品（DDR5优先展示）
+        # 选择热门产品（DDR5优先展示）: DDR5 32GB、DDR5 16GB、DDR4 16GB、DDR4 32GB 各一个
+        index = ProductIndex(all_products)
         top_products = []
-        ddr5_products = [p for p in all_products if "DDR5" in p.get("product", "")]
-        ddr4_products = [p for p in all_products if "DDR4" in p.get("product", "")]
+        for generation, capacity_gb in TOP_PRODUCT_SPECS:
+            product = index.first(generation=generation, capacity_gb=capacity_gb)
+            if product is not None:
+                top_products.append(product)
         
-        # 选择DDR5 32GB和16GB各一个，DDR4 16GB一个
-        for p in ddr5_products:
-            if "32GB" in p.get("product", "") and len(top_products) < 4:
-                top_products.append(p)
-                break
-        for p in ddr5_products:
-            if "16GB" in p.get("product", "") and p not in top_products and len(top_products) < 4:
-                top_products.append(p)
-                break
-        for p in ddr4_products:
-            if "16GB" in p.get("product", "") and len(top_products) < 4:
-                top_products.append(p)
-                break
-        for p in ddr4_products:
-            if "32GB" in p.get("product", "") and len(top_products) < 4:
-                top_products.append(p)
-                break
+        # 每GB价格（容量无法识别的产品不显示）
+        unit_prices = {
+            p.product: price_per_gb(p.product, p.price)
+            for p in all_products
+        }
         
-        # 渲染模板
-        html = template.render(
-            date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
-            data_update_time=data_update_time,
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            total_products=len(all_products),
-            price_ups=len(price_ups),
-            price_downs=len(price_downs),
-            avg_change=avg_change,
-            all_products=all_products,
-            all_products_ranked=all_products_ranked,
-            top_products=top_products,
-        )
+        context = {
+            "date": report_date,
+            "data_update_time": data_update_time,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "total_products": len(all_products),
+            "price_ups": len(price_ups),
+            "price_downs": len(price_downs),
+            "avg_change": avg_change,
+            "all_products": all_products,
+            "all_products_ranked": all_products_ranked,
+            "top_products": top_products,
+            "trend_heights": trend_heights,
+            "price_per_gb": unit_prices,
+        }
+        context.update(self._currency_context(all_products, report_date))
+        context.update(self._source_context(all_products))
+        return context
+
+    @staticmethod
+    def _template_context(context: dict) -> dict:
+        """
+        传入模板的上下文：产品列表中的 ProductRecord 转换为字典
+
+        模板只依赖字典字段，不依赖 ProductRecord 类型；同一产品在多个列表中只转换一次。
+        """
+        converted = {}
+
+        def as_dict(record) -> dict:
+            data = converted.get(id(record))
+            if data is None:
+                data = converted[id(record)] = record.to_dict()
+            return data
+
+        template_context = dict(context)
+        for key in TEMPLATE_PRODUCT_LISTS:
+            if key in context:
+                template_context[key] = [as_dict(record) for record in context[key]]
+        return template_context
+
+    def render_html(self, context: dict) -> str:
+        """根据模板上下文渲染HTML报告（纯函数，可重复调用）"""
+        return self.env.get_template("email.html").render(self._template_context(context))
+
+    def generate_html(self, data: dict) -> str:
+        """
+        生成HTML报告
         
-        return html
+        Args:
+            data: 价格数据
+            
+        Returns:
+            HTML字符串
+        """
+        return self.render_html(self.build_context(data))
 
     def generate_text(self, data: dict) -> str:
         """
         生成纯文本报告（作为备用）
         """
-        all_products = data.get("all_products", [])
-        price_ups = [p for p in all_products if p.get("change", 0) > 0]
-        price_downs = [p for p in all_products if p.get("change", 0) < 0]
-        
-        # 获取数据更新时间
-        data_update_time = "2026-01-20 11:00"
-        for p in all_products:
-            if p.get("update_time"):
-                data_update_time = p.get("update_time")
-                break
+        return self.render_text(self.build_context(data))
+
+    def render_alert_html(self, alerts: list, date: str = None) -> str:
+        """渲染价格提醒邮件（HTML）"""
+        return self.env.get_template("alert.html").render(
+            date=date or datetime.now().strftime("%Y-%m-%d"),
+            alerts=alerts,
+            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+    def render_alert_text(self, alerts: list, date: str = None) -> str:
+        """渲染价格提醒邮件（纯文本）"""
+        lines = [
+            f"🔔 价格提醒 - {date or datetime.now().strftime('%Y-%m-%d')}",
+            "=" * 55,
+        ]
+        lines.extend(f"  • {alert.message}" for alert in alerts)
+        lines.append("")
+        lines.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        return "\n".join(lines)
+
+    def render_text(self, context: dict) -> str:
+        """根据模板上下文渲染纯文本报告"""
+        all_products = context["all_products"]
+        data_update_time = context["data_update_time"]
+        symbols = context["currency_symbols"]
+        converted_prices = context["converted_prices"]
         
         lines = [
-            f"📊 内存价格监控报告 - {data.get('date', '')}",
+            f"📊 内存价格监控报告 - {context['date']}",
             "=" * 55,
             f"📅 数据更新时间: {data_update_time}",
+            f"💵 货币: {context['currency_labels']}",
             "",
             "📈 市场概览:",
-            f"   监控产品: {len(all_products)} 个",
-            f"   本周上涨: {len(price_ups)} 个",
-            f"   本周下跌: {len(price_downs)} 个",
+            f"   监控产品: {context['total_products']} 个",
+            f"   本周上涨: {context['price_ups']} 个",
+            f"   本周下跌: {context['price_downs']} 个",
             "",
             "💰 热门产品价格:",
             "-" * 55,
@@ -154,41 +343,49 @@ class ReportGenerator:
         
         # 显示热门产品
         for item in all_products[:4]:
-            change = item.get("change", 0)
-            change_percent = item.get("change_percent", 0)
+            change = item.change
+            change_percent = item.change_percent
             trend = f"↑+{change_percent:.1f}%" if change > 0 else f"↓{change_percent:.1f}%" if change < 0 else "持平"
-            lines.append(f"   {item['product']}: ${item['price']:.2f} ({trend})")
+            converted = converted_prices.get(item.product)
+            converted_text = f" ≈ {converted}" if converted else ""
+            lines.append(f"   {item.product}: {symbols[item.currency]}{item.price:.2f}{converted_text} ({trend})")
         
         lines.append("")
         lines.append("📊 本周价格变动详情:")
+        if "watchlist_size" in context:
+            lines.append(f"   仅显示关注列表中的 {context['watchlist_size']} 个产品（共 {context['total_products']} 个）")
         lines.append("-" * 55)
         
-        # 按涨幅排序
-        sorted_products = sorted(all_products, key=lambda x: -x.get("change_percent", 0))
-        
-        for i, item in enumerate(sorted_products, 1):
-            change = item.get("change", 0)
-            change_percent = item.get("change_percent", 0)
+        for i, item in enumerate(context["all_products_ranked"], 1):
+            change = item.change
+            change_percent = item.change_percent
+            symbol = symbols[item.currency]
             
             if change > 0:
-                trend = f"↑ +${change:.2f} (+{change_percent:.2f}%)"
+                trend = f"↑ +{symbol}{change:.2f} (+{change_percent:.2f}%)"
             elif change < 0:
-                trend = f"↓ ${change:.2f} ({change_percent:.2f}%)"
+                trend = f"↓ {symbol}{change:.2f} ({change_percent:.2f}%)"
             else:
                 trend = "持平"
             
             rank = f"[{i}]" if i <= 3 else f" {i}."
+            unit_price = context["price_per_gb"].get(item.product)
+            unit_text = f"  ({symbol}{unit_price:.2f}/GB)" if unit_price else ""
+            converted = converted_prices.get(item.product)
+            converted_text = f" ≈ {converted}" if converted else ""
             lines.append(
-                f"\n  {rank} {item['product']}\n"
-                f"      本周价: ${item['price']:.2f}  {trend}\n"
-                f"      上周价: ${item.get('last_week_price', 0):.2f}  "
-                f"周高/低: ${item.get('week_low', 0):.2f} ~ ${item.get('week_high', 0):.2f}"
+                f"\n  {rank} {item.product}\n"
+                f"      本周价: {symbol}{item.price:.2f}{converted_text}{unit_text}  {trend}\n"
+                f"      上周价: {symbol}{item.last_week_price or 0:.2f}  "
+                f"周高/低: {symbol}{item.week_low or 0:.2f} ~ {symbol}{item.week_high or 0:.2f}"
             )
         
         lines.append("")
         lines.append("=" * 55)
-        lines.append(f"数据来源: 闪存市场 CFM")
-        lines.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append("💡 价格为渠道市场美元报价，每周二 11:00 (GMT+8) 更新")
+        lines.append(f"数据来源: {' / '.join(source['name'] for source in context['data_sources'])}")
+        lines.append(f"生成时间: {context['timestamp']}")
+        lines.append(f"💡 {'；'.join(context['source_notes'])}")
+        if context["fx_notes"]:
+            lines.append(f"💱 折算汇率（{context['date']}）: {'，'.join(context['fx_notes'])}")
         
         return "\n".join(lines)
@@ -0,0 +1,204 @@
+"""
+请求限流与熔断模块
+令牌桶限制对数据源的总请求速率；按站点的熔断器在连续失败后暂停请求该站点，
+服务器返回 Retry-After 时按其要求等待；重试间隔为带随机抖动的指数退避
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from .config import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    FETCH_RATE,
+    FETCH_RATE_BURST,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+)
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    第 attempt 次失败后的等待时间（指数退避 + 全抖动）
+
+    Args:
+        attempt: 已失败次数（从0开始）
+        base: 初始间隔(秒)
+        cap: 最大间隔(秒)
+    """
+    base = RETRY_BACKOFF_BASE if base is None else base
+    cap = RETRY_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate: float = None, burst: int = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数，0 表示不限速
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = FETCH_RATE if rate is None else rate
+        self.capacity = max(1, FETCH_RATE_BURST if burst is None else burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        取一个令牌，令牌不足时等待
+
+        Args:
+            timeout: 最长等待时间(秒)，None 表示一直等待
+
+        Returns:
+            是否取到令牌
+        """
+        if self.rate <= 0:
+            return True
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if expires_at is not None and now + wait > expires_at:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    单个站点的熔断器
+
+    连续失败达到阈值后打开，打开期间拒绝请求；冷却结束后放行一个试探请求（半开），
+    成功则关闭，失败则重新打开。试探期间的其他请求可通过 wait_for_probe 等待试探结果。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.failures = 0
+        self.state = self.CLOSED
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._probe_done = threading.Condition(self._lock)
+
+    @property
+    def probing(self) -> bool:
+        """半开状态下是否已有试探请求在进行"""
+        with self._lock:
+            return self.state == self.HALF_OPEN and self._probing
+
+    def wait_for_probe(self, timeout: float) -> bool:
+        """
+        等待正在进行的试探请求结束
+
+        Returns:
+            试探是否已在 timeout 秒内结束（之后调用 allow 判断能否请求）
+        """
+        with self._probe_done:
+            return self._probe_done.wait_for(
+                lambda: not (self.state == self.HALF_OPEN and self._probing), max(0.0, timeout)
+            )
+
+    def allow(self) -> bool:
+        """是否允许发出请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.open_until:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def cancel(self):
+        """已放行的请求没有发出（如等待限速超时）：半开状态下让出试探机会"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing = False
+                self._probe_done.notify_all()
+
+    def record_success(self):
+        """请求成功：关闭熔断器"""
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._probing = False
+            self._probe_done.notify_all()
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        """
+        请求失败
+
+        Args:
+            retry_after: 服务器通过 Retry-After 要求的等待时间(秒)，给出时熔断器按此时间打开
+        """
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if retry_after is not None:
+                self.state = self.OPEN
+                self.open_until = time.monotonic() + retry_after
+            elif self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.open_until = time.monotonic() + self.reset_timeout
+            self._probe_done.notify_all()
+
+    def retry_in(self) -> float:
+        """距离熔断器允许下一次请求的秒数"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.open_until - time.monotonic())
+
+
+class HostBreakers:
+    """按站点管理熔断器"""
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        """URL所属站点的熔断器"""
+        host = urlparse(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
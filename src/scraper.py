@@ -2,32 +2,93 @@
 闪存市场价格爬虫模块
 数据来源: https://www.chinaflashmarket.com
 """
+import codecs
+import hashlib
 import json
-import re
 import time
+from pathlib import Path
 from typing import Optional
-from datetime import datetime
 
 import requests
-from fake_useragent import UserAgent
+from requests.adapters import HTTPAdapter
 
 from .config import (
+    CFM_SOURCES,
+    CFM_SOURCES_FILE,
+    FETCH_DEADLINE,
+    FETCH_MAX_WORKERS,
     MAX_RETRIES,
     REQUEST_TIMEOUT,
 )
+from .fetcher import FetchEngine, FetchTask
+from .history_store import HistoryStore
+from .http_cache import ResponseCache
+from .metrics import metrics
+from .product_record import ProductRecord
+from .resilience import CircuitBreaker, HostBreakers, TokenBucket, backoff_delay, parse_retry_after
+from .table_parser import PriceTableParser, extract_update_time, iter_price_rows
+from .user_agents import UserAgentPool
+
+# 流式读取页面的块大小(字节)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 计入站点熔断器并重试的 4xx 状态码（其余 4xx 是页面本身的问题，如 404）
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+
+# 数据源页面更新时间在历史存储元数据中的键前缀（历史数据兜底时作为更新时间）
+UPDATE_TIME_META_PREFIX = "source_update_time:"
+
+
+def load_sources(path: Path = None) -> dict:
+    """
+    闪存市场数据源配置 {数据源键: {url, category}}
+
+    配置文件存在时使用文件中的数据源，否则使用 config.CFM_SOURCES
+    """
+    path = Path(path or CFM_SOURCES_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            sources = json.load(f)
+    except FileNotFoundError:
+        return dict(CFM_SOURCES)
+    except json.JSONDecodeError as e:
+        print(f"❌ 读取数据源配置失败: {e}，使用默认数据源")
+        return dict(CFM_SOURCES)
+    return {
+        key: source for key, source in sources.items()
+        if isinstance(source, dict) and source.get("url") and source.get("category")
+    }
 
 
 class CFMScraper:
     """闪存市场价格爬虫"""
 
+    # 数据源配置: url / 报告分类名（见 config.CFM_SOURCES）
+    SOURCES = load_sources()
+
     # 数据源URL
-    URLS = {
-        "ddr_channel": "https://www.chinaflashmarket.com/pricecenter/ddrchannel",
-    }
+    URLS = {key: source["url"] for key, source in SOURCES.items()}
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache: ResponseCache = None,
+        limiter: TokenBucket = None,
+        breakers: HostBreakers = None,
+        store: HistoryStore = None,
+    ):
+        self.cache = cache or ResponseCache()
+        # 响应缓存不存在时（如新的运行环境），抓取失败用历史存储中的最新价格兜底
+        self.store = store or HistoryStore()
+        # 所有抓取线程共享的限速令牌桶和按站点的熔断器
+        self.limiter = limiter or TokenBucket()
+        self.breakers = breakers or HostBreakers()
         self.session = requests.Session()
-        self.ua = UserAgent()
+        # 连接池大小与并发数一致，避免并发请求互相等待连接
+        adapter = HTTPAdapter(pool_connections=FETCH_MAX_WORKERS, pool_maxsize=FETCH_MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.ua = UserAgentPool()
+        self.engine = FetchEngine()
         self._update_headers()
 
     def _update_headers(self):
@@ -39,152 +100,297 @@ class CFMScraper:
             "Accept-Encoding": "gzip, deflate, br",
             "Connection": "keep-alive",
             "Referer": "https://www.chinaflashmarket.com/",
-            "Cache-Control": "no-cache",
         })
 
+    def _request_headers(self) -> dict:
+        """单次请求的头部（每次随机UA，不修改共享的session，保证线程安全）"""
+        return {"User-Agent": self.ua.random}
+
+    @staticmethod
+    def _hashing(chunks, hasher, source: str):
+        """读取数据块的同时更新内容哈希并统计下载字节数"""
+        for chunk in chunks:
+            hasher.update(chunk)
+            metrics.inc("http_bytes_downloaded_total", len(chunk), source=source)
+            yield chunk
+
     def _parse_html_table(self, html: str) -> list:
-        """解析HTML表格"""
-        results = []
-        
-        # 查找表格内容
-        # 使用更宽松的正则表达式
-        table_match = re.search(r'<table[^>]*>(.*?)</table>', html, re.DOTALL | re.IGNORECASE)
-        if not table_match:
+        """解析HTML表格（页面中的全部表格）"""
+        results = list(iter_price_rows(html))
+        if not results:
             print("未找到表格")
-            return results
-        
-        table_html = table_match.group(1)
-        
-        # 提取所有行
-        rows = re.findall(r'<tr[^>]*>(.*?)</tr>', table_html, re.DOTALL | re.IGNORECASE)
-        
-        for row in rows:
-            # 跳过表头
-            if '<th' in row.lower():
-                continue
-            
-            # 提取单元格
-            cells = re.findall(r'<(?:td|rowheader)[^>]*>(.*?)</(?:td|rowheader)>', row, re.DOTALL | re.IGNORECASE)
-            
-            if len(cells) >= 7:
-                # 提取产品名称（从链接中）
-                product_match = re.search(r'>([^<]+)</a>', cells[0])
-                if not product_match:
-                    continue
-                product = product_match.group(1).strip()
-                
-                # 提取数字
-                try:
-                    price = float(re.search(r'\$([\d.]+)', cells[1]).group(1))
-                    change_match = re.search(r'([+-]?[\d.]+)', cells[2])
-                    change = float(change_match.group(1)) if change_match else 0
-                    change_pct_match = re.search(r'([+-]?[\d.]+)%', cells[3])
-                    change_pct = float(change_pct_match.group(1)) if change_pct_match else 0
-                    last_price = float(re.search(r'\$([\d.]+)', cells[4]).group(1))
-                    week_high = float(re.search(r'\$([\d.]+)', cells[5]).group(1))
-                    week_low = float(re.search(r'\$([\d.]+)', cells[6]).group(1))
-                    
-                    # 判断涨跌方向
-                    if '+' in cells[2]:
-                        change = abs(change)
-                        change_pct = abs(change_pct)
-                        trend = "up"
-                    else:
-                        change = -abs(change) if change != 0 else 0
-                        change_pct = -abs(change_pct) if change_pct != 0 else 0
-                        trend = "down" if change < 0 else "flat"
-                    
-                    results.append({
-                        "product": product,
-                        "price": price,
-                        "change": change,
-                        "change_percent": change_pct,
-                        "last_week_price": last_price,
-                        "week_high": week_high,
-                        "week_low": week_low,
-                        "trend": trend,
-                    })
-                except (AttributeError, ValueError) as e:
-                    print(f"解析数据失败: {e}")
-                    continue
-        
         return results
 
-    def fetch_ddr_channel(self) -> dict:
-        """获取内存条渠道市场价格"""
-        url = self.URLS["ddr_channel"]
-        
+    def fetch_source(self, key: str, budget: Optional[float] = None) -> Optional[dict]:
+        """
+        获取单个数据源的价格
+
+        请求受共享令牌桶限速；同一站点连续的连接错误和 5xx 响应达到阈值后熔断
+        （404 等页面错误和解析不到数据不计入），熔断期间或重试用尽时
+        返回该数据源最近一次成功抓取的真实数据。
+
+        Args:
+            key: SOURCES 中的数据源键
+            budget: 剩余时间预算(秒)，请求超时和重试等待都不会超过该预算
+
+        Returns:
+            价格数据，失败且没有历史抓取数据时返回 None
+        """
+        source = self.SOURCES[key]
+        url = source["url"]
+        expires_at = time.monotonic() + (budget if budget is not None else FETCH_DEADLINE)
+        breaker = self.breakers.for_url(url)
+
         for attempt in range(MAX_RETRIES):
+            if not self._wait_for_slot(key, breaker, expires_at):
+                break
+            if attempt:
+                metrics.inc("http_retries_total", source=key)
+            retry_after = None
             try:
-                self._update_headers()
-                response = self.session.get(url, timeout=REQUEST_TIMEOUT)
-                response.raise_for_status()
-                response.encoding = 'utf-8'
-                html = response.text
+                cached = self.cache.get(url)
+                validators = self.cache.validators(url) if cached else {}
+                response = self._get(key, url, validators, expires_at)
+                if response.status_code == 304 and not cached:
+                    # 没有缓存条目却收到 304（如缓存在请求期间被清除，或中间代理返回）：
+                    # 按未命中处理，不带条件请求头重新获取完整页面
+                    response.close()
+                    print(f"📦 {key} 返回 304 但没有缓存数据，重新获取完整页面")
+                    response = self._get(key, url, {"Cache-Control": "no-cache"}, expires_at)
+                    if response.status_code == 304:
+                        response.close()
+                        raise requests.HTTPError("304 Not Modified，但没有缓存数据", response=response)
                 
-                # 检查是否获取到有效内容
-                if 'DDR' not in html:
-                    print(f"页面内容可能不正确 (尝试 {attempt + 1})")
-                    if attempt < MAX_RETRIES - 1:
-                        time.sleep(2)
-                        continue
+                # 服务器确认页面未更新，直接使用缓存的解析结果
+                if response.status_code == 304:
+                    response.close()
+                    breaker.record_success()
+                    self.cache.refresh(url, response.headers)
+                    print(f"📦 {key} 页面未更新 (304)，使用缓存数据")
+                    metrics.inc("http_cache_hits_total", source=key, kind="not_modified")
+                    return self._cached_data(cached)
+                # 限流或暂时不可用：按 Retry-After 暂停请求该站点
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.raise_for_status()
                 
-                # 提取更新时间
-                time_match = re.search(r'(\d{4}-\d{2}-\d{2}\s*\d{2}:\d{2})', html)
-                update_time = time_match.group(1) if time_match else datetime.now().strftime("%Y-%m-%d %H:%M")
+                hasher = hashlib.sha256()
+                if cached:
+                    # 有缓存时先比对内容哈希，内容未变化则跳过解析
+                    body = response.content
+                    hasher.update(body)
+                    metrics.inc("http_bytes_downloaded_total", len(body), source=key)
+                    if hasher.hexdigest() == cached.get("content_hash"):
+                        breaker.record_success()
+                        self.cache.refresh(url, response.headers)
+                        print(f"📦 {key} 页面内容未变化，跳过解析")
+                        metrics.inc("http_cache_hits_total", source=key, kind="content_hash")
+                        return self._cached_data(cached)
+                    raw_chunks = iter((body,))
+                else:
+                    # 没有缓存时边读取边计算哈希并解析
+                    raw_chunks = self._hashing(
+                        response.iter_content(chunk_size=STREAM_CHUNK_SIZE), hasher, key
+                    )
+                metrics.inc("http_cache_misses_total", source=key)
                 
-                # 解析价格表格
-                products = self._parse_html_table(html)
+                # 边读取边解析价格表格
+                parser = PriceTableParser()
+                with metrics.timer("parse_seconds", source=key):
+                    products = list(parser.parse_stream(
+                        codecs.iterdecode(raw_chunks, "utf-8", errors="replace")
+                    ))
+                metrics.inc("rows_parsed_total", len(products), source=key)
                 
                 if products:
-                    return {
-                        "update_time": update_time,
+                    breaker.record_success()
+                    data = {
+                        "update_time": extract_update_time(parser),
                         "currency": "USD",
                         "source": "闪存市场 CFM",
                         "url": url,
                         "products": products,
                     }
+                    self.cache.put(
+                        url, response.headers, hasher.hexdigest(),
+                        {**data, "products": [product.to_row() for product in products]},
+                    )
+                    self._remember_update_time(key, data["update_time"])
+                    return data
+                
+                # 未解析到产品，页面内容可能不正确（如被反爬页面拦截）；
+                # 站点本身正常响应，不计入熔断器
+                print(f"{key} 页面内容可能不正确 (尝试 {attempt + 1})")
+                breaker.record_success()
                 
             except requests.RequestException as e:
-                print(f"请求失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)
-        
-        # 如果爬取失败，返回最新的已知数据（基于2026-01-20的数据）
-        print("⚠️ 使用缓存数据（闪存市场可能有访问限制）")
-        return self._get_cached_data()
+                print(f"{key} 请求失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {e}")
+                metrics.inc("http_errors_total", source=key, error=type(e).__name__)
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and status < 500 and status not in RETRYABLE_CLIENT_ERRORS:
+                    # 页面本身的错误（如 404）：站点正常，不计入熔断器，重试也不会成功
+                    breaker.record_success()
+                    break
+                # 连接错误、超时、5xx 和限流计入站点熔断器
+                breaker.record_failure(retry_after)
+
+            if attempt < MAX_RETRIES - 1 and retry_after is None:
+                time.sleep(min(backoff_delay(attempt), max(0, expires_at - time.monotonic())))
+
+        return self._last_snapshot(key)
+
+    def _get(self, key: str, url: str, headers: dict, expires_at: float) -> requests.Response:
+        """发出流式GET请求（计时到收到响应头为止，流式下载正文的时间计入解析）"""
+        with metrics.timer("http_request_seconds", source=key):
+            response = self.session.get(
+                url,
+                headers={**self._request_headers(), **headers},
+                timeout=min(REQUEST_TIMEOUT, max(0.1, expires_at - time.monotonic())),
+                stream=True,
+            )
+        metrics.inc("http_requests_total", source=key, status=response.status_code)
+        return response
+
+    def _wait_for_slot(self, key: str, breaker: CircuitBreaker, expires_at: float) -> bool:
+        """
+        等待熔断器和令牌桶放行
+
+        熔断器需要等待的时间（如 Retry-After）在剩余预算内时等待，否则放弃本数据源；
+        半开状态下其他请求正在试探时，在剩余预算内等待试探结果。
+
+        Returns:
+            是否可以发出请求
+        """
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            print(f"⏱️ {key} 超出时间预算，停止重试")
+            metrics.inc("http_budget_exhausted_total", source=key)
+            return False
+        while not breaker.allow():
+            remaining = expires_at - time.monotonic()
+            if breaker.probing:
+                # 其他请求正在试探站点是否恢复：等待试探结果后再判断
+                if breaker.wait_for_probe(remaining):
+                    continue
+                print(f"🔌 {key} 等待站点试探请求超时，停止请求")
+                metrics.inc("breaker_rejected_total", source=key)
+                return False
+            wait = breaker.retry_in()
+            if wait >= remaining:
+                print(f"🔌 {key} 站点熔断中（{wait:.0f}s 后恢复），停止请求")
+                metrics.inc("breaker_rejected_total", source=key)
+                return False
+            print(f"⏳ {key} 站点要求暂停请求，{wait:.1f}s 后重试")
+            time.sleep(wait)
+        started = time.monotonic()
+        if not self.limiter.acquire(timeout=max(0.0, expires_at - started)):
+            breaker.cancel()
+            metrics.inc("http_budget_exhausted_total", source=key)
+            return False
+        metrics.observe("rate_limit_wait_seconds", time.monotonic() - started)
+        return True
+
+    @staticmethod
+    def _cached_data(cached: dict) -> dict:
+        """缓存条目中的价格数据（产品转换为 ProductRecord）"""
+        data = dict(cached["data"])
+        data["products"] = [ProductRecord.from_row(row) for row in data.get("products", [])]
+        return data
+
+    def _remember_update_time(self, key: str, update_time: str):
+        """记录数据源的页面更新时间（历史数据兜底时沿用，数据指纹保持不变）"""
+        meta_key = UPDATE_TIME_META_PREFIX + key
+        if update_time and self.store.get_meta(meta_key) != update_time:
+            self.store.set_meta(meta_key, update_time)
+
+    def _last_snapshot(self, key: str) -> Optional[dict]:
+        """
+        数据源最近一次成功抓取的数据，没有时返回 None
 
-    def _get_cached_data(self) -> dict:
-        """返回缓存的最新数据"""
+        优先使用响应缓存中的解析结果；响应缓存不提交到仓库，不存在时
+        使用历史存储中该数据源分类的最新价格。
+        """
+        cached = self.cache.get(self.SOURCES[key]["url"])
+        if not cached or not cached.get("data"):
+            return self._history_snapshot(key)
+        fetched_at = (cached.get("fetched_at") or "")[:16].replace("T", " ")
+        print(f"⚠️ {key} 使用最近一次抓取的数据（{fetched_at}）")
+        metrics.inc("fetch_fallback_total", source=key, kind="cache")
+        data = self._cached_data(cached)
+        data["source"] = f"{data.get('source', '闪存市场 CFM')} (缓存 {fetched_at})"
+        return data
+
+    def _history_snapshot(self, key: str) -> Optional[dict]:
+        """历史存储中数据源分类的最新价格（没有涨跌等页面字段），没有记录时返回 None"""
+        source = self.SOURCES[key]
+        categories = self.store.product_categories()
+        latest = [
+            (product, price, day) for product, price, day in self.store.latest_records()
+            if categories.get(product) == source["category"]
+        ]
+        if not latest:
+            return None
+        last_date = max(day for _, _, day in latest)
+        update_time = self.store.get_meta(UPDATE_TIME_META_PREFIX + key) or last_date
+        print(f"⚠️ {key} 使用历史数据中的最新价格（{last_date}）")
+        metrics.inc("fetch_fallback_total", source=key, kind="history")
         return {
-            "update_time": "2026-01-20 11:00",
+            "update_time": update_time,
             "currency": "USD",
-            "source": "闪存市场 CFM (缓存)",
-            "url": "https://www.chinaflashmarket.com/pricecenter/ddrchannel",
+            "source": f"闪存市场 CFM (历史数据 {last_date})",
+            "url": source["url"],
             "products": [
-                {"product": "DDR4 UDIMM 8GB 3200", "price": 47.00, "change": 2.00, "change_percent": 4.44, "last_week_price": 45.00, "week_high": 52.00, "week_low": 45.00, "trend": "up"},
-                {"product": "DDR4 UDIMM 16GB 3200", "price": 90.00, "change": 5.00, "change_percent": 5.88, "last_week_price": 85.00, "week_high": 100.60, "week_low": 89.00, "trend": "up"},
-                {"product": "DDR4 UDIMM 32GB 3200", "price": 160.00, "change": 20.00, "change_percent": 14.29, "last_week_price": 140.00, "week_high": 170.00, "week_low": 155.00, "trend": "up"},
-                {"product": "DDR5 UDIMM 16GB 5600", "price": 160.00, "change": 35.00, "change_percent": 28.00, "last_week_price": 125.00, "week_high": 162.00, "week_low": 158.00, "trend": "up"},
-                {"product": "DDR5 UDIMM 16GB 6000", "price": 170.00, "change": 25.00, "change_percent": 17.24, "last_week_price": 145.00, "week_high": 172.00, "week_low": 167.00, "trend": "up"},
-                {"product": "DDR5 UDIMM 32GB 5600", "price": 260.00, "change": 30.00, "change_percent": 13.04, "last_week_price": 230.00, "week_high": 263.00, "week_low": 257.00, "trend": "up"},
-                {"product": "DDR5 UDIMM 32GB 6000", "price": 270.00, "change": 20.00, "change_percent": 8.00, "last_week_price": 250.00, "week_high": 273.00, "week_low": 267.00, "trend": "up"},
+                ProductRecord(product=product, price=price, trend="flat") for product, price, _ in latest
             ],
         }
 
-    def fetch_all_prices(self) -> dict:
-        """获取所有价格数据"""
-        results = {}
-        
+    def fetch_ddr_channel(self, budget: Optional[float] = None) -> Optional[dict]:
+        """获取内存条渠道市场价格"""
+        return self.fetch_source("ddr_channel", budget)
+
+    def fetch_all_prices(
+        self,
+        sources: Optional[list] = None,
+        extra_tasks: Optional[list] = None,
+        deadline: Optional[float] = None,
+    ) -> dict:
+        """
+        并发获取所有价格数据
+
+        Args:
+            sources: 要抓取的数据源键列表，默认全部
+            extra_tasks: 额外的抓取任务（FetchTask），任务结果为 {分类名: 价格数据}，
+                如 JDPriceFetcher.as_task()
+            deadline: 全局时限(秒)，总耗时取决于最慢的页面而不是所有页面之和
+
+        Returns:
+            {分类名: 价格数据}
+        """
         print("🔍 正在获取闪存市场价格数据...")
-        
-        # 获取内存条渠道价格
-        ddr_data = self.fetch_ddr_channel()
-        if ddr_data.get("products"):
-            results["内存条(渠道市场)"] = ddr_data
-            print(f"✅ 获取到 {len(ddr_data['products'])} 个内存产品价格")
-        else:
-            print("❌ 获取内存价格失败")
+
+        tasks = []
+        for key in sources or list(self.SOURCES):
+            fetch = self.fetch_ddr_channel if key == "ddr_channel" else (
+                lambda budget, key=key: self.fetch_source(key, budget)
+            )
+            tasks.append(FetchTask(key, self.SOURCES[key]["url"], fetch))
+        tasks.extend(extra_tasks or [])
+
+        fetched = self.engine.run(tasks, deadline=deadline)
+
+        # 按数据源配置顺序输出，保证报告顺序稳定
+        results = {}
+        for task in tasks:
+            if task.key not in self.SOURCES:
+                results.update(fetched.get(task.key) or {})
+                continue
+            data = fetched.get(task.key)
+            category = self.SOURCES[task.key]["category"]
+            if data and data.get("products"):
+                results[category] = data
+                print(f"✅ {category}: 获取到 {len(data['products'])} 个产品价格")
+            else:
+                print(f"❌ {category}: 获取价格失败")
         
         return results
 
@@ -203,8 +409,8 @@ def main():
         print(f"更新时间: {data.get('update_time')}")
         print(f"数据来源: {data.get('source')}")
         for product in data.get("products", []):
-            trend = "↑" if product.get("trend") == "up" else "↓" if product.get("trend") == "down" else "-"
-            print(f"  {product['product']}: ${product['price']:.2f} {trend}{abs(product.get('change_percent', 0)):.2f}%")
+            trend = "↑" if product.trend == "up" else "↓" if product.trend == "down" else "-"
+            print(f"  {product.product}: ${product.price:.2f} {trend}{abs(product.change_percent):.2f}%")
 
 
 if __name__ == "__main__":
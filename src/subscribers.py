@@ -0,0 +1,194 @@
+"""
+订阅者个性化报告模块
+每个订阅者可以配置关注列表，只接收关注产品的价格明细；
+市场概览（排名、统计、平均涨幅、走势图）对所有订阅者只计算一次，
+各订阅者的报告在进程池中渲染，渲染完成的报告逐个交给发送方，不在内存中积累
+"""
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .alerts import name_tokens
+from .config import RECIPIENT_EMAILS, RENDER_PROCESS_THRESHOLD, RENDER_WORKERS, SUBSCRIBERS_FILE
+from .metrics import metrics
+from .product_attrs import ATTRIBUTES, parse_product_name
+
+
+class WatchItem(NamedTuple):
+    """
+    关注条件，与提醒规则的产品条件相同
+
+    product 为完整产品名；pattern 为关键词集合；attrs 为产品属性条件。
+    """
+    product: Optional[str] = None
+    pattern: FrozenSet[str] = frozenset()
+    attrs: Tuple[Tuple[str, object], ...] = ()
+
+    def matches(self, name: str) -> bool:
+        """产品是否满足条件"""
+        if self.product is not None:
+            return name == self.product
+        if not self.pattern <= name_tokens(name):
+            return False
+        attrs = parse_product_name(name)
+        return all(getattr(attrs, attribute) == expected for attribute, expected in self.attrs)
+
+
+class Subscriber(NamedTuple):
+    """订阅者，watchlist 为空时接收完整报告"""
+    email: str
+    watchlist: Tuple[WatchItem, ...] = ()
+
+    def watches(self, name: str) -> bool:
+        """产品是否在关注列表中"""
+        return any(item.matches(name) for item in self.watchlist)
+
+
+def _watch_item(item) -> WatchItem:
+    """解析关注条件：字符串为完整产品名，对象同提醒规则的 product / pattern / 产品属性"""
+    if isinstance(item, str):
+        return WatchItem(product=item)
+    attrs = tuple(
+        (attribute, item[attribute].upper() if attribute == "generation" else item[attribute])
+        for attribute in ATTRIBUTES if item.get(attribute) is not None
+    )
+    return WatchItem(item.get("product"), name_tokens(item.get("pattern", "")), attrs)
+
+
+def load_subscribers(path: Path = None) -> List[Subscriber]:
+    """
+    读取订阅者配置
+
+    格式: {"subscribers": [{"email", "watchlist": ["完整产品名" | {"pattern" / 产品属性}]}]}。
+    RECIPIENT_EMAIL 中未出现在配置里的收件人接收完整报告；配置文件不存在时
+    所有 RECIPIENT_EMAIL 都接收完整报告。
+    """
+    path = Path(path or SUBSCRIBERS_FILE)
+    subscribers = []
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ 读取订阅者配置失败: {e}")
+            config = {}
+        for item in config.get("subscribers", []):
+            if not item.get("email"):
+                print(f"⚠️ 跳过缺少邮箱的订阅者: {item}")
+                continue
+            watchlist = tuple(_watch_item(watch) for watch in item.get("watchlist", []))
+            subscribers.append(Subscriber(item["email"], watchlist))
+
+    configured = {subscriber.email for subscriber in subscribers}
+    subscribers.extend(Subscriber(email) for email in RECIPIENT_EMAILS if email not in configured)
+    return subscribers
+
+
+def watchlist_positions(context: dict, subscriber: Subscriber) -> Optional[List[int]]:
+    """关注产品在 all_products_ranked 中的位置，没有关注列表时返回 None"""
+    if not subscriber.watchlist:
+        return None
+    return [
+        position for position, product in enumerate(context["all_products_ranked"])
+        if subscriber.watches(product.product)
+    ]
+
+
+def watchlist_context(context: dict, positions: Optional[List[int]]) -> dict:
+    """
+    订阅者的模板上下文
+
+    市场概览沿用共享上下文，价格明细只保留关注的产品（保持排名顺序）。
+    """
+    if positions is None:
+        return context
+    ranked = [context["all_products_ranked"][i] for i in positions]
+    names = {p.product for p in ranked}
+    personal = dict(context)
+    personal["all_products_ranked"] = ranked
+    personal["all_products"] = [p for p in context["all_products"] if p.product in names]
+    personal["watchlist_size"] = len(ranked)
+    return personal
+
+
+# 工作进程中的共享上下文（进程池初始化时传入一次，任务只传递关注产品的位置）
+_worker_context: Optional[dict] = None
+
+
+def _init_worker(context: dict):
+    global _worker_context
+    _worker_context = context
+
+
+def _render_in_worker(positions: Optional[List[int]]) -> Tuple[str, str]:
+    from .report import ReportGenerator
+
+    generator = ReportGenerator()
+    context = watchlist_context(_worker_context, positions)
+    return generator.render_html(context), generator.render_text(context)
+
+
+def render_reports(
+    generator,
+    context: dict,
+    subscribers: Iterable[Subscriber],
+    workers: int = None,
+) -> Iterator[Tuple[Subscriber, str, str]]:
+    """
+    逐个生成订阅者的报告
+
+    完整报告只渲染一次供所有未配置关注列表的订阅者共用；关注列表报告数量
+    达到 RENDER_PROCESS_THRESHOLD 时在进程池中渲染，同时在途的任务不超过
+    工作进程数的两倍，按完成顺序产出。
+
+    Args:
+        generator: ReportGenerator
+        context: ReportGenerator.build_context 的共享上下文
+        subscribers: 订阅者
+        workers: 渲染进程数，默认读取 RENDER_WORKERS（0 为CPU核数）
+
+    Yields:
+        (订阅者, HTML报告, 纯文本报告)
+    """
+    full_report = None
+    personal = []
+    for subscriber in subscribers:
+        positions = watchlist_positions(context, subscriber)
+        if positions is None:
+            if full_report is None:
+                full_report = generator.render_html(context), generator.render_text(context)
+            metrics.inc("reports_rendered_total", kind="full")
+            yield (subscriber, *full_report)
+        else:
+            personal.append((subscriber, positions))
+    if not personal:
+        return
+
+    workers = workers if workers is not None else RENDER_WORKERS
+    workers = min(workers or os.cpu_count() or 1, len(personal))
+    if workers <= 1 or len(personal) < RENDER_PROCESS_THRESHOLD:
+        for subscriber, positions in personal:
+            view = watchlist_context(context, positions)
+            metrics.inc("reports_rendered_total", kind="watchlist")
+            yield subscriber, generator.render_html(view), generator.render_text(view)
+        return
+
+    pending = iter(personal)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(context,)) as executor:
+        in_flight = {}
+        for subscriber, positions in pending:
+            in_flight[executor.submit(_render_in_worker, positions)] = subscriber
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                subscriber = in_flight.pop(future)
+                html, text = future.result()
+                metrics.inc("reports_rendered_total", kind="watchlist")
+                yield subscriber, html, text
+                for next_subscriber, positions in pending:
+                    in_flight[executor.submit(_render_in_worker, positions)] = next_subscriber
+                    break
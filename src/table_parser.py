@@ -0,0 +1,185 @@
+"""
+价格表格流式解析模块
+对页面做单遍扫描，边读取边产出产品数据，支持页面中的多个表格
+"""
+import re
+import sys
+from datetime import datetime
+from html import unescape
+from typing import Iterable, Iterator, List, Optional, Union
+
+from .product_record import ProductRecord
+
+# 单遍扫描的标记：表格开始/结束，或一整行
+_TOKEN_RE = re.compile(r'<(/?)table\b[^>]*>|<tr\b[^>]*>(.*?)</tr\s*>', re.DOTALL | re.IGNORECASE)
+_ROW_START_RE = re.compile(r'<tr\b', re.IGNORECASE)
+_CELL_RE = re.compile(
+    r'<(td|rowheader|th)\b[^>]*>(.*?)</(?:td|rowheader|th)\s*>', re.DOTALL | re.IGNORECASE
+)
+
+# 单元格数值提取（只作用于单元格内容）
+_LINK_RE = re.compile(r'>([^<]+)</a>', re.IGNORECASE)
+_DOLLAR_RE = re.compile(r'\$([\d.]+)')
+_NUMBER_RE = re.compile(r'([+-]?[\d.]+)')
+_PERCENT_RE = re.compile(r'([+-]?[\d.]+)%')
+_UPDATE_TIME_RE = re.compile(r'(\d{4}-\d{2}-\d{2}\s*\d{2}:\d{2})')
+
+
+def parse_row(row_html: str) -> Optional[ProductRecord]:
+    """
+    将一行表格转换为产品数据
+
+    Args:
+        row_html: <tr> 内部的HTML
+
+    Returns:
+        产品数据，表头行或无法识别的行返回 None
+    """
+    cells = _CELL_RE.findall(row_html)
+    if len(cells) < 7:
+        return None
+
+    # 跳过表头
+    for tag, _ in cells:
+        if tag.lower() == "th":
+            return None
+    cells = [content for _, content in cells]
+
+    # 提取产品名称（从链接中）
+    product_match = _LINK_RE.search(cells[0])
+    if not product_match:
+        return None
+    product = product_match.group(1).strip()
+    if "&" in product:
+        product = unescape(product)
+
+    # 提取数字
+    try:
+        price = float(_DOLLAR_RE.search(cells[1]).group(1))
+        change_match = _NUMBER_RE.search(cells[2])
+        change = float(change_match.group(1)) if change_match else 0
+        change_pct_match = _PERCENT_RE.search(cells[3])
+        change_pct = float(change_pct_match.group(1)) if change_pct_match else 0
+        last_price = float(_DOLLAR_RE.search(cells[4]).group(1))
+        week_high = float(_DOLLAR_RE.search(cells[5]).group(1))
+        week_low = float(_DOLLAR_RE.search(cells[6]).group(1))
+    except (AttributeError, ValueError) as e:
+        print(f"解析数据失败: {e}")
+        return None
+
+    # 判断涨跌方向
+    if '+' in cells[2]:
+        change = abs(change)
+        change_pct = abs(change_pct)
+        trend = "up"
+    else:
+        change = -abs(change) if change != 0 else 0
+        change_pct = -abs(change_pct) if change_pct != 0 else 0
+        trend = "down" if change < 0 else "flat"
+
+    return ProductRecord(
+        product=sys.intern(product),
+        price=price,
+        change=change,
+        change_percent=change_pct,
+        last_week_price=last_price,
+        week_high=week_high,
+        week_low=week_low,
+        trend=trend,
+    )
+
+
+class PriceTableParser:
+    """
+    价格表格流式解析器
+
+    逐块 feed 页面文本，每凑齐一行就解析，已解析的部分立即丢弃，
+    不保留整页副本。页面中所有 <table> 的数据行都会被解析，
+    同时记录页面中出现的第一个更新时间。
+    """
+
+    def __init__(self):
+        self.update_time: Optional[str] = None
+        self._buffer = ""
+        self._table_depth = 0
+        self._pending: List[ProductRecord] = []
+
+    def _find_update_time(self, text: str):
+        """在已消费的文本中查找更新时间"""
+        if self.update_time is None:
+            time_match = _UPDATE_TIME_RE.search(text)
+            if time_match:
+                self.update_time = time_match.group(1)
+
+    def _consume(self, final: bool = False):
+        """解析缓冲区中已完整的部分"""
+        buffer = self._buffer
+        consumed = 0
+        for match in _TOKEN_RE.finditer(buffer):
+            row_html = match.group(2)
+            if row_html is None:
+                if match.group(1):
+                    self._table_depth = max(0, self._table_depth - 1)
+                else:
+                    self._table_depth += 1
+            elif self._table_depth:
+                product = parse_row(row_html)
+                if product:
+                    self._pending.append(product)
+            consumed = match.end()
+
+        if final:
+            keep_from = len(buffer)
+        else:
+            # 保留未完成的行；没有未完成的行时只保留可能被截断的标签
+            row_start = _ROW_START_RE.search(buffer, consumed)
+            if row_start:
+                keep_from = row_start.start()
+            else:
+                keep_from = max(consumed, buffer.rfind("<"))
+
+        self._find_update_time(buffer[:keep_from])
+        self._buffer = buffer[keep_from:]
+
+    def feed(self, chunk: str):
+        """输入一块页面文本"""
+        self._buffer += chunk
+        self._consume()
+
+    def close(self):
+        """输入结束，处理缓冲区剩余内容"""
+        self._consume(final=True)
+
+    def _drain(self) -> List[ProductRecord]:
+        """取出已解析完成的产品"""
+        products, self._pending = self._pending, []
+        return products
+
+    def parse_stream(self, chunks: Union[str, Iterable[str]]) -> Iterator[ProductRecord]:
+        """
+        流式解析页面
+
+        Args:
+            chunks: 页面文本，或逐块读取的文本迭代器（如 response.iter_content）
+
+        Yields:
+            产品数据，每解析完一行立即产出
+        """
+        if isinstance(chunks, str):
+            chunks = (chunks,)
+        for chunk in chunks:
+            if chunk:
+                self.feed(chunk)
+                yield from self._drain()
+        self.close()
+        yield from self._drain()
+
+
+def iter_price_rows(chunks: Union[str, Iterable[str]]) -> Iterator[ProductRecord]:
+    """流式解析页面中所有价格表格的数据行"""
+    return PriceTableParser().parse_stream(chunks)
+
+
+def extract_update_time(parser: PriceTableParser) -> str:
+    """获取页面更新时间，页面中没有时使用当前时间"""
+    return parser.update_time or datetime.now().strftime("%Y-%m-%d %H:%M")
@@ -0,0 +1,79 @@
+"""
+User-Agent 池模块
+从 fake_useragent 采样一批UA缓存到本地文件，之后的运行直接读取缓存，
+不必每次启动都导入 fake_useragent 并加载其完整数据集
+"""
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import List
+
+from .config import USER_AGENT_CACHE_FILE, USER_AGENT_CACHE_TTL, USER_AGENT_POOL_SIZE
+
+# fake_useragent 不可用时使用的内置UA
+FALLBACK_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:127.0) Gecko/20100101 Firefox/127.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Safari/537.36",
+]
+
+
+class UserAgentPool:
+    """本地缓存的UA池，接口与 fake_useragent.UserAgent 的 random 属性一致"""
+
+    def __init__(self, path: Path = None, size: int = None, ttl: float = None):
+        self.path = Path(path or USER_AGENT_CACHE_FILE)
+        self.size = size or USER_AGENT_POOL_SIZE
+        self.ttl = USER_AGENT_CACHE_TTL if ttl is None else ttl
+        self.agents = self._load()
+
+    @property
+    def random(self) -> str:
+        """随机一个UA"""
+        return random.choice(self.agents)
+
+    def _load(self) -> List[str]:
+        """读取未过期的缓存，否则重新采样并写入缓存"""
+        try:
+            if time.time() - self.path.stat().st_mtime < self.ttl:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    agents = json.load(f)
+                if agents:
+                    return agents
+        except (OSError, ValueError):
+            pass
+
+        agents = self._sample()
+        if agents:
+            self._save(agents)
+            return agents
+        return list(FALLBACK_USER_AGENTS)
+
+    def _sample(self) -> List[str]:
+        """从 fake_useragent 采样不重复的UA"""
+        try:
+            from fake_useragent import UserAgent
+
+            ua = UserAgent()
+            agents = list(dict.fromkeys(ua.random for _ in range(self.size * 3)))
+        except Exception as e:
+            print(f"⚠️ 生成User-Agent池失败，使用内置UA: {e}")
+            return []
+        return agents[:self.size]
+
+    def _save(self, agents: List[str]):
+        """原子写入缓存文件"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(agents, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 保存User-Agent缓存失败: {e}")
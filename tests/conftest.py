@@ -0,0 +1,119 @@
+"""
+测试公共夹具：本地SMTP服务、连接本地服务的发送器、临时发件队列
+"""
+import smtplib
+import socketserver
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import email_sender  # noqa: E402
+from src.email_sender import EmailSender  # noqa: E402
+from src.outbox import Outbox  # noqa: E402
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    最小SMTP服务：接受任意登录，按 server.reject 中的 {收件人: (代码, 说明)} 拒绝收件人，
+    收到的邮件按连接记录在 server.sessions 中
+    """
+
+    def handle(self):
+        session = []
+        with self.server.lock:
+            self.server.sessions.append(session)
+        recipients = []
+        self.wfile.write(b"220 sink ready\r\n")
+        for line in self.rfile:
+            text = line.decode("utf-8", "replace").strip()
+            command = text.upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-sink\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command.startswith("AUTH"):
+                self.wfile.write(b"235 ok\r\n")
+            elif command.startswith("MAIL FROM"):
+                recipients = []
+                self.wfile.write(b"250 ok\r\n")
+            elif command.startswith("RCPT TO"):
+                address = text.split(":", 1)[1].strip().strip("<>")
+                rejected = self.server.reject.get(address)
+                if rejected:
+                    code, reason = rejected
+                    self.wfile.write(f"{code} {reason}\r\n".encode())
+                else:
+                    recipients.append(address)
+                    self.wfile.write(b"250 ok\r\n")
+            elif command == "DATA":
+                self.wfile.write(b"354 end with .\r\n")
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                with self.server.lock:
+                    session.extend(recipients)
+                self.wfile.write(b"250 ok\r\n")
+            elif command == "QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """本地SMTP服务"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.reject = {}
+
+    @property
+    def received(self) -> list:
+        """按接收顺序排列的全部收件人"""
+        with self.lock:
+            return [address for session in self.sessions for address in session]
+
+
+class SinkEmailSender(EmailSender):
+    """连接本地SMTP服务的发送器（本地服务不提供TLS，改用明文连接，其余流程不变）"""
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=5)
+        server.login(self.email, self.password)
+        return server
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    yield sink
+    sink.shutdown()
+    sink.server_close()
+
+
+@pytest.fixture
+def sender(smtp_sink, monkeypatch):
+    # 测试中不限速
+    monkeypatch.setattr(email_sender, "SMTP_SEND_RATE", 0)
+    return SinkEmailSender(
+        smtp_server="127.0.0.1",
+        smtp_port=smtp_sink.server_address[1],
+        email="monitor@localhost",
+        password="x",
+    )
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(tmp_path / "outbox.db")
+    yield box
+    box.close()
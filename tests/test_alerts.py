@@ -0,0 +1,90 @@
+"""
+价格提醒测试：阈值币种换算
+"""
+import json
+
+import pytest
+
+from src.alerts import RULE_ABOVE, RULE_BELOW, AlertEngine, AlertRule, load_rules
+from src.currency import CurrencyConverter
+from src.history_store import HistoryStore
+from src.product_record import ProductRecord, category_meta
+
+REPORT_DATE = "2026-01-20"
+JD = category_meta("三星SSD", source="京东", currency="CNY")
+CFM = category_meta("内存条(渠道市场)", source="闪存市场 CFM", currency="USD")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "prices.db", legacy_json=tmp_path / "missing.json")
+    store.put_fx_rates([("USD", "2026-01-16", 7.0)])
+    yield store
+    store.close()
+
+
+def rule(kind, value, currency="USD", **kwargs) -> AlertRule:
+    return AlertRule(id=f"{kind}-{value}", kind=kind, value=value, recipients=("a@example.com",),
+                     currency=currency, **kwargs)
+
+
+def evaluate(engine: AlertEngine, *products: ProductRecord) -> list:
+    return engine.evaluate({
+        "date": REPORT_DATE,
+        "all_products": list(products),
+        "new_products": [],
+        "changed_products": [p.product for p in products],
+    })
+
+
+def test_usd_threshold_is_converted_for_cny_products(store):
+    engine = AlertEngine(
+        [rule(RULE_BELOW, 200, pattern=frozenset({"990"}))], converter=CurrencyConverter(store)
+    )
+    # 200 USD ≈ 1400 CNY
+    below = ProductRecord("三星 990 PRO 2TB", 1299.0, previous_price=1450.0, meta=JD)
+    above = ProductRecord("三星 990 PRO 4TB", 1499.0, previous_price=1550.0, meta=JD)
+
+    alerts = evaluate(engine, below, above)
+
+    assert [a.product for a in alerts] == ["三星 990 PRO 2TB"]
+    assert "$200.00（≈ ¥1400.00）" in alerts[0].message
+
+
+def test_same_currency_threshold_is_compared_directly(store):
+    engine = AlertEngine([rule(RULE_ABOVE, 250)], converter=CurrencyConverter(store))
+    product = ProductRecord("DDR5 UDIMM 32GB 6000", 260.0, previous_price=240.0, meta=CFM)
+
+    alerts = evaluate(engine, product)
+
+    assert len(alerts) == 1
+    assert "高于 $250.00" in alerts[0].message
+    assert "≈ ¥" not in alerts[0].message.split("高于")[1]
+
+
+def test_cny_threshold_for_usd_products(store):
+    engine = AlertEngine([rule(RULE_ABOVE, 1750, currency="CNY")], converter=CurrencyConverter(store))
+    # 1750 CNY = 250 USD
+    product = ProductRecord("DDR5 UDIMM 32GB 6000", 251.0, previous_price=249.0, meta=CFM)
+
+    assert len(evaluate(engine, product)) == 1
+
+
+def test_missing_rate_skips_rule(tmp_path):
+    store = HistoryStore(tmp_path / "prices.db", legacy_json=tmp_path / "missing.json")
+    try:
+        engine = AlertEngine([rule(RULE_BELOW, 200)], converter=CurrencyConverter(store))
+        product = ProductRecord("三星 990 PRO 2TB", 1.0, previous_price=2000.0, meta=JD)
+        assert evaluate(engine, product) == []
+    finally:
+        store.close()
+
+
+def test_load_rules_reads_currency(tmp_path):
+    path = tmp_path / "alerts.json"
+    path.write_text(json.dumps({"rules": [
+        {"id": "usd", "type": "above", "value": 250},
+        {"id": "cny", "type": "below", "value": 1200, "currency": "cny"},
+    ]}), encoding="utf-8")
+
+    assert [(r.id, r.currency) for r in load_rules(path)] == [("usd", "USD"), ("cny", "CNY")]
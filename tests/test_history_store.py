@@ -0,0 +1,46 @@
+"""
+历史存储测试：多个线程共享同一个连接读写
+"""
+import threading
+
+from src.history_store import HistoryStore
+
+
+def test_concurrent_readers_and_writer_share_connection(tmp_path):
+    store = HistoryStore(tmp_path / "prices.db", legacy_json=tmp_path / "missing.json")
+    store.append_record("2026-01-01", "2026-01-01T12:00:00", {"DDR5 UDIMM 32GB 6000": 260.0})
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                store.latest_records()
+                store.products()
+                store.record_count()
+                store.fx_currencies()
+                store.get_meta("schema_version")
+                store.get_series_batch(["DDR5 UDIMM 32GB 6000"], freq=None)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for day in range(2, 29):
+            store.append_record(
+                f"2026-01-{day:02d}", f"2026-01-{day:02d}T12:00:00",
+                {"DDR5 UDIMM 32GB 6000": 260.0 + day, f"DDR4 UDIMM 8GB 3200 #{day}": 40.0},
+                full=False,
+            )
+            store.put_fx_rates([("USD", f"2026-01-{day:02d}", 7.0)])
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+    assert errors == []
+    assert store.record_count() == 28
+    assert len(store.latest_records()) == 28
+    store.close()
@@ -0,0 +1,209 @@
+"""
+京东价格获取测试：JDPriceFetcher 对接本地 mgets 接口
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.fetcher import FetchEngine
+from src.jd_scraper import JDPriceFetcher
+
+
+class MgetsHandler(BaseHTTPRequestHandler):
+    """按 skuIds 参数返回 server.prices 中的报价，可按 server 属性模拟故障和慢响应"""
+
+    def do_GET(self):
+        server = self.server
+        skus = parse_qs(urlparse(self.path).query)["skuIds"][0].split(",")
+        with server.lock:
+            server.requests.append(skus)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        try:
+            time.sleep(server.delay)
+            if fail:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if server.body is not None:
+                body = server.body
+            else:
+                body = json.dumps([
+                    dict(server.prices[sku.replace("J_", "", 1)], id=sku)
+                    for sku in skus
+                    if sku.replace("J_", "", 1) in server.prices
+                ]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MgetsStub(ThreadingHTTPServer):
+    """本地京东价格接口"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MgetsHandler)
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.requests = []
+        self.failures = 0
+        self.body = None
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/prices/mgets"
+
+
+@pytest.fixture
+def stub():
+    server = MgetsStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def products_file(tmp_path):
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps({
+        "categories": {
+            "三星SSD": {"products": [
+                {"sku": "1001", "name": "三星 990 PRO 2TB"},
+                {"sku": "1002", "name": "三星 990 PRO 1TB"},
+                {"sku": "1003", "name": "三星 990 EVO 2TB"},
+            ]},
+            "金士顿内存": {"products": [
+                {"sku": "2001", "name": "金士顿 FURY DDR5 32GB"},
+                {"sku": "1001", "name": "三星 990 PRO 2TB"},
+            ]},
+        }
+    }, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def make_fetcher(stub, products_file, **kwargs) -> JDPriceFetcher:
+    return JDPriceFetcher(api_url=stub.url, products_file=products_file, **kwargs)
+
+
+def test_fetch_all_parses_prices(stub, products_file):
+    stub.prices = {
+        "1001": {"p": "1299.00", "op": "1599.00"},
+        "1002": {"p": "699.00"},
+        "1003": {"p": "-1.00", "op": "999.00"},  # 无货
+        "2001": {"p": "not a price"},
+    }
+
+    results = make_fetcher(stub, products_file).fetch_all(deadline=10)
+
+    assert set(results) == {"三星SSD", "金士顿内存"}
+    ssd = results["三星SSD"]
+    assert [(r.product, r.price) for r in ssd["products"]] == [
+        ("三星 990 PRO 2TB", 1299.0),
+        ("三星 990 PRO 1TB", 699.0),
+    ]
+    assert ssd["realtime"] is True
+    assert ssd["currency"] == "CNY"
+    assert ssd["source"] == "京东"
+    # 同一SKU出现在多个分类中只请求一次
+    assert [(r.product, r.price) for r in results["金士顿内存"]["products"]] == [("三星 990 PRO 2TB", 1299.0)]
+    assert sorted(sku for skus in stub.requests for sku in skus) == ["J_1001", "J_1002", "J_1003", "J_2001"]
+
+
+def test_fetch_chunk_keeps_original_price(stub, products_file):
+    stub.prices = {"1001": {"p": "1299.00", "op": "1599.00"}, "1002": {"p": "699.00", "op": ""}}
+
+    prices = make_fetcher(stub, products_file)._fetch_chunk(["1001", "1002"], budget=10)
+
+    assert prices == {
+        "1001": {"price": 1299.0, "original_price": 1599.0},
+        "1002": {"price": 699.0, "original_price": 699.0},
+    }
+
+
+def test_empty_response_returns_no_categories(stub, products_file):
+    stub.body = b"[]"
+
+    assert make_fetcher(stub, products_file).fetch_all(deadline=10) == {}
+    assert len(stub.requests) == 1
+
+
+def test_fetch_chunk_retries_server_errors(stub, products_file):
+    stub.failures = 1
+    stub.prices = {"1001": {"p": "1299.00"}}
+
+    prices = make_fetcher(stub, products_file)._fetch_chunk(["1001"], budget=10)
+
+    assert prices == {"1001": {"price": 1299.0, "original_price": 1299.0}}
+    assert len(stub.requests) == 2
+
+
+def test_fetch_chunk_gives_up_on_invalid_json(stub, products_file):
+    stub.body = b"<html>blocked</html>"
+
+    with pytest.raises(RuntimeError):
+        make_fetcher(stub, products_file)._fetch_chunk(["1001"], budget=1.5)
+    # 重试受时间预算限制
+    assert 1 <= len(stub.requests) <= 2
+
+
+def test_failed_chunk_does_not_drop_other_chunks(stub, products_file):
+    stub.prices = {sku: {"p": "100.00"} for sku in ("1001", "1002", "1003", "2001")}
+    stub.failures = 3  # 第一批用尽重试次数
+    fetcher = make_fetcher(
+        stub, products_file, batch_size=2, engine=FetchEngine(max_workers=1, per_host_limit=1)
+    )
+
+    results = fetcher.fetch_all(deadline=10)
+
+    fetched = {r.product for data in results.values() for r in data["products"]}
+    assert fetched == {"三星 990 EVO 2TB", "金士顿 FURY DDR5 32GB"}
+
+
+def test_unreachable_api_returns_empty(products_file):
+    fetcher = JDPriceFetcher(api_url="http://127.0.0.1:9/prices/mgets", products_file=products_file)
+
+    assert fetcher.fetch_all(deadline=1.5) == {}
+
+
+def test_requests_are_batched_and_throttled_per_host(stub, tmp_path):
+    skus = [str(3000 + i) for i in range(10)]
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps({
+        "categories": {"SSD": {"products": [{"sku": sku, "name": f"SSD {sku}"} for sku in skus]}}
+    }), encoding="utf-8")
+    stub.prices = {sku: {"p": "100.00"} for sku in skus}
+    stub.delay = 0.2
+    fetcher = JDPriceFetcher(
+        api_url=stub.url,
+        products_file=path,
+        batch_size=3,
+        engine=FetchEngine(max_workers=8, per_host_limit=2),
+    )
+
+    results = fetcher.fetch_all(deadline=10)
+
+    assert len(results["SSD"]["products"]) == 10
+    assert sorted(len(batch) for batch in stub.requests) == [1, 3, 3, 3]
+    # 站点并发数不超过 per_host_limit
+    assert stub.max_in_flight == 2
@@ -0,0 +1,230 @@
+"""
+发件队列投递测试：Outbox.drain 对接本地SMTP服务
+"""
+import sqlite3
+import time
+
+import pytest
+
+import main
+from src.config import OUTBOX_BACKOFF_BASE
+from src.outbox import STATUS_FAILED, STATUS_PENDING, STATUS_SENT, Outbox
+
+
+def make_message(sender, to_email: str, subject: str = "内存条价格周报"):
+    return sender.build_message(to_email, subject, "<p>report</p>", "report")
+
+
+def row(outbox: Outbox, message_id: int) -> dict:
+    cursor = outbox.conn.execute(
+        "SELECT status, attempts, next_attempt_at, last_error, finished_at FROM outbox WHERE id = ?",
+        (message_id,),
+    )
+    values = cursor.fetchone()
+    return None if values is None else dict(zip([c[0] for c in cursor.description], values))
+
+
+def make_due(outbox: Outbox):
+    """跳过退避等待：所有待发邮件立即到期"""
+    with outbox.conn:
+        outbox.conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE status = ?", (STATUS_PENDING,))
+
+
+def test_drain_delivers_due_messages(outbox, sender, smtp_sink):
+    ids = [outbox.enqueue(make_message(sender, to)) for to in ("a@example.com", "b@example.com")]
+
+    assert outbox.drain(sender) == (2, 0)
+    assert sorted(smtp_sink.received) == ["a@example.com", "b@example.com"]
+    assert all(row(outbox, i)["status"] == STATUS_SENT for i in ids)
+    assert outbox.pending_count() == 0
+    # 已投递的邮件不会再次发送
+    assert outbox.drain(sender) == (0, 0)
+    assert len(smtp_sink.received) == 2
+
+
+def test_temporary_failure_backs_off_then_retries(outbox, sender, smtp_sink):
+    smtp_sink.reject["a@example.com"] = (451, "try again later")
+    message_id = outbox.enqueue(make_message(sender, "a@example.com"))
+
+    before = time.time()
+    assert outbox.drain(sender) == (0, 1)
+    first = row(outbox, message_id)
+    assert first["status"] == STATUS_PENDING
+    assert first["attempts"] == 1
+    assert "451" in first["last_error"]
+    assert first["next_attempt_at"] >= before + OUTBOX_BACKOFF_BASE * 0.8
+
+    # 退避期内不重试
+    assert outbox.due() == []
+    assert outbox.drain(sender) == (0, 0)
+    assert 0 < outbox.next_attempt_in() <= OUTBOX_BACKOFF_BASE * 1.2
+
+    # 第二次失败的间隔翻倍
+    make_due(outbox)
+    before = time.time()
+    assert outbox.drain(sender) == (0, 1)
+    second = row(outbox, message_id)
+    assert second["attempts"] == 2
+    assert second["next_attempt_at"] >= before + OUTBOX_BACKOFF_BASE * 2 * 0.8
+
+    # 服务器恢复后投递成功
+    del smtp_sink.reject["a@example.com"]
+    make_due(outbox)
+    assert outbox.drain(sender) == (1, 0)
+    assert smtp_sink.received == ["a@example.com"]
+    assert row(outbox, message_id)["status"] == STATUS_SENT
+
+
+def test_connection_failure_keeps_messages_pending(outbox, sender, smtp_sink):
+    ids = [outbox.enqueue(make_message(sender, to)) for to in ("a@example.com", "b@example.com")]
+    smtp_sink.shutdown()
+    smtp_sink.server_close()
+
+    assert outbox.drain(sender) == (0, 2)
+    for message_id in ids:
+        state = row(outbox, message_id)
+        assert state["status"] == STATUS_PENDING
+        assert state["attempts"] == 1
+        assert state["finished_at"] is None
+
+
+def test_permanent_rejection_is_not_retried(outbox, sender, smtp_sink):
+    smtp_sink.reject["gone@example.com"] = (550, "no such user")
+    rejected = outbox.enqueue(make_message(sender, "gone@example.com"))
+    delivered = outbox.enqueue(make_message(sender, "b@example.com"))
+
+    assert outbox.drain(sender) == (1, 1)
+    assert row(outbox, rejected)["status"] == STATUS_FAILED
+    assert row(outbox, delivered)["status"] == STATUS_SENT
+    make_due(outbox)
+    assert outbox.drain(sender) == (0, 0)
+    assert smtp_sink.received == ["b@example.com"]
+
+
+def test_duplicate_recipients_are_sent_in_separate_batches(outbox, sender, smtp_sink):
+    recipients = ["a@example.com", "a@example.com", "b@example.com", "a@example.com"]
+    ids = [
+        outbox.enqueue(make_message(sender, to, subject=f"报告 {i}"))
+        for i, to in enumerate(recipients)
+    ]
+
+    assert outbox.drain(sender) == (4, 0)
+    assert sorted(smtp_sink.received) == sorted(recipients)
+    assert all(row(outbox, i)["status"] == STATUS_SENT for i in ids)
+    # 每个批次一个连接，同一连接中收件人不重复
+    sessions = [session for session in smtp_sink.sessions if session]
+    assert len(sessions) == 3
+    assert all(len(session) == len(set(session)) for session in sessions)
+
+
+def test_duplicate_recipient_failure_only_affects_its_own_message(outbox, sender, smtp_sink):
+    first = outbox.enqueue(make_message(sender, "a@example.com"))
+    second = outbox.enqueue(make_message(sender, "a@example.com"))
+    smtp_sink.reject["a@example.com"] = (451, "try again later")
+
+    assert outbox.drain(sender) == (0, 2)
+    assert row(outbox, first)["attempts"] == 1
+    assert row(outbox, second)["attempts"] == 1
+
+
+def test_crash_between_send_and_mark_sent_redelivers(tmp_path, sender, smtp_sink, monkeypatch):
+    path = tmp_path / "outbox.db"
+    outbox = Outbox(path)
+    ids = [outbox.enqueue(make_message(sender, to)) for to in ("a@example.com", "b@example.com")]
+
+    def crash(message_id):
+        raise RuntimeError("进程在标记发送成功前退出")
+
+    monkeypatch.setattr(outbox, "mark_sent", crash)
+    with pytest.raises(RuntimeError):
+        outbox.drain(sender)
+    outbox.close()
+    # 邮件已经发出，但队列中仍是待发状态
+    assert sorted(smtp_sink.received) == ["a@example.com", "b@example.com"]
+
+    # 重启后重新投递：至少送达一次，不会丢失
+    restarted = Outbox(path)
+    try:
+        assert restarted.pending_count() == 2
+        assert restarted.drain(sender) == (2, 0)
+        assert all(row(restarted, i)["status"] == STATUS_SENT for i in ids)
+        assert sorted(smtp_sink.received) == ["a@example.com"] * 2 + ["b@example.com"] * 2
+    finally:
+        restarted.close()
+
+
+def test_purge_removes_finished_messages_after_retention(outbox, sender, smtp_sink):
+    smtp_sink.reject["gone@example.com"] = (550, "no such user")
+    sent = outbox.enqueue(make_message(sender, "a@example.com"))
+    failed = outbox.enqueue(make_message(sender, "gone@example.com"))
+    recent = outbox.enqueue(make_message(sender, "b@example.com"))
+    outbox.drain(sender)
+    smtp_sink.reject["c@example.com"] = (451, "try again later")
+    pending = outbox.enqueue(make_message(sender, "c@example.com"))
+    outbox.drain(sender)
+
+    old = time.time() - 8 * 86400
+    with outbox.conn:
+        outbox.conn.execute("UPDATE outbox SET finished_at = ? WHERE id IN (?, ?)", (old, sent, failed))
+
+    assert outbox.purge(retention_days=7) == 2
+    assert row(outbox, sent) is None
+    assert row(outbox, failed) is None
+    assert row(outbox, recent)["status"] == STATUS_SENT
+    assert row(outbox, pending)["status"] == STATUS_PENDING
+
+
+def test_drain_purges_expired_messages(outbox, sender, smtp_sink):
+    message_id = outbox.enqueue(make_message(sender, "a@example.com"))
+    outbox.drain(sender)
+    with outbox.conn:
+        outbox.conn.execute("UPDATE outbox SET finished_at = 0 WHERE id = ?", (message_id,))
+
+    outbox.enqueue(make_message(sender, "b@example.com"))
+    assert outbox.drain(sender) == (1, 0)
+    assert row(outbox, message_id) is None
+
+
+def test_old_queue_gets_finished_at_column(tmp_path):
+    path = tmp_path / "outbox.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE outbox (
+            id INTEGER PRIMARY KEY,
+            recipient TEXT NOT NULL,
+            subject TEXT,
+            body BLOB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL
+        );
+        INSERT INTO outbox (recipient, body, status, next_attempt_at, created_at)
+        VALUES ('a@example.com', x'00', 'sent', 0, '2024-01-01T00:00:00'),
+               ('b@example.com', x'00', 'pending', 0, '2024-01-01T00:00:00');
+        """
+    )
+    conn.close()
+
+    outbox = Outbox(path)
+    try:
+        assert row(outbox, 1)["finished_at"] is not None
+        assert row(outbox, 2)["finished_at"] is None
+        # 迁移前已结束的邮件从迁移时开始计算保留期
+        assert outbox.purge(retention_days=1) == 0
+    finally:
+        outbox.close()
+
+
+def test_deliver_outbox_reports_failures(outbox, sender, smtp_sink):
+    components = main.Components()
+    components._outbox = outbox
+    components._sender = sender
+    assert main.deliver_outbox(components) == (0, 0)
+
+    smtp_sink.reject["a@example.com"] = (451, "try again later")
+    outbox.enqueue(make_message(sender, "a@example.com"))
+    outbox.enqueue(make_message(sender, "b@example.com"))
+    assert main.deliver_outbox(components) == (1, 1)
@@ -0,0 +1,59 @@
+"""
+报告渲染测试：模板上下文中的产品为字典
+"""
+import pytest
+
+from src.history_store import HistoryStore
+from src.price_tracker import PriceTracker
+from src.product_record import ProductRecord
+from src.report import ReportGenerator
+
+
+@pytest.fixture
+def change_data(tmp_path):
+    store = HistoryStore(tmp_path / "prices.db", legacy_json=tmp_path / "missing.json")
+    tracker = PriceTracker(store)
+    data = tracker.update_prices({
+        "内存条(渠道市场)": {
+            "update_time": "2026-01-20 11:00",
+            "currency": "USD",
+            "source": "闪存市场 CFM",
+            "url": "https://www.chinaflashmarket.com/pricecenter/ddrchannel",
+            "products": [
+                ProductRecord("DDR5 UDIMM 32GB 6000", 270.0, 5.0, 1.89, 265.0, 272.0, 260.0, "up"),
+                ProductRecord("DDR4 UDIMM 16GB 3200", 90.0, -1.0, -1.1, 91.0, 92.0, 89.0, "down"),
+            ],
+        }
+    })
+    yield ReportGenerator(tracker), data
+    store.close()
+
+
+def test_template_context_uses_plain_dicts(change_data):
+    generator, data = change_data
+    context = generator.build_context(data)
+
+    template_context = generator._template_context(context)
+
+    for key in ("all_products", "all_products_ranked", "top_products"):
+        assert all(type(item) is dict for item in template_context[key])
+    ranked = template_context["all_products_ranked"]
+    assert [item["product"] for item in ranked] == ["DDR5 UDIMM 32GB 6000", "DDR4 UDIMM 16GB 3200"]
+    assert ranked[0]["currency"] == "USD"
+    assert ranked[0]["category"] == "内存条(渠道市场)"
+    # 同一产品在多个列表中是同一个字典，原上下文不变
+    assert template_context["top_products"][0] is next(
+        item for item in template_context["all_products"]
+        if item["product"] == template_context["top_products"][0]["product"]
+    )
+    assert all(isinstance(item, ProductRecord) for item in context["all_products"])
+
+
+def test_render_html_from_dicts(change_data):
+    generator, data = change_data
+
+    html = generator.generate_html(data)
+
+    assert "DDR5 UDIMM 32GB 6000" in html
+    assert "$270.00" in html
+    assert "$260.00 ~ $272.00" in html
@@ -0,0 +1,175 @@
+"""
+闪存市场抓取测试：站点熔断只计入连接错误和 5xx，半开状态下等待试探结果，
+抓取失败时的历史数据兜底
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import scraper as scraper_module
+from src.history_store import HistoryStore
+from src.http_cache import ResponseCache
+from src.resilience import CircuitBreaker, HostBreakers, TokenBucket
+from src.scraper import CFMScraper
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """按路径返回 server.status 中的状态码，未配置的路径返回 200 和空页面"""
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+        body = b"<html><body>no table</body></html>"
+        self.send_response(self.server.status.get(self.path, 200))
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageStub(ThreadingHTTPServer):
+    """本地价格页面服务"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.lock = threading.Lock()
+        self.status = {}
+        self.requests = []
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+@pytest.fixture
+def stub():
+    server = PageStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "prices.db", legacy_json=tmp_path / "missing.json")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def make_scraper(tmp_path, store, monkeypatch):
+    # 重试间隔不影响测试结果
+    monkeypatch.setattr(scraper_module, "backoff_delay", lambda attempt: 0)
+
+    def make(sources: dict) -> CFMScraper:
+        scraper = CFMScraper(
+            cache=ResponseCache(tmp_path / "http_cache.json"),
+            limiter=TokenBucket(rate=0),
+            breakers=HostBreakers(failure_threshold=2, reset_timeout=60),
+            store=store,
+        )
+        scraper.SOURCES = {
+            key: {"url": url, "category": f"分类 {key}"} for key, url in sources.items()
+        }
+        return scraper
+
+    return make
+
+
+def test_page_errors_do_not_open_host_breaker(stub, make_scraper):
+    stub.status = {"/missing": 404}
+    scraper = make_scraper({"missing": stub.url("/missing"), "empty": stub.url("/empty")})
+
+    assert scraper.fetch_source("missing", budget=5) is None
+    assert scraper.fetch_source("empty", budget=5) is None
+
+    breaker = scraper.breakers.for_url(stub.url("/"))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    # 404 不重试，解析不到数据按次数重试
+    assert stub.requests.count("/missing") == 1
+    assert stub.requests.count("/empty") == scraper_module.MAX_RETRIES
+
+
+def test_server_errors_open_host_breaker(stub, make_scraper):
+    stub.status = {"/down": 502}
+    scraper = make_scraper({"down": stub.url("/down"), "other": stub.url("/other")})
+
+    assert scraper.fetch_source("down", budget=5) is None
+
+    breaker = scraper.breakers.for_url(stub.url("/"))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert stub.requests.count("/down") == 2
+    # 同一站点的其他页面在熔断期间不再请求
+    assert scraper.fetch_source("other", budget=1) is None
+    assert "/other" not in stub.requests
+
+
+def test_half_open_waiters_wait_for_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()  # 试探请求
+    assert not breaker.allow()
+    assert breaker.probing
+
+    threading.Timer(0.1, breaker.record_success).start()
+    started = time.monotonic()
+    assert breaker.wait_for_probe(5)
+    assert time.monotonic() - started < 5
+    assert breaker.allow()
+
+
+def test_wait_for_probe_times_out():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+
+    assert not breaker.wait_for_probe(0.05)
+    breaker.cancel()
+    assert not breaker.probing
+    assert breaker.allow()
+
+
+def test_concurrent_requests_wait_for_half_open_probe(stub, make_scraper):
+    scraper = make_scraper({"a": stub.url("/a"), "b": stub.url("/b")})
+    breaker = scraper.breakers.for_url(stub.url("/"))
+    breaker.record_failure(retry_after=0)
+    assert breaker.allow()  # 模拟另一个线程的试探请求
+
+    threading.Timer(0.2, breaker.record_success).start()
+    assert scraper._wait_for_slot("b", breaker, time.monotonic() + 5)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_fetch_falls_back_to_history(stub, make_scraper, store):
+    stub.status = {"/ddr": 502}
+    store.append_record("2026-01-20", "2026-01-20T12:00:00", {
+        "DDR4 UDIMM 8GB 3200": 47.0, "DDR5 UDIMM 32GB 6000": 270.0, "三星 990 PRO 2TB": 1299.0,
+    })
+    store.set_product_categories({
+        "DDR4 UDIMM 8GB 3200": "分类 ddr", "DDR5 UDIMM 32GB 6000": "分类 ddr", "三星 990 PRO 2TB": "三星SSD",
+    })
+    store.set_meta(scraper_module.UPDATE_TIME_META_PREFIX + "ddr", "2026-01-20 11:00")
+    scraper = make_scraper({"ddr": stub.url("/ddr")})
+
+    data = scraper.fetch_source("ddr", budget=5)
+
+    assert data["update_time"] == "2026-01-20 11:00"
+    assert "历史数据 2026-01-20" in data["source"]
+    assert [(p.product, p.price) for p in data["products"]] == [
+        ("DDR4 UDIMM 8GB 3200", 47.0), ("DDR5 UDIMM 32GB 6000", 270.0),
+    ]
+
+
+def test_history_fallback_without_records_returns_none(stub, make_scraper):
+    stub.status = {"/ddr": 502}
+    scraper = make_scraper({"ddr": stub.url("/ddr")})
+
+    assert scraper.fetch_source("ddr", budget=5) is None